@@ -58,6 +58,8 @@ class AttackBaseClass(PassiveTraceObserver, AnalysisSource, Parameterized, AutoS
         self._pointRange = (0,0)
         self._targetSubkeys = []
         self._project = None
+        self._workers = 1
+        self._checkpoint = False
         self.useAbs = True
         self.attack = None
 
@@ -77,6 +79,10 @@ class AttackBaseClass(PassiveTraceObserver, AnalysisSource, Parameterized, AutoS
             {'name':'Traces per Attack', 'key':'atraces', 'type':'int', 'limits':(1, 1E6), 'get':self.getTracesPerAttack, 'set':self.setTracesPerAttack, 'action':self.updateScript},
             {'name':'Iterations', 'key':'runs', 'type':'int', 'limits':(1, 1E6), 'get':self.getIterations, 'set':self.setIterations, 'action':self.updateScript},
             {'name':'Reporting Interval', 'key':'reportinterval', 'type':'int', 'get':self.getReportingInterval, 'set':self.setReportingInterval, 'action':self.updateScript},
+            {'name':'Worker Processes', 'key':'workers', 'type':'int', 'limits':(1, 256), 'get':self.getWorkers, 'set':self.setWorkers, 'action':self.updateScript},
+            {'name':'Checkpoint/Resume', 'key':'checkpoint', 'type':'bool', 'get':self.getCheckpoint, 'set':self.setCheckpoint, 'action':self.updateScript,
+             'tip':'Save the attack state in the project analysis directory after every reporting interval. Rerunning an aborted attack, or the '
+                   'same attack after adding traces, continues from the saved state.'},
         ])
         self.getParams().init()
 
@@ -123,6 +129,7 @@ class AttackBaseClass(PassiveTraceObserver, AnalysisSource, Parameterized, AutoS
             self.attack.setModel(self.attackModel)
             self.attack.getStatistics().clear()
             self.attack.setReportingInterval(self.getReportingInterval())
+            self.attack.setWorkers(self.getWorkers())
             self.attack.setTargetSubkeys(self.getTargetSubkeys())
             self.attack.setStatsReadyCallback(self.sigAnalysisUpdated.emit)
             self.sigAnalysisStarted.emit()
@@ -130,6 +137,7 @@ class AttackBaseClass(PassiveTraceObserver, AnalysisSource, Parameterized, AutoS
             for itNum in range(self.getIterations()):
                 startingTrace = self.getTracesPerAttack() * itNum + self.getTraceStart()
                 endingTrace = startingTrace + self.getTracesPerAttack() - 1
+                self.attack.setCheckpointFile(self.checkpointFile(startingTrace))
 
                 # TODO:support start/end point different per byte
                 self.attack.addTraces(self.getTraceSource(), (startingTrace, endingTrace), progressBar, pointRange=self.getPointRange(None))
@@ -179,6 +187,26 @@ class AttackBaseClass(PassiveTraceObserver, AnalysisSource, Parameterized, AutoS
     def setReportingInterval(self, ri):
         self._reportingInterval = ri
 
+    def getWorkers(self):
+        return self._workers
+
+    @setupSetParam("Worker Processes")
+    def setWorkers(self, workers):
+        self._workers = workers
+
+    def getCheckpoint(self):
+        return self._checkpoint
+
+    @setupSetParam("Checkpoint/Resume")
+    def setCheckpoint(self, enabled):
+        self._checkpoint = enabled
+
+    def checkpointFile(self, startingTrace):
+        """Checkpoint file for the attack starting at startingTrace, None if checkpoints are off or there is no project"""
+        if not self._checkpoint or self._project is None:
+            return None
+        return self._project.getDataFilepath('attack-checkpoint-%d.npz' % startingTrace)['abs']
+
     def getPointRange(self, bnum=None):
         return self._pointRange
 
@@ -272,6 +300,8 @@ class AttackBaseClass(PassiveTraceObserver, AnalysisSource, Parameterized, AutoS
         self.addFunction("init", "setTracesPerAttack", "%d" % atraces.getValue())
         self.addFunction("init", "setIterations", "%d" % runs.getValue())
         self.addFunction("init", "setReportingInterval", "%d" % ri.getValue())
+        self.addFunction("init", "setWorkers", "%d" % self.findParam('workers').getValue())
+        self.addFunction("init", "setCheckpoint", "%s" % self.findParam('checkpoint').getValue())
         self.addFunction("init", "setPointRange", "(%d,%d)" % (pointrng[0], pointrng[1]))
 
     def updateTraceLimits(self):
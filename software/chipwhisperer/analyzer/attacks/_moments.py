@@ -0,0 +1,109 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2013-2017, NewAE Technology Inc
+# All rights reserved.
+#
+# Find this and more at newae.com - this file is part of the chipwhisperer
+# project, http://www.assembla.com/spaces/chipwhisperer
+#
+#    This file is part of chipwhisperer.
+#
+#    chipwhisperer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    chipwhisperer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with chipwhisperer.  If not, see <http://www.gnu.org/licenses/>.
+#=================================================
+
+import numpy as np
+
+
+class CoMoments(object):
+    """
+    Running means, variances & covariance of the hypotheses h (one column per key guess) and the trace points t, as
+    needed for the correlation coefficient. Each block of traces is reduced to its own centered moments and merged
+    with the pairwise update from Chan et al., so differences like sum(t)^2 - N*sum(t^2) never appear and precision
+    doesn't depend on how many traces were added. States from worker processes or from separate runs are merged the
+    same way.
+        meanh, m2h: mean & sum of squared deviations of h (1 x guesses)
+        meant, m2t: mean & sum of squared deviations of t (1 x points)
+        cht:        sum of (h - meanh)*(t - meant) (guesses x points)
+    """
+
+    fields = ('n', 'meanh', 'm2h', 'meant', 'm2t', 'cht')
+
+    def __init__(self, n=0, meanh=None, m2h=None, meant=None, m2t=None, cht=None):
+        self.n = n
+        self.meanh = meanh
+        self.m2h = m2h
+        self.meant = meant
+        self.m2t = m2t
+        self.cht = cht
+
+    @classmethod
+    def fromBlock(cls, hyp, traces):
+        """Moments of one block: hyp is (traces x guesses), traces is (traces x points)"""
+        hyp = np.asarray(hyp, dtype=np.float64)
+        traces = np.asarray(traces)
+        n = len(traces)
+        meanh = np.mean(hyp, axis=0)
+        #Traces stay in their stored type (e.g. float32 or int16), centering them gives the float64 copy
+        meant = np.mean(traces, axis=0, dtype=np.float64)
+        hc = hyp - meanh
+        tc = traces - meant
+        return cls(n, meanh, np.sum(np.square(hc), axis=0), meant, np.sum(np.square(tc), axis=0), np.dot(hc.T, tc))
+
+    @classmethod
+    def fromSums(cls, n, sumh, sumhq, sumt, sumtq, sumht, toffset=0, hoffset=0):
+        """
+        Moments of one block from raw sums. Only accurate if the sums are small, e.g. the traces had toffset (their
+        approximate mean) subtracted before summing & the hypotheses are small integers or had hoffset subtracted.
+        """
+        mh = sumh / float(n)
+        mt = sumt / float(n)
+        return cls(n, mh + hoffset, sumhq - sumh * mh, mt + toffset, sumtq - sumt * mt, sumht - np.outer(mh, sumt))
+
+    @classmethod
+    def concatPoints(cls, parts):
+        """Join moments of the same traces & guesses computed over consecutive point ranges"""
+        first = parts[0]
+        return cls(first.n, first.meanh, first.m2h, np.hstack([p.meant for p in parts]),
+                   np.hstack([p.m2t for p in parts]), np.hstack([p.cht for p in parts]))
+
+    def merge(self, other):
+        """Add the traces other was built from to this state"""
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.n = other.n
+            self.meanh = np.array(other.meanh, dtype=np.float64)
+            self.m2h = np.array(other.m2h, dtype=np.float64)
+            self.meant = np.array(other.meant, dtype=np.float64)
+            self.m2t = np.array(other.m2t, dtype=np.float64)
+            self.cht = np.array(other.cht, dtype=np.float64)
+            return
+
+        n = self.n + other.n
+        f = float(self.n) * other.n / n
+        dh = other.meanh - self.meanh
+        dt = other.meant - self.meant
+
+        self.meanh += dh * (float(other.n) / n)
+        self.meant += dt * (float(other.n) / n)
+        self.m2h += other.m2h + np.square(dh) * f
+        self.m2t += other.m2t + np.square(dt) * f
+        self.cht += other.cht
+        self.cht += np.outer(dh * f, dt)
+        self.n = n
+
+    def correlation(self):
+        """Correlation coefficient (guesses x points)"""
+        return self.cht / np.sqrt(np.outer(self.m2h, self.m2t))
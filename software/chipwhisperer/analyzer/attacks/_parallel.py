@@ -0,0 +1,159 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2013-2017, NewAE Technology Inc
+# All rights reserved.
+#
+# Find this and more at newae.com - this file is part of the chipwhisperer
+# project, http://www.assembla.com/spaces/chipwhisperer
+#
+#    This file is part of chipwhisperer.
+#
+#    chipwhisperer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    chipwhisperer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with chipwhisperer.  If not, see <http://www.gnu.org/licenses/>.
+#=================================================
+
+import logging
+import multiprocessing
+from ctypes import c_double, c_float, c_long, c_uint8
+from multiprocessing.sharedctypes import RawArray
+import numpy as np
+
+#Set in each worker process by _initWorker()
+_workerChunk = None
+_workerContext = None
+
+
+class SharedTraceChunk(object):
+    """
+    Block of traces & text in shared memory. The buffers are allocated once with the largest chunk size, every
+    reporting interval load() copies the new traces in and the worker processes read them without any pickling.
+    Traces are kept as float64, or as float32 if they were stored that way.
+    """
+
+    def __init__(self, maxtraces, npoints, textlen=16, keylen=16, dtype=np.float64):
+        self.maxtraces = maxtraces
+        self.npoints = npoints
+        self.textlen = textlen
+        self.keylen = keylen
+        self.dtype = np.float32 if np.dtype(dtype) == np.float32 else np.float64
+        self._traces = RawArray(c_float if self.dtype == np.float32 else c_double, maxtraces * npoints)
+        self._textins = RawArray(c_uint8, maxtraces * textlen)
+        self._textouts = RawArray(c_uint8, maxtraces * textlen)
+        self._knownkeys = RawArray(c_uint8, maxtraces * keylen)
+        self._valid = RawArray(c_uint8, 3)
+        self._numtraces = RawArray(c_long, 1)
+
+    def _view(self, buf, dtype, width):
+        return np.frombuffer(buf, dtype=dtype).reshape((-1, width))[:self.numTraces()]
+
+    def _store(self, buf, idx, data, width):
+        try:
+            data = np.asarray(data, dtype=np.uint8)
+            if data.shape != (self.numTraces(), width):
+                raise ValueError()
+        except (TypeError, ValueError):
+            self._valid[idx] = 0
+            return
+        self._view(buf, np.uint8, width)[:] = data
+        self._valid[idx] = 1
+
+    def load(self, traces, textins, textouts, knownkeys):
+        """Copy a block of traces into the shared buffers, data which can't be packed (e.g. None) reads back as empty"""
+        if len(traces) > self.maxtraces:
+            raise ValueError("Chunk of %d traces larger than shared buffer (%d)" % (len(traces), self.maxtraces))
+        self._numtraces[0] = len(traces)
+        self._view(self._traces, self.dtype, self.npoints)[:] = traces
+        self._store(self._textins, 0, textins, self.textlen)
+        self._store(self._textouts, 1, textouts, self.textlen)
+        self._store(self._knownkeys, 2, knownkeys, self.keylen)
+
+    def numTraces(self):
+        return int(self._numtraces[0])
+
+    def traces(self):
+        return self._view(self._traces, self.dtype, self.npoints)
+
+    def textins(self):
+        return self._view(self._textins, np.uint8, self.textlen) if self._valid[0] else []
+
+    def textouts(self):
+        return self._view(self._textouts, np.uint8, self.textlen) if self._valid[1] else []
+
+    def knownkeys(self):
+        return self._view(self._knownkeys, np.uint8, self.keylen) if self._valid[2] else None
+
+
+def _initWorker(chunk, context):
+    global _workerChunk, _workerContext
+    _workerChunk = chunk
+    _workerContext = context
+
+
+def workerChunk():
+    """SharedTraceChunk of the pool this worker belongs to"""
+    return _workerChunk
+
+
+def workerContext():
+    """Read-only object (normally the leakage model) given to the pool when it was created"""
+    return _workerContext
+
+
+class SubkeyPool(object):
+    """
+    Process pool used to spread subkeys (or subkey x point-range tiles) over several cores. Task functions must be
+    module-level functions, and get their data through workerChunk() and workerContext(). Only the task
+    description & the (small) result are pickled.
+    """
+
+    def __init__(self, workers, chunk, context):
+        self.workers = workers
+        self.chunk = chunk
+        self._pool = multiprocessing.Pool(workers, initializer=_initWorker, initargs=(chunk, context))
+
+    def map(self, func, tasks):
+        return self._pool.map(func, tasks, chunksize=1)
+
+    def close(self):
+        if self._pool:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+
+def subkeyTiles(brange, pointRanges, workers):
+    """
+    Split the work into (bnum, (pstart, pend)) tiles. If there are fewer subkeys than workers the point range of each
+    subkey is split so all workers still get something to do.
+    """
+    nsplit = max(1, int(np.ceil(float(workers) / max(1, len(brange)))))
+    tiles = []
+    for bnum in brange:
+        pstart, pend = pointRanges[bnum]
+        edges = np.linspace(pstart, pend, min(nsplit, max(1, pend - pstart)) + 1).astype(int)
+        for i in range(len(edges) - 1):
+            tiles.append((bnum, (edges[i], edges[i + 1])))
+    return tiles
+
+
+def createPool(workers, maxtraces, npoints, textlen, keylen, context, dtype=np.float64):
+    """Returns a SubkeyPool, or None (after logging why) if a pool can't be used so caller runs serially"""
+    if workers is None or workers <= 1:
+        return None
+    try:
+        chunk = SharedTraceChunk(maxtraces, npoints, textlen, keylen, dtype)
+        return SubkeyPool(workers, chunk, context)
+    except Exception as e:
+        logging.warning('Could not start %d worker processes, running attack in a single process: %s' % (workers, e))
+        return None
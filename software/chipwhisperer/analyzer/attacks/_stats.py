@@ -53,11 +53,35 @@ class DataTypeDiffs(object):
         self.maxValid = [False]*self.numSubkeys
         self.pge = [255]*self.numSubkeys
         self.diffs_tnum = [None]*self.numSubkeys
-        self.pge_total = []
-        self.maxes_list = [list() for i in range(0, self.numSubkeys)]
+
+        #History of the PGE & maxes, grown by doubling so recording an interval doesn't copy everything
+        self._pgeTotal = np.zeros(64, dtype=[('trace', 'i8'), ('subkey', 'i4'), ('pge', 'i4')])
+        self._pgeCount = 0
+        maxesdtype = [('trace', 'i8'), ('maxes', self.maxes[0].dtype, (self.numPerms,))]
+        self._maxesList = [np.zeros(16, dtype=maxesdtype) for i in range(0, self.numSubkeys)]
+        self._maxesCount = [0]*self.numSubkeys
 
         #TODO: Ensure this gets called by attack algorithms when rerunning
 
+    @property
+    def pge_total(self):
+        """PGE of each subkey every time its maximums were found, record array with fields trace, subkey & pge"""
+        return self._pgeTotal[:self._pgeCount]
+
+    @property
+    def maxes_list(self):
+        """For each subkey the sorted maxes after every reporting interval, record arrays with fields trace & maxes"""
+        return [self._maxesList[i][:self._maxesCount[i]] for i in range(0, self.numSubkeys)]
+
+    @staticmethod
+    def _reserve(arr, count):
+        """Return arr, or a copy twice the size if it has no room for another entry after count"""
+        if count < len(arr):
+            return arr
+        newarr = np.zeros(2 * len(arr), dtype=arr.dtype)
+        newarr[:count] = arr[:count]
+        return newarr
+
     def simplePGE(self, bnum):
         if self.maxValid[bnum] == False:
             #TODO: should sort
@@ -89,35 +113,33 @@ class DataTypeDiffs(object):
                 self.maxValid[i] = False
                 continue
 
-            if self.maxValid[i] == False:
-                for hyp in range(0, self.numPerms):
-                    if useAbsolute:
-                        v = np.nanmax(np.fabs(self.diffs[i][hyp]))
-                    else:
-                        v = np.nanmax(self.diffs[i][hyp])
+            tnum = self.diffs_tnum[i]
+            if tnum is None:
+                tnum = -1
 
-                    mvalue = v
+            if self.maxValid[i] == False:
+                #Maximum of every hypothesis at once, NaN's never win unless the whole row is NaN
+                #(Template attacks give one value per hypothesis, handled as a single point)
+                diffs = np.asarray(self.diffs[i]).reshape((self.numPerms, -1))
+                if useAbsolute:
+                    v = np.fabs(diffs)
+                else:
+                    v = diffs
+                hyps = np.arange(self.numPerms)
+                mindex = np.argmax(np.where(np.isnan(v), -np.inf, v), axis=1)
+
+                self.maxes[i]['hyp'] = hyps
+                self.maxes[i]['point'] = mindex
+                self.maxes[i]['value'] = v[hyps, mindex]
 
-                    #Get maximum value for this hypothesis
-                    try:
-                        mindex = np.amin(np.where(v == mvalue))
-                    except ValueError:
-                        mindex = self.numPerms-1
-                    self.maxes[i][hyp]['hyp'] = hyp
-                    self.maxes[i][hyp]['point'] = mindex
-                    self.maxes[i][hyp]['value'] = mvalue
-
-                #TODO: why does this fail?
-                #self.maxes[i][np.isnan(self.maxes[i]['value'])]['value'] = 0
                 #TODO: workaround for PGE, as NaN's get ranked first
                 numnans = np.isnan(self.maxes[i]['value']).sum()
 
                 if useSingle:
                     #All table values are taken from same point MAX is taken from
                     where = self.maxes[i][0]['point']
-                    for j in range(0, self.numPerms):
-                        self.maxes[i][j]['point'] = where
-                        self.maxes[i][j]['value'] = self.diffs[i][self.maxes[i][j]['hyp']][where]
+                    self.maxes[i]['point'] = where
+                    self.maxes[i]['value'] = diffs[self.maxes[i]['hyp'], where]
 
                 self.maxes[i][::-1].sort(order='value') # sorts nunpy array in place and in reverse order
                 self.maxValid[i] = True
@@ -130,10 +152,15 @@ class DataTypeDiffs(object):
                     except IndexError:
                         self.pge[i] = self.numPerms-1
 
-            tnum = self.diffs_tnum[i]
-            self.pge_total.append({'trace':tnum, 'subkey':i, 'pge':self.pge[i]})
-            
-            if len(self.maxes_list[i]) == 0 or self.maxes_list[i][-1]['trace'] != tnum:
-                self.maxes_list[i].append({'trace':tnum, 'maxes':np.array(self.maxes[i])})
+                self._pgeTotal = self._reserve(self._pgeTotal, self._pgeCount)
+                self._pgeTotal[self._pgeCount] = (tnum, i, self.pge[i])
+                self._pgeCount += 1
+
+            count = self._maxesCount[i]
+            if count == 0 or self._maxesList[i][count - 1]['trace'] != tnum:
+                self._maxesList[i] = self._reserve(self._maxesList[i], count)
+                self._maxesList[i][count]['trace'] = tnum
+                self._maxesList[i][count]['maxes'] = self.maxes[i]
+                self._maxesCount[i] = count + 1
 
         return self.maxes
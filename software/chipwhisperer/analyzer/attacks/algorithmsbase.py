@@ -25,9 +25,14 @@
 #    along with chipwhisperer.  If not, see <http://www.gnu.org/licenses/>.
 #=================================================
 
+import logging
+import os
+import numpy as np
 from _stats import DataTypeDiffs
+from _moments import CoMoments
+import _parallel
 from chipwhisperer.common.api.autoscript import AutoScript
-from chipwhisperer.common.utils.parameter import Parameterized
+from chipwhisperer.common.utils.parameter import Parameterized, setupSetParam
 
 
 class AlgorithmsBase(Parameterized, AutoScript):
@@ -37,6 +42,9 @@ class AlgorithmsBase(Parameterized, AutoScript):
         self.sr = None
         self.stats = None
         self._project = None
+        self._workers = 1
+        self._checkpointFile = None
+        self._memoryBudget = 512
 
     def setProject(self, proj):
         self._project = proj
@@ -70,5 +78,238 @@ class AlgorithmsBase(Parameterized, AutoScript):
     def setStatsReadyCallback(self, sr):
         self.sr = sr
 
+    def setWorkers(self, workers):
+        """Number of worker processes subkeys are spread over (threads for the C accelerator), 1 runs everything in this process"""
+        self._workers = workers
+
+    def getWorkers(self):
+        return self._workers
+
+    def loadTraces(self, traceSource, start, end, pointRange=None):
+        """
+        Load traces start to end-1 with their text & keys as (traces, textins, textouts, knownkeys). Fetched as one
+        block, if some traces are missing (e.g. dropped by a resync module) loads them one by one skipping those.
+        """
+        try:
+            return (traceSource.getTraces(start, end, pointRange), traceSource.getTextins(start, end),
+                    traceSource.getTextouts(start, end), traceSource.getKnownKeys(start, end))
+        except ValueError:
+            pass
+
+        data = []
+        textins = []
+        textouts = []
+        knownkeys = []
+        for tnum in range(start, end):
+            d = traceSource.getTrace(tnum)
+            if d is None:
+                continue
+
+            if pointRange is not None:
+                d = d[pointRange[0]:pointRange[1]]
+            data.append(d)
+            textins.append(traceSource.getTextin(tnum))
+            textouts.append(traceSource.getTextout(tnum))
+            knownkeys.append(traceSource.getKnownKey(tnum))
+
+        return np.array(data), np.array(textins), np.array(textouts), knownkeys
+
+    def setMemoryBudget(self, budget):
+        """Memory (in MB) the block-wise attacks size their trace blocks & state to"""
+        self._memoryBudget = budget
+
+    def getMemoryBudget(self):
+        return self._memoryBudget
+
+    def streamMoments(self, traceSource, tracerange, pointRange, hypotheses, progressBar=None):
+        """
+        CoMoments of traces tracerange[0] to tracerange[1] against hypotheses(bnum, textins, textouts, knownkeys),
+        a (traces x guesses) array, for each subkey in self.brange. Traces are read in blocks sized so the blocks &
+        the state stay within the memory budget. If the state of all subkeys doesn't fit in half of the budget the
+        subkeys are done one after the other, reading the traces again for each. Returns a dict bnum->CoMoments, or
+        None if aborted.
+        """
+        if pointRange is None:
+            npoints = traceSource.numPoints()
+        else:
+            npoints = pointRange[1] - pointRange[0]
+        nperms = self.model.getPermPerSubkey()
+        budget = self._memoryBudget * 1024 * 1024
+
+        statebytes = nperms * npoints * 8
+        if statebytes * len(self.brange) <= budget / 2:
+            groups = [list(self.brange)]
+        else:
+            groups = [[bnum] for bnum in self.brange]
+
+        #A block is held as loaded, as float64 & centered, plus the hypotheses
+        blockbytes = max(budget - statebytes * len(groups[0]), 0)
+        blocklen = max(1, int(blockbytes / ((3 * npoints + 2 * nperms) * 8)))
+        starts = range(tracerange[0], tracerange[1] + 1, blocklen)
+
+        if progressBar:
+            progressBar.setStatusMask("Current Subkey: %d")
+            progressBar.setMaximum(len(self.brange) * len(starts))
+        pbcnt = 0
+
+        moments = {}
+        for group in groups:
+            for bnum in group:
+                moments[bnum] = CoMoments()
+
+            for start in starts:
+                end = min(start + blocklen, tracerange[1] + 1)
+                traces, textins, textouts, knownkeys = self.loadTraces(traceSource, start, end, pointRange)
+                if len(traces) == 0:
+                    continue
+
+                for bnum in group:
+                    moments[bnum].merge(CoMoments.fromBlock(hypotheses(bnum, textins, textouts, knownkeys), traces))
+                    pbcnt += 1
+                    if progressBar:
+                        progressBar.updateStatus(pbcnt, bnum)
+                        if progressBar.wasAborted():
+                            return None
+
+        return moments
+
+    def createSubkeyPool(self, traceSource, tracerange, maxtraces):
+        """
+        Start the worker processes for a parallel attack, with a shared buffer big enough for maxtraces traces
+        shaped like those in traceSource. Returns None if the attack should run in this process (only one worker,
+        or the pool failed to start).
+        """
+        if self._workers <= 1:
+            return None
+
+        tnum = tracerange[0]
+        textlen = max(len(t) if t is not None else 0 for t in (traceSource.getTextin(tnum), traceSource.getTextout(tnum)))
+        key = traceSource.getKnownKey(tnum)
+        keylen = len(key) if key is not None else 0
+        trace = np.asarray(traceSource.getTrace(tnum))
+        maxtraces = min(maxtraces, tracerange[1] - tracerange[0] + 1)
+        return _parallel.createPool(self._workers, maxtraces, len(trace), textlen, keylen, self.model, trace.dtype)
+
+    def setCheckpointFile(self, fname):
+        """
+        File the progressive attacks save their state to after every reporting interval, None disables it. If the
+        file already holds the same attack (first trace, subkeys, points, model & preprocessing) run over fewer traces
+        of the same trace segments, the attack continues from where that one stopped instead of starting over. Segments
+        appended since then are picked up incrementally.
+        """
+        self._checkpointFile = fname
+
+    def getCheckpointFile(self):
+        return self._checkpointFile
+
+    @staticmethod
+    def _traceSegments(traceSource):
+        """
+        Returns (settings, segments) identifying the traces an attack reads: the class & parameters of every
+        preprocessing module down to the trace manager, and one entry per enabled segment with its config file,
+        capture date & number of traces. Appending segments only adds entries at the end.
+        """
+        settings = []
+        while hasattr(traceSource, "_traceSource"):
+            settings.append('%s %s' % (traceSource.__class__.__name__, str(traceSource.getParams())))
+            traceSource = traceSource._traceSource
+        settings.append('%s points=%d' % (traceSource.__class__.__name__, traceSource.numPoints()))
+
+        if hasattr(traceSource, "traceSegments"):
+            segments = ['%s %s %d' % (os.path.basename(str(t.config.configFilename())), t.config.attr("date"), t.numTraces())
+                        for t in traceSource.traceSegments if t.enabled]
+        else:
+            #Can't tell what was added, any change in size is a different source
+            segments = ['%s %d' % (traceSource.__class__.__name__, traceSource.numTraces())]
+        return '\n'.join(settings), segments
+
+    def _checkpointInfo(self, traceSource, tracerange, pointRange):
+        settings, _ = self._traceSegments(traceSource)
+        return {'tracestart':tracerange[0], 'subkeys':repr(list(self.brange)), 'pointrange':repr(pointRange),
+                'model':repr(self.model), 'tracesettings':settings}
+
+    def saveCheckpoint(self, traceSource, tracerange, pointRange, ntraces, moments):
+        """Save the CoMoments of each subkey (dict bnum->CoMoments), covering the first ntraces traces of tracerange"""
+        if self._checkpointFile is None:
+            return
+
+        data = self._checkpointInfo(traceSource, tracerange, pointRange)
+        data['ntraces'] = ntraces
+        data['segments'] = np.array(self._traceSegments(traceSource)[1], dtype=str)
+        for bnum, m in moments.items():
+            for field in CoMoments.fields:
+                data['%s_%d' % (field, bnum)] = getattr(m, field)
+
+        #Write & rename so an abort half way through never leaves a broken checkpoint
+        tmpname = self._checkpointFile + '.tmp'
+        try:
+            with open(tmpname, 'wb') as f:
+                np.savez(f, **data)
+            if os.path.exists(self._checkpointFile):
+                os.remove(self._checkpointFile)
+            os.rename(tmpname, self._checkpointFile)
+        except (IOError, OSError), e:
+            logging.warning('Could not save attack checkpoint %s, checkpoints disabled: %s' % (self._checkpointFile, e))
+            self._checkpointFile = None
+
+    def loadCheckpoint(self, traceSource, tracerange, pointRange):
+        """
+        Returns (ntraces, moments) saved by saveCheckpoint(), or None if there is no checkpoint for this attack, the
+        segments it was run on changed (other than new ones appended) or it covers more traces than tracerange.
+        """
+        if self._checkpointFile is None or not os.path.isfile(self._checkpointFile):
+            return None
+
+        try:
+            with np.load(self._checkpointFile) as data:
+                for k, v in self._checkpointInfo(traceSource, tracerange, pointRange).items():
+                    if str(data[k]) != str(v):
+                        logging.info('Checkpoint %s is from a different attack (%s), not resuming' % (self._checkpointFile, k))
+                        return None
+
+                saved = [str(s) for s in data['segments']]
+                if self._traceSegments(traceSource)[1][:len(saved)] != saved:
+                    logging.info('Checkpoint %s is from different trace segments, not resuming' % self._checkpointFile)
+                    return None
+
+                ntraces = int(data['ntraces'])
+                if ntraces > tracerange[1] - tracerange[0] + 1:
+                    logging.info('Checkpoint %s covers more traces than requested, not resuming' % self._checkpointFile)
+                    return None
+
+                moments = {}
+                for bnum in self.brange:
+                    fields = [data['%s_%d' % (field, bnum)] for field in CoMoments.fields]
+                    moments[bnum] = CoMoments(int(fields[0]), *fields[1:])
+        except Exception, e:
+            logging.warning('Could not load attack checkpoint %s: %s' % (self._checkpointFile, e))
+            return None
+
+        logging.info('Resuming attack from checkpoint %s after %d traces' % (self._checkpointFile, ntraces))
+        return ntraces, moments
+
     def addTraces(self, traceSource, tracerange, progressBar=None, pointRange=None):
-        pass
\ No newline at end of file
+        pass
+
+
+class StreamingAlgorithmsBase(AlgorithmsBase):
+    """
+    Base for the attacks that run through all the traces with streamMoments() before giving results, adds the
+    memory budget parameter.
+    """
+
+    def __init__(self):
+        AlgorithmsBase.__init__(self)
+
+        self.getParams().addChildren([
+            {'name':'Memory Budget (MB)', 'key':'membudget', 'type':'int', 'limits':(16, 1E6), 'get':self.getMemoryBudget, 'set':self.setMemoryBudget,
+             'tip':'Traces are read in blocks so the attack stays within this much memory, however many traces there are'},
+        ])
+
+    @setupSetParam("Memory Budget (MB)")
+    def setMemoryBudget(self, budget):
+        AlgorithmsBase.setMemoryBudget(self, budget)
+
+    def hypotheses(self, bnum, plaintexts, ciphertexts, knownkeys):
+        """Hypotheticals for every key guess at once, (traces x guesses)"""
+        return self.model.leakage_batch(plaintexts, ciphertexts, bnum, knownkeys)
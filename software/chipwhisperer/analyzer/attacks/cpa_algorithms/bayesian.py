@@ -27,164 +27,60 @@
 
 import numpy as np
 
-from ..algorithmsbase import AlgorithmsBase
+from ..algorithmsbase import StreamingAlgorithmsBase
 from chipwhisperer.common.utils.pluginmanager import Plugin
 
 
-class AttackCPA_Bayesian(AlgorithmsBase):
+class AttackCPA_Bayesian(StreamingAlgorithmsBase):
     """
     Bayesian CPA. NOT WORKING!!
     """
     _name = "Bayesian CPA"
 
     def __init__(self):
-        AlgorithmsBase.__init__(self)
+        StreamingAlgorithmsBase.__init__(self)
         self.updateScript()
 
     def addTraces(self, traceSource, tracerange, progressBar=None, pointRange=None, algo="log", tracesLoop=None):
-        keyround=self.keyround
-        modeltype=self.modeltype
         brange=self.brange
 
-        # foundkey = []
-
         self.all_diffs = range(0,16)
 
-        pbcnt = 0
-        if progressBar:
-            progressBar.setStatusMask("Byte %02d: Hyp=%02x")
-            progressBar.setMaximum(len(brange) * 256)
-
-        # Load all traces
-        data = []
-        textins = []
-        textouts = []
-        knownkeys = []
-        for i in range(tracerange[0], tracerange[1]):
-            # Handle Offset
-            tnum = i + tracerange[0]
-            try:
-                data.append(traceSource.getTrace(tnum))
-                textins.append(traceSource.getTextin(tnum))
-                textouts.append(traceSource.getTextout(tnum))
-                knownkeys.append(traceSource.getKnownKey(tnum))
-            except Exception, e:
-                progressBar.abort(e.message)
-                return
-
-        traces = np.array(data)
-        textins = np.array(textins)
-        textouts = np.array(textouts)
+        # Traces are worked through in blocks, only the per-subkey sums are kept in memory
+        moments = self.streamMoments(traceSource, tracerange, pointRange, self.hypotheses, progressBar)
+        if moments is None:
+            return
 
         #For all bytes of key
         for bnum in brange:
-            diffs = [0]*256
-
-            #For each 0..0xFF possible value of the key byte
-            for key in range(0, 256):
-                #Initialize arrays & variables to zero
-                sumstd = np.zeros(len(traces[0,:]), dtype=np.float64)
-                hyp = [0] * len(traces[:, 0])
-
-                #Generate hypotheticals
-                for tnum in range(len(traces[:,0])):
-
-                    if len(textins) > 0:
-                        pt = textins[tnum]
-
-                    if len(textouts) > 0:
-                        ct = textouts[tnum]
-
-                    if keyround == "first":
-                        ct = None
-                    elif keyround == "last":
-                        pt = None
-                    else:
-                        raise ValueError("keyround invalid")
-
-                    #Generate the output of the SBOX
-                    if modeltype == "Hamming Weight":
-                        hypint = self.model.HypHW(pt, ct, key, bnum)
-                    elif modeltype == "Hamming Distance":
-                        hypint = self.model.HypHD(pt, ct, key, bnum)
-                    else:
-                        raise ValueError("modeltype invalid")
-
-                    hyp[tnum] = hypint
-
-                hyp = np.array(hyp)
-
-                #Mean & STD-DEV of hypothesis
-                meanh = np.mean(hyp, dtype=np.float64)
-                stddevh = np.std(hyp, dtype=np.float64)
-
-                #Mean & STD-DEV of all points in trace
-                meant = np.mean(traces, axis=0, dtype=np.float64)
-                stddevt = np.std(traces, axis=0, dtype=np.float64)
-
-                #For each trace, do the following
-                for tnum in range(len(traces[:,0])):
-                    #Make both zero-mean
-                    hdiff = np.float64(hyp[tnum]) - meanh
-                    tdiff = np.array((np.array(traces[tnum,:], dtype=np.float64) - meant), dtype=np.float64)
-
-                    #Scale by std-dev
-                    hdiff = hdiff / np.float64(stddevh)
-                    tdiff = tdiff / np.array(stddevt, dtype=np.float64)
-
-                    # Calculate error term
-                    error = (hdiff - tdiff)
-                    sumstd = sumstd + pow(error, 2)
-
-                q = len(traces[:,0])
-
-                if algo == "original":
-                    #Original Algorithm
-                    sumstd = pow(np.sqrt((sumstd/q)), -q)
-                elif algo == "log":
-                    #LOG Algorithm
-                    sumstd = -q * ( (0.5*np.log(sumstd)) - np.log(q))
-                else:
-                    raise RuntimeError("algo not defined")
-
-                diffs[key] = sumstd
-
-                if progressBar:
-                    progressBar.updateStatus(pbcnt, (bnum, key))
-                    if progressBar and progressBar.wasAborted():
-                        return
-                pbcnt = pbcnt + 1
+            #Both hypothesis & trace are made zero-mean and scaled by their std-dev, the summed square of the
+            #difference between them then only depends on the correlation: sum((h-t)^2) = 2q(1 - r)
+            q = moments[bnum].n
+            sumstd = 2.0 * q * (1.0 - moments[bnum].correlation())
+
+            if algo == "original":
+                #Original Algorithm
+                diffs = pow(np.sqrt((sumstd/q)), -q)
+            elif algo == "log":
+                #LOG Algorithm
+                diffs = -q * ( (0.5*np.log(sumstd)) - np.log(q))
+            else:
+                raise RuntimeError("algo not defined")
 
             #Gotten all stddevs - now process algorithm
 
             #Original algorithm
             if algo == "original":
-                sums = np.sum(diffs, axis=0, dtype=np.float64)
-                for key in range(0, 256):
-                    diffs[key] = diffs[key] / sums
+                diffs = diffs / np.sum(diffs, axis=0, dtype=np.float64)
 
             elif algo == "log":
-            #Logarithm Algorithm
-                summation = np.zeros(len(traces[0,:]), dtype=np.float64)
-                for key in range(1, 256):
-                    diff = diffs[key] - diffs[0]
-                    summation = summation + np.exp(diff)
-                summation = summation + 1
-                summation = np.log(summation)
-                summation = summation + diffs[0]
-
-                for key in range(0, 256):
-                    diffs[key] = diffs[key] - summation
-
-            else:
-                raise RuntimeError("algo not defined")
+                #Logarithm Algorithm, log of the sum over all keys
+                peak = np.max(diffs, axis=0)
+                summation = np.log(np.sum(np.exp(diffs - peak), axis=0)) + peak
+                diffs = diffs - summation
 
             self.all_diffs[bnum] = diffs
         self.algo = algo
-            #From all the key candidates, select the largest difference as most likely
-            #foundbyte = diffs.index(max(diffs))
-            #foundkey.append(foundbyte)
-#            print "%2x "%foundbyte,
 
     def _getResult(self, bnum, hyprange=None):
         if hyprange == None:
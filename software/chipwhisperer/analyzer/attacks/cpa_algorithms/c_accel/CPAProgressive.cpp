@@ -29,8 +29,12 @@
  */
 
 #include <stdio.h>
+#include <stdlib.h>
 #include <stdint.h>
 #include <math.h>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
 #include "CPAProgressive.h"
 #include "AESModels.h"
 
@@ -48,8 +52,73 @@ const int hamming_weight[] =
 4, 5, 3, 4, 4, 5, 4, 5, 5, 6, 3, 4, 4, 5, 4, 5, 5, 6, 4, 5, 5, 6, 5, 6, 6, 7, 3, 4, 4, 5, 4, 5, 5, 
 6, 4, 5, 5, 6, 5, 6, 6, 7, 4, 5, 5, 6, 5, 6, 6, 7, 5, 6, 6, 7, 6, 7, 7, 8};
 
-/* Extracts a point from the passed 2-D NumPy array */
-#define trace_point(n,p) traces[tracedim_p * (traceoffset + t) + (pointoffset + p)]
+/* Work is split in tiles of guesses x points, each thread owns the sums of its tile so no locking is needed */
+#define TILE_GUESSES 16
+#define TILE_POINTS 256
+
+EXPORT void hypothesisSums(
+        double * traces,
+        size_t tracedim_p,
+        size_t ntraces,
+        size_t pointoffset,
+        size_t npoints,
+
+        double * hyp,
+        size_t nguess,
+
+        analysis_state_t * state,
+        int nthreads)
+{
+    long ptiles = (long)((npoints + TILE_POINTS - 1) / TILE_POINTS);
+    long gtiles = (long)((nguess + TILE_GUESSES - 1) / TILE_GUESSES);
+    long tile;
+
+#ifdef _OPENMP
+    if (nthreads <= 0){
+        nthreads = omp_get_max_threads();
+    }
+#endif
+
+    state->totalTraces += ntraces;
+
+    /* MSVC only has OpenMP 2.0, so a signed loop variable & no collapse() */
+    #pragma omp parallel for num_threads(nthreads) schedule(dynamic)
+    for(tile = 0; tile < ptiles * gtiles; tile++){
+        size_t p0 = (size_t)(tile % ptiles) * TILE_POINTS;
+        size_t g0 = (size_t)(tile / ptiles) * TILE_GUESSES;
+        size_t p1 = (p0 + TILE_POINTS < npoints) ? p0 + TILE_POINTS : npoints;
+        size_t g1 = (g0 + TILE_GUESSES < nguess) ? g0 + TILE_GUESSES : nguess;
+
+        for(size_t t = 0; t < ntraces; t++){
+            double * row = traces + tracedim_p * t + pointoffset;
+            double * hrow = hyp + nguess * t;
+
+            for(size_t guess = g0; guess < g1; guess++){
+                double h = hrow[guess];
+                double * out = state->sumht + npoints * guess;
+                for(size_t p = p0; p < p1; p++){
+                    out[p] += h * row[p];
+                }
+            }
+
+            /* Things which don't require guesses, done by the first guess tile of each point tile */
+            if (g0 == 0){
+                for(size_t p = p0; p < p1; p++){
+                    state->sumtq[p] += row[p] * row[p];
+                    state->sumt[p] += row[p];
+                }
+            }
+
+            /* Things which don't require points, done by the first point tile of each guess tile */
+            if (p0 == 0){
+                for(size_t guess = g0; guess < g1; guess++){
+                    state->sumh[guess] += hrow[guess];
+                    state->sumhq[guess] += hrow[guess] * hrow[guess];
+                }
+            }
+        }
+    }
+}
 
 
 EXPORT void oneSubkey(
@@ -72,44 +141,33 @@ EXPORT void oneSubkey(
 
         double * diffoutput)
 {    
-    double htmp;
-    double sumden1, sumden2, sumnum;
     const int nguess = 256;
-    
-    //printf("ntraces = %d\nnpoints=%d\n", ntraces, npoints);
-    state->totalTraces += ntraces;
+    long t, guess;
 
-    /* Things which don't require guesses */
-    for(size_t t = 0; t < ntraces; t++){
-        for(size_t p = 0; p < npoints; p++){
-            state->sumtq[p] += trace_point(t,p) * trace_point(t,p);
-            state->sumt[p] += trace_point(t,p);
-        }
+    /* Hypotheses of the built-in AES models, then the same sums as for a precomputed matrix */
+    double * hyp = (double *)malloc(sizeof(double) * nguess * ntraces);
+    if (hyp == NULL){
+        return;
     }
 
-    /* Things which require guesses */
-    for(unsigned int guess = 0; guess < nguess; guess++){
-        for(size_t t = 0; t < ntraces; t++){
-            htmp = aes_model(guess, datain + 16*t, dataout + 16*t, modeldata);
-            state->hyp[t] = htmp;            
-            state->sumh[guess] += htmp; 
-            state->sumhq[guess] += htmp*htmp;    
-            //printf("%f\n", htmp);
+    #pragma omp parallel for
+    for(t = 0; t < (long)ntraces; t++){
+        for(int g = 0; g < nguess; g++){
+            hyp[nguess*t + g] = aes_model(g, datain + 16*(traceoffset + t), dataout + 16*(traceoffset + t), modeldata);
         }
-        
-        for(size_t t = 0; t < ntraces; t++){
-            for(size_t p = 0; p < npoints; p++){
-                state->sumht[tracedim_p*guess + p] += trace_point(t,p) * state->hyp[t];
-            }            
-        }
-        
+    }
+
+    hypothesisSums(traces + tracedim_p * traceoffset, tracedim_p, ntraces, pointoffset, npoints, hyp, nguess, state, 0);
+    free(hyp);
+
+    #pragma omp parallel for
+    for(guess = 0; guess < nguess; guess++){
+        double sumden1, sumden2, sumnum;
         sumden1 = (state->sumh[guess] * state->sumh[guess]) - ((double)state->totalTraces) * state->sumhq[guess];
-        //printf("%f %f\n", state->sumh[1], state->sumhq[1]);
         for(size_t p = 0; p < npoints; p++){
             sumden2 = (state->sumt[p] * state->sumt[p]) - (((double)state->totalTraces) * state->sumtq[p]);
-            sumnum = ((double)state->totalTraces) * state->sumht[tracedim_p*guess + p] - state->sumh[guess]*state->sumt[p];
-            diffoutput[tracedim_p*guess + p] = sumnum / sqrt(sumden1 * sumden2);
-            //printf("%e %e %e\n", sumden1, sumden2, sumnum);
+            sumnum = ((double)state->totalTraces) * state->sumht[npoints*guess + p] - state->sumh[guess]*state->sumt[p];
+            diffoutput[npoints*guess + p] = sumnum / sqrt(sumden1 * sumden2);
         }
     }
 }
@@ -72,6 +72,21 @@ EXPORT void oneSubkey(
         
         double * diffoutput         /* Output */);
 
+/* Add a block of traces against a precomputed hypothesis matrix to the sums in state. Works for any number of
+   guesses & any leakage model, all sums use npoints (not tracedim_p) as row length. */
+EXPORT void hypothesisSums(
+        double * traces,            /* trace data, 2d array * */
+        size_t tracedim_p,          /* Total size of traces array, points in each trace */
+        size_t ntraces,             /* Number of traces in array */
+        size_t pointoffset,         /* Starting point to use in analysis */
+        size_t npoints,             /* Number of points to use in analysis */
+
+        double * hyp,               /* Hypotheses, ntraces x nguess 2d array */
+        size_t nguess,              /* Number of guesses */
+
+        analysis_state_t * state,   /* Holds CPA State */
+        int nthreads                /* Threads to use, <= 0 uses the OpenMP default */);
+
 #ifdef __cplusplus
 }
 #endif
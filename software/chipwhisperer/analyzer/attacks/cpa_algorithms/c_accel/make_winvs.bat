@@ -1,2 +1,2 @@
 REM This is for using Visual Studio compiler
-cl /LD CPAProgressive.cpp AESModels.cpp /link/out:libcpa.dll
+cl /O2 /openmp /LD CPAProgressive.cpp AESModels.cpp /link/out:libcpa.dll
@@ -467,16 +467,18 @@ class TemplateCSI(object):
         templateMeans = [ np.zeros(numPartitions) for i in range (0, subkeys) ]
         templateCovs = [ np.zeros(numPartitions) for i in range (0, subkeys) ]
 
+        #Partition number of each trace (row) for each subkey (column), from the files saved with the segments
+        self.partObject.setTraceSource(self.getTraceSource())
+        labels = self.partObject.loadPartitions((tstart, tend))
+
         for tnum in range(tstart, tend):
-            partData = self.getTraceSource().getAuxData(tnum, self.partObject.attrDictPartition)["filedata"]
+            trace = self.getTraceSource().getTrace(tnum)
 
             for bnum in range(0, subkeys):
-                for i in range(0, numPartitions):
-
-                    if tnum in partData[bnum][i]:
-                        trace = self.getTraceSource().getTrace(tnum)
-                        trace_fixed = np.dot(trace - trace.mean(), H[bnum]) + 4
-                        templateTraces[bnum][i].append(trace_fixed)
+                i = labels[tnum - tstart, bnum]
+                if 0 <= i < numPartitions:
+                    trace_fixed = np.dot(trace - trace.mean(), H[bnum]) + 4
+                    templateTraces[bnum][i].append(trace_fixed)
 
             if tnum % 100 == 0:
                 logging.debug(tnum)
@@ -29,124 +29,58 @@ import numpy as np
 import math
 
 from ..algorithmsbase import AlgorithmsBase
+from .._moments import CoMoments
+from .._parallel import subkeyTiles, workerChunk, workerContext
 from chipwhisperer.common.utils.pluginmanager import Plugin
 
 
+def hypothesisMoments(model, bnum, traces, plaintexts, ciphertexts, knownkeys):
+    """
+    CoMoments of a block of traces against the hypotheses for every key guess. All guesses are handled at once:
+    hyp is (traces x guesses), so the covariance with the traces becomes a single matrix product.
+    """
+    hyp = model.leakage_batch(plaintexts, ciphertexts, bnum, knownkeys)
+    return CoMoments.fromBlock(hyp, traces)
+
+
+def _hypothesisMomentsTile(tile):
+    """Worker process task: hypothesisMoments() for one (bnum, point range) tile of the chunk in shared memory"""
+    bnum, (pstart, pend) = tile
+    chunk = workerChunk()
+    return hypothesisMoments(workerContext(), bnum, chunk.traces()[:, pstart:pend], chunk.textins(), chunk.textouts(), chunk.knownkeys())
+
+
 class CPAProgressiveOneSubkey(object):
     """This class is the basic progressive CPA attack, capable of adding traces onto a variable with previous data"""
     def __init__(self, model):
         self.model = model
-        self.sumhq = [0] * self.model.getPermPerSubkey()
-        self.sumtq = [0]
-        self.sumt = [0]
-        self.sumh = [0] * self.model.getPermPerSubkey()
-        self.sumht = [0] * self.model.getPermPerSubkey()
+        self.moments = CoMoments()
         self.totalTraces = 0
         self.modelstate = {'knownkey':None}
 
     def oneSubkey(self, bnum, pointRange, traces_all, numtraces, plaintexts, ciphertexts, knownkeys, progressBar, state, pbcnt):
-        diffs = [0] * self.model.getPermPerSubkey()
-        self.totalTraces += numtraces
-
         if pointRange == None:
             traces = traces_all
-            # padbefore = 0
-            # padafter = 0
         else:
             traces = traces_all[:, pointRange[0] : pointRange[1]]
-            # padbefore = pointRange[0]
-            # padafter = len(traces_all[0, :]) - pointRange[1]
-            # print "%d - %d (%d %d)" % (pointRange[0], pointRange[1], padbefore, padafter)
-
-        self.sumtq += np.sum(np.square(traces), axis=0, dtype=np.float64)
-        self.sumt += np.sum(traces, axis=0)
-        sumden2 = (np.square(self.sumt) - self.totalTraces * self.sumtq)
-
-        #For each 0..0xFF possible value of the key byte
-        for key in range(0, self.model.getPermPerSubkey()):
-            #Initialize arrays & variables to zero
-            sumnum = np.zeros(len(traces[0,:]))
-            # sumden1 = np.zeros(len(traces[0,:]))
-            # sumden2 = np.zeros(len(traces[0,:]))
-
-            hyp = [0] * numtraces
-
-            #Formula for CPA & description found in "Power Analysis Attacks"
-            # by Mangard et al, page 124, formula 6.2.
-            #
-            # This has been modified to reduce computational requirements such that adding a new waveform
-            # doesn't require you to recalculate everything
-
-            #Generate hypotheticals
-            for tnum in range(numtraces):
-
-                if len(plaintexts) > 0:
-                    pt = plaintexts[tnum]
-
-                if len(ciphertexts) > 0:
-                    ct = ciphertexts[tnum]
-
-                if knownkeys and len(knownkeys) > 0:
-                    nk = knownkeys[tnum]
-                else:
-                    nk = None
-
-                state['knownkey'] = nk
-
-                hypint = self.model.leakage(pt, ct, key, bnum, state)
-
-                hyp[tnum] = hypint
-
-            hyp = np.array(hyp)
-
-            self.sumh[key] += np.sum(hyp, axis=0)
-            self.sumht[key] += np.sum(np.multiply(np.transpose(traces), hyp), axis=1)
-
-            #WARNING: not casting to np.float64 causes algorithm degredation... always be careful
-            #meanh = self.sumh[key] / np.float64(self.totalTraces)
-            #meant = self.sumt[key] / np.float64(self.totalTraces)
-
-            #numtraces * meanh * meant = sumh * meant
-            #sumnum =  self.sumht[key] - meant*self.sumh[key] - meanh*self.sumt[key] + (self.sumh[key] * meant)
-            #sumnum =  self.sumht[key] - meanh*self.sumt[key]
-#            sumnum =  self.sumht[key] - meanh*self.sumt[key]
-            #sumnum =  self.sumht[key] - self.sumh[key]*self.sumt[key] / np.float64(self.totalTraces)
-            sumnum = self.totalTraces * self.sumht[key] - self.sumh[key] * self.sumt
-
-            self.sumhq[key] += np.sum(np.square(hyp),axis=0, dtype=np.float64)
 
-            #numtraces * meanh * meanh = sumh * meanh
-            #sumden1 = sumhq - (2*meanh*self.sumh) + (numtraces*meanh*meanh)
-            #sumden1 = sumhq - (2*meanh*self.sumh) + (self.sumh * meanh)
-            # sumden1 = sumhq - meanh*self.sumh
-            # similarly for sumden2
-            #sumden1 = self.sumhq[key] - meanh*self.sumh[key]
-            #sumden2 = self.sumtq[key] - meant*self.sumt[key]
-            # sumden = sumden1 * sumden2
+        diffs = self.addMoments(hypothesisMoments(self.model, bnum, traces, plaintexts, ciphertexts, knownkeys))
 
-            #Sumden1/Sumden2 are variance of these variables, may be numeric unstability
-            #See http://en.wikipedia.org/wiki/Algorithms_for_calculating_variance for online update
-            #algorithm which might be better
-            sumden1 = (np.square(self.sumh[key]) - self.totalTraces * self.sumhq[key])
-            sumden = sumden1 * sumden2
-
-            #if sumden.any() < 1E-12:
-            #    print "WARNING: sumden small"
-
-            diffs[key] = sumnum / np.sqrt(sumden)
-
-            if progressBar:
-                progressBar.updateStatus(pbcnt, (self.totalTraces-numtraces, self.totalTraces-1, bnum))
-            pbcnt = pbcnt + 1
-
-            # if padafter > 0:
-            #    diffs[key] = np.concatenate([diffs[key], np.zeros(padafter)])
-
-            # if padbefore > 0:
-            #    diffs[key] = np.concatenate([np.zeros(padbefore), diffs[key]])
+        pbcnt = pbcnt + self.model.getPermPerSubkey()
+        if progressBar:
+            progressBar.updateStatus(pbcnt, (self.totalTraces-numtraces, self.totalTraces-1, bnum))
 
         return (diffs, pbcnt)
 
+    def addMoments(self, moments):
+        """Add a block of traces, reduced to its CoMoments. Returns the new correlation."""
+        #Formula for CPA & description found in "Power Analysis Attacks"
+        # by Mangard et al, page 124, formula 6.2. The sums are kept as centered moments which are merged as traces
+        # are added, see CoMoments.
+        self.moments.merge(moments)
+        self.totalTraces = self.moments.n
+        return self.moments.correlation()
+
 
 class CPAProgressive(AlgorithmsBase, Plugin):
     """
@@ -164,6 +98,41 @@ class CPAProgressive(AlgorithmsBase, Plugin):
         self.updateScript()
 
     def addTraces(self, traceSource, tracerange, progressBar=None, pointRange=None):
+        pool = self.createSubkeyPool(traceSource, tracerange, self._reportingInterval)
+        try:
+            self._addTraces(traceSource, tracerange, progressBar, pointRange, pool)
+        finally:
+            if pool:
+                pool.close()
+
+    def _addChunkParallel(self, pool, cpa, brange, pointRange, traces, textins, textouts, knownkeys, tend, progressBar, pbcnt):
+        """Spread one chunk of traces over the worker pool, statistics are still merged here in the parent"""
+        pool.chunk.load(traces, textins, textouts, knownkeys)
+
+        bptranges = {}
+        for bnum in brange:
+            if isinstance(pointRange, list):
+                bptranges[bnum] = pointRange[bnum]
+            elif pointRange is None:
+                bptranges[bnum] = (0, traces.shape[1])
+            else:
+                bptranges[bnum] = pointRange
+
+        tiles = subkeyTiles(brange, bptranges, pool.workers)
+        results = pool.map(_hypothesisMomentsTile, tiles)
+
+        for bnum in brange:
+            parts = [r for (t, r) in zip(tiles, results) if t[0] == bnum]
+            data = cpa[bnum].addMoments(CoMoments.concatPoints(parts))
+            self.stats.updateSubkey(bnum, data, tnum=tend)
+
+            pbcnt = pbcnt + self.model.getPermPerSubkey()
+            if progressBar:
+                progressBar.updateStatus(pbcnt, (cpa[bnum].totalTraces - len(traces), cpa[bnum].totalTraces - 1, bnum))
+
+        return pbcnt
+
+    def _addTraces(self, traceSource, tracerange, progressBar, pointRange, pool):
         numtraces = tracerange[1] - tracerange[0] + 1
         if progressBar:
             progressBar.setText("Attacking traces subset: from %d to %d (total = %d)" % (tracerange[0], tracerange[1], numtraces))
@@ -194,9 +163,20 @@ class CPAProgressive(AlgorithmsBase, Plugin):
             brange_bf = [0]
             brange_df = self.brange
 
+        #Pick up where a previous run of the same attack stopped
+        tresume = 0
+        if bf:
+            checkpoint = self.loadCheckpoint(traceSource, tracerange, pointRange)
+            if checkpoint is not None:
+                tresume, moments = checkpoint
+                for bnum in self.brange:
+                    self.stats.updateSubkey(bnum, cpa[bnum].addMoments(moments[bnum]), tnum=tresume)
+                if self.sr:
+                    self.sr()
+
         for bnum_df in brange_df:
-            tstart = 0
-            tend = self._reportingInterval
+            tstart = tresume
+            tend = tresume + self._reportingInterval
 
             while tstart < numtraces:
                 if tend > numtraces:
@@ -205,53 +185,46 @@ class CPAProgressive(AlgorithmsBase, Plugin):
                 if tstart > numtraces:
                     tstart = numtraces
 
-                data = []
-                textins = []
-                textouts = []
-                knownkeys = []
-                for i in range(tstart, tend):
-                    # Handle Offset
-                    tnum = i + tracerange[0]
-
-                    try:
-                        data.append(traceSource.getTrace(tnum))
-                        textins.append(traceSource.getTextin(tnum))
-                        textouts.append(traceSource.getTextout(tnum))
-                        knownkeys.append(traceSource.getKnownKey(tnum))
-                    except Exception, e:
-                        progressBar.abort(e.message)
-                        return
+                # Handle Offset
+                try:
+                    traces, textins, textouts, knownkeys = self.loadTraces(traceSource, tstart + tracerange[0], tend + tracerange[0])
+                except Exception, e:
+                    progressBar.abort(e.message)
+                    return
 
-                traces = np.array(data)
-                textins = np.array(textins)
-                textouts = np.array(textouts)
-                # knownkeys = np.array(knownkeys)
-
-                for bnum_bf in brange_bf:
-                    if bf:
-                        bnum = bnum_bf
-                    else:
-                        bnum = bnum_df
-
-                    skip = False
-                    if (self.stats.simplePGE(bnum) != 0) or (skipPGE == False):
-                        if isinstance(pointRange, list):
-                            bptrange = pointRange[bnum]
+                if pool is not None and bf:
+                    pbcnt = self._addChunkParallel(pool, cpa, brange_bf, pointRange, traces, textins, textouts, knownkeys, tend, progressBar, pbcnt)
+                    if progressBar and progressBar.wasAborted():
+                        return
+                else:
+                    for bnum_bf in brange_bf:
+                        if bf:
+                            bnum = bnum_bf
+                        else:
+                            bnum = bnum_df
+
+                        skip = False
+                        if (self.stats.simplePGE(bnum) != 0) or (skipPGE == False):
+                            if isinstance(pointRange, list):
+                                bptrange = pointRange[bnum]
+                            else:
+                                bptrange = pointRange
+                            (data, pbcnt) = cpa[bnum].oneSubkey(bnum, bptrange, traces, len(traces), textins, textouts, knownkeys, progressBar, cpa[bnum].modelstate, pbcnt)
+                            self.stats.updateSubkey(bnum, data, tnum=tend)
                         else:
-                            bptrange = pointRange
-                        (data, pbcnt) = cpa[bnum].oneSubkey(bnum, bptrange, traces, tend - tstart, textins, textouts, knownkeys, progressBar, cpa[bnum].modelstate, pbcnt)
-                        self.stats.updateSubkey(bnum, data, tnum=tend)
-                    else:
-                        skip = True
+                            skip = True
 
-                    if skip:
-                        pbcnt = brangeMap[bnum] * self.model.getPermPerSubkey() * (numtraces / self._reportingInterval + 1)
+                        if skip:
+                            pbcnt = brangeMap[bnum] * self.model.getPermPerSubkey() * (numtraces / self._reportingInterval + 1)
 
-                        if bf is False:
-                            tstart = numtraces
+                            if bf is False:
+                                tstart = numtraces
 
-                    if progressBar and progressBar.wasAborted():
-                        return
+                        if progressBar and progressBar.wasAborted():
+                            return
+
+                if bf:
+                    self.saveCheckpoint(traceSource, tracerange, pointRange, tend, dict((bnum, cpa[bnum].moments) for bnum in self.brange))
 
                 tend += self._reportingInterval
                 tstart += self._reportingInterval
@@ -31,6 +31,7 @@ import sys
 from ctypes import *
 
 from ..algorithmsbase import AlgorithmsBase
+from .._moments import CoMoments
 from chipwhisperer.common.utils.pluginmanager import Plugin
 
 
@@ -64,11 +65,9 @@ class analysis_state_t(Structure):
             ("totalTraces",c_int),
             ("hyp",POINTER(c_double))]
             
-    def __init__(self, npoint=0, ntrace=0):  
+    def __init__(self, npoint=0, ntrace=0, nguess=256):
         super(analysis_state_t,self).__init__()
       
-        nguess = 256
-      
         self._sumhq = np.zeros(nguess, dtype=np.float64)
         self.sumhq = self._sumhq.ctypes.data_as(POINTER(c_double))
       
@@ -120,38 +119,81 @@ class CPAProgressiveOneSubkey(object):
         try:
             dll = CDLL(libname)
         except Exception:
-            raise Exception("Could not import library file. Compile it for your platform first (there is a makefile for that): " + libname)
+            raise Exception("Could not import library file. Compile it for your platform first (python setup.py build_ext --inplace, or the makefile in c_accel): " + libname)
 
         self.osk = dll.oneSubkey
+        #Libraries built before hypothesisSums() was added only have the fixed AES models of oneSubkey()
+        self.hsums = getattr(dll, 'hypothesisSums', None)
         self.modelstate = {'knownkey':None}
 
     def clearStats(self):
-        self.anstate = None
-
-    def oneSubkey(self, bnum, pointRange, traces_all, numtraces, plaintexts, ciphertexts, knownkeys, progressBar, model, state, pbcnt):
-
-        if pointRange == None:
-            traces = traces_all
-            pointstart = 0
+        self.moments = CoMoments()
+        self.totalTraces = 0
+
+    def oneSubkey(self, bnum, pointRange, traces_all, numtraces, plaintexts, ciphertexts, knownkeys, progressBar, model, state, pbcnt, nthreads=1, meant=None):
+        """
+        Add a block of traces. If meant is given traces_all is a contiguous float64 block already centered on meant,
+        so one centered copy can be shared by all subkeys & each just passes its point offset to the C code.
+        """
+        if meant is None:
+            meant = np.mean(traces_all, axis=0, dtype=np.float64)
+            traces_all = np.ascontiguousarray(traces_all - meant, dtype=np.float64)
+
+        if pointRange is None:
+            pointRange = (0, traces_all.shape[1])
+
+        plaintexts = np.ascontiguousarray(plaintexts, dtype=np.uint8)
+        ciphertexts = np.ascontiguousarray(ciphertexts, dtype=np.uint8)
+
+        #The C code only sums up this block, starting from an empty state. Traces are centered first so the raw
+        #sums stay small, the running state is kept as CoMoments exactly like the Python version.
+        if self.hsums is not None:
+            moments = self._hypothesisSums(bnum, pointRange, traces_all, meant, plaintexts, ciphertexts, knownkeys, model, nthreads)
         else:
-            # traces = np.array(traces_all[:, pointRange[0] : pointRange[1]])
-            traces = traces_all[:, pointRange[0] : pointRange[1]]
-            pointstart = pointRange[0]
-
+            moments = self._modelSums(bnum, pointRange, traces_all, meant, plaintexts, ciphertexts, model)
+        guessdata = self.addMoments(moments)
+      
+        if progressBar:
+            progressBar.updateStatus(pbcnt, (self.totalTraces - numtraces, self.totalTraces-1, bnum))
 
-        if (pointRange[0] != 0):
-            raise NotImplementedError("C-Accel only works with full point range on current version.")
+        pbcnt = pbcnt + model.getPermPerSubkey()
 
-        #TODO: Captured traces seem to have extra point, this is temp fix as need to figure out why this is
-        #      happening!?
-        npoints = np.shape(traces)[1]+1
+        return (guessdata, pbcnt)
 
-        if self.anstate is None:
-            self.anstate = analysis_state_t(npoints, numtraces)
+    def _hypothesisSums(self, bnum, pointRange, traces, meant, plaintexts, ciphertexts, knownkeys, model, nthreads):
+        """Sums against the hypotheses of any leakage model, computed here in Python"""
+        hyp = np.asarray(model.leakage_batch(plaintexts, ciphertexts, bnum, knownkeys), dtype=np.float64)
+        meanh = np.mean(hyp, axis=0)
+        hyp = np.ascontiguousarray(hyp - meanh)
+        ntraces, nguess = hyp.shape
+        npoints = pointRange[1] - pointRange[0]
+
+        anstate = analysis_state_t(npoints, 0, nguess)
+        self.hsums(traces.ctypes.data_as(POINTER(c_double)),
+                   c_size_t(traces.shape[1]),
+                   c_size_t(ntraces),
+                   c_size_t(pointRange[0]),
+                   c_size_t(npoints),
+                   hyp.ctypes.data_as(POINTER(c_double)),
+                   c_size_t(nguess),
+                   c_analysis_state_t_ptr(anstate),
+                   c_int(nthreads))
+
+        return CoMoments.fromSums(ntraces, anstate._sumh, anstate._sumhq, anstate._sumt, anstate._sumtq, anstate._sumht,
+                                  meant[pointRange[0]:pointRange[1]], meanh)
+
+    def _modelSums(self, bnum, pointRange, traces, meant, plaintexts, ciphertexts, model):
+        """Sums using the AES models built into the C code, selected by c_model_enum_value"""
+        ntraces = len(traces)
+        npoints = pointRange[1] - pointRange[0]
+        #The prebuilt libraries index traces as if tracedim == npoints, so hand them just the window
+        traces = np.ascontiguousarray(traces[:, pointRange[0]:pointRange[1]], dtype=np.float64)
+
+        anstate = analysis_state_t(npoints, ntraces)
             
         mstate = aesmodel_setup_t(bnum=bnum)
         
-        guessdata = np.zeros((model.getPermPerSubkey(), npoints-pointstart), dtype=np.float64)
+        guessdata = np.zeros((model.getPermPerSubkey(), npoints), dtype=np.float64)
 
         if hasattr(model.getHwModel(), 'c_model_enum_value'):
             mstate.leakagemode = model.getHwModel().c_model_enum_value
@@ -161,23 +203,25 @@ class CPAProgressiveOneSubkey(object):
         self.osk(traces.ctypes.data_as(POINTER(c_double)),
                  plaintexts.ctypes.data_as(POINTER(c_uint8)),
                  ciphertexts.ctypes.data_as(POINTER(c_uint8)),
-                 c_size_t(len(traces)),
+                 c_size_t(ntraces),
                  c_size_t(npoints),
                  c_size_t(0),
-                 c_size_t(numtraces),
-                 c_size_t(pointstart),
+                 c_size_t(ntraces),
+                 c_size_t(0),
                  c_size_t(npoints),
-                 c_analysis_state_t_ptr(self.anstate),
+                 c_analysis_state_t_ptr(anstate),
                  c_void_p(0),
                 c_aesmodel_setup_t_ptr(mstate),
                  guessdata.ctypes.data_as(POINTER(c_double)))
-      
-        if progressBar:
-            progressBar.updateStatus(pbcnt, (self.anstate.totalTraces - numtraces, self.anstate.totalTraces-1, bnum))
 
-        pbcnt = pbcnt + model.getPermPerSubkey()
+        return CoMoments.fromSums(ntraces, anstate._sumh, anstate._sumhq, anstate._sumt, anstate._sumtq, anstate._sumht,
+                                  meant[pointRange[0]:pointRange[1]])
 
-        return (guessdata, pbcnt)
+    def addMoments(self, moments):
+        """Add a block of traces, reduced to its CoMoments. Returns the new correlation."""
+        self.moments.merge(moments)
+        self.totalTraces = self.moments.n
+        return self.moments.correlation()
 
 
 class CPAProgressive_CAccel(AlgorithmsBase, Plugin):
@@ -195,20 +239,16 @@ class CPAProgressive_CAccel(AlgorithmsBase, Plugin):
         ])
         self.updateScript()
 
-
     def addTraces(self, traceSource, tracerange, progressBar=None, pointRange=None):
         brange=self.brange
 
-        numtraces = tracerange[1] - tracerange[0]
+        numtraces = tracerange[1] - tracerange[0] + 1
 
         if progressBar:
             progressBar.setText("Attacking traces: from %d to %d (total = %d)" % (tracerange[0], tracerange[1], numtraces))
             progressBar.setStatusMask("Trace Interval: %d-%d. Current Subkey: %d", (0,0,0))
             progressBar.setMaximum(len(brange) * self.model.getPermPerSubkey() * (numtraces / self._reportingInterval + 1))
         pbcnt = 0
-        #r = Parallel(n_jobs=4)(delayed(traceOneSubkey)(bnum, pointRange, traces_all, numtraces, plaintexts, ciphertexts, keyround, modeltype, progressBar, self.model, pbcnt) for bnum in brange)
-        #self.all_diffs, pb = zip(*r)
-        #pbcnt = 0
         cpa = [None]*(max(brange)+1)
         for bnum in brange:
             cpa[bnum] = CPAProgressiveOneSubkey()
@@ -233,10 +273,21 @@ class CPAProgressive_CAccel(AlgorithmsBase, Plugin):
             brange_df = brange
 
 
+        #Pick up where a previous run of the same attack stopped
+        tresume = 0
+        if bf:
+            checkpoint = self.loadCheckpoint(traceSource, tracerange, pointRange)
+            if checkpoint is not None:
+                tresume, moments = checkpoint
+                for bnum in brange:
+                    self.stats.updateSubkey(bnum, cpa[bnum].addMoments(moments[bnum]), tnum=tresume)
+                if self.sr is not None:
+                    self.sr()
+
         for bnum_df in brange_df:
 
-            tstart = 0
-            tend = self._reportingInterval
+            tstart = tresume
+            tend = tresume + self._reportingInterval
 
             while tstart < numtraces:
                 if tend > numtraces:
@@ -245,27 +296,12 @@ class CPAProgressive_CAccel(AlgorithmsBase, Plugin):
                 if tstart > numtraces:
                     tstart = numtraces
 
-                data = []
-                textins = []
-                textouts = []
-                knownkeys = []
-                for i in range(tstart, tend):
-                    # Handle Offset
-                    tnum = i + tracerange[0]
-
-                    d = traceSource.getTrace(tnum)
-
-                    if d is None:
-                        continue
+                # Handle Offset
+                traces, textins, textouts, knownkeys = self.loadTraces(traceSource, tstart + tracerange[0], tend + tracerange[0])
 
-                    data.append(d)
-                    textins.append(traceSource.getTextin(tnum))
-                    textouts.append(traceSource.getTextout(tnum))
-                    knownkeys.append(traceSource.getKnownKey(tnum))
-
-                traces = np.array(data)
-                textins = np.array(textins)
-                textouts = np.array(textouts)
+                #Centered once, all subkeys share this copy
+                meant = np.mean(traces, axis=0, dtype=np.float64)
+                traces = np.ascontiguousarray(traces - meant, dtype=np.float64)
 
                 for bnum_bf in brange_bf:
 
@@ -281,7 +317,8 @@ class CPAProgressive_CAccel(AlgorithmsBase, Plugin):
                             bptrange = pointRange[bnum]
                         else:
                             bptrange = pointRange
-                        (data, pbcnt) = cpa[bnum].oneSubkey(bnum, bptrange, traces, tend - tstart, textins, textouts, knownkeys, progressBar, self.model, cpa[bnum].modelstate, pbcnt)
+                        (data, pbcnt) = cpa[bnum].oneSubkey(bnum, bptrange, traces, len(traces), textins, textouts, knownkeys, progressBar, self.model, cpa[bnum].modelstate, pbcnt,
+                                                            nthreads=self._workers, meant=meant)
                         self.stats.updateSubkey(bnum, data, tnum=tend)
                     else:
                         skip = True
@@ -292,6 +329,9 @@ class CPAProgressive_CAccel(AlgorithmsBase, Plugin):
                         if bf is False:
                             tstart = numtraces
 
+                if bf:
+                    self.saveCheckpoint(traceSource, tracerange, pointRange, tend, dict((bnum, cpa[bnum].moments) for bnum in brange))
+
                 tend += self._reportingInterval
                 tstart += self._reportingInterval
 
@@ -26,6 +26,7 @@
 
 from collections import OrderedDict
 import inspect
+import numpy as np
 
 from chipwhisperer.analyzer.attacks.models.aes.funcs import sbox, inv_sbox, subbytes, inv_subbytes, mixcolumns, inv_mixcolumns, shiftrows, inv_shiftrows
 
@@ -33,6 +34,14 @@ from base import ModelsBase
 from chipwhisperer.analyzer.attacks.models.aes.key_schedule import keyScheduleRounds
 from chipwhisperer.common.utils.pluginmanager import Plugin
 
+##Precomputed (byte x guess) tables used by the batch leakage functions, i.e. _SBOX_OUT[pt][guess] = sbox(pt ^ guess)
+_SBOX = np.array([sbox(i) for i in range(256)], dtype=np.uint8)
+_INV_SBOX = np.array([inv_sbox(i) for i in range(256)], dtype=np.uint8)
+_XOR = np.bitwise_xor.outer(np.arange(256, dtype=np.uint8), np.arange(256, dtype=np.uint8))
+_SBOX_OUT = _SBOX[_XOR]
+_INV_SBOX_OUT = _INV_SBOX[_XOR]
+_SBOX_IN_OUT = _XOR ^ _SBOX_OUT
+
 class AESLeakageHelper(object):
 
     #Name of AES Model
@@ -106,11 +115,29 @@ class AESLeakageHelper(object):
         """
         raise NotImplementedError("ASKLeakageHelper does not implement leakage")
 
+    def leakage_batch(self, pt, ct, key, bnum):
+        """
+        Optional vectorized version of leakage(), for all 256 guesses of byte 'bnum' at once.
+
+        Args:
+            pt: (ntraces x 16) uint8 array of plain-text inputs.
+            ct: (ntraces x 16) uint8 array of cipher-text outputs.
+            key: (ntraces x 16) uint8 array of known keys, or None if not known.
+            bnum: Byte number we are trying to attack.
+
+        Returns:
+            (ntraces x 256) uint8 array of the values presented on the bus, column 'n' being guess 'n'.
+        """
+        raise NotImplementedError("%s does not implement leakage_batch" % self.__class__.__name__)
+
 class PtKey_XOR(AESLeakageHelper):
     name = 'HW: AddRoundKey Output, First Round (Enc)'
     def leakage(self, pt, ct, key, bnum):
         return pt[bnum] ^ key[bnum]
 
+    def leakage_batch(self, pt, ct, key, bnum):
+        return _XOR[pt[:, bnum]]
+
 class SBox_output(AESLeakageHelper):
     name = 'HW: AES SBox Output, First Round (Enc)'
     c_model_enum_value = 1
@@ -118,6 +145,9 @@ class SBox_output(AESLeakageHelper):
     def leakage(self, pt, ct, key, bnum):
         return self.sbox(pt[bnum] ^ key[bnum])
 
+    def leakage_batch(self, pt, ct, key, bnum):
+        return _SBOX_OUT[pt[:, bnum]]
+
 class InvSBox_output(AESLeakageHelper):
     name = 'HW: AES Inv SBox Output, First Round (Dec)'
     c_model_enum_value = 6
@@ -125,6 +155,9 @@ class InvSBox_output(AESLeakageHelper):
     def leakage(self, pt, ct, key, bnum):
         return self.inv_sbox(pt[bnum] ^ key[bnum])
 
+    def leakage_batch(self, pt, ct, key, bnum):
+        return _INV_SBOX_OUT[pt[:, bnum]]
+
 class LastroundStateDiff(AESLeakageHelper):
     name = 'HD: AES Last-Round State'
     c_model_enum_value = 2
@@ -136,6 +169,9 @@ class LastroundStateDiff(AESLeakageHelper):
         st9 = inv_sbox(ct[bnum] ^ key[bnum])
         return (st9 ^ st10)
 
+    def leakage_batch(self, pt, ct, key, bnum):
+        return _INV_SBOX_OUT[ct[:, bnum]] ^ ct[:, self.INVSHIFT_undo[bnum], None]
+
     def processKnownKey(self, inpkey):
         return keyScheduleRounds(inpkey, 0, 10)
 
@@ -147,6 +183,9 @@ class LastroundStateDiffAlternate(AESLeakageHelper):
         st9 = inv_sbox(ct[bnum] ^ key[bnum])
         return (st9 ^ st10)
 
+    def leakage_batch(self, pt, ct, key, bnum):
+        return _INV_SBOX_OUT[ct[:, bnum]] ^ ct[:, bnum, None]
+
     def processKnownKey(self, inpkey):
         k = keyScheduleRounds(inpkey, 0, 10)
         k = self.shiftrows(k)
@@ -161,6 +200,9 @@ class SBoxInOutDiff(AESLeakageHelper):
         st2 = self.sbox(st1)
         return st1 ^ st2
 
+    def leakage_batch(self, pt, ct, key, bnum):
+        return _SBOX_IN_OUT[pt[:, bnum]]
+
 class SBoxInputSuccessive(AESLeakageHelper):
     name = 'HD: AES SBox Input i to i+1'
     c_model_enum_name = 4
@@ -176,6 +218,14 @@ class SBoxInputSuccessive(AESLeakageHelper):
             st2 = 0
         return st1 ^ st2
 
+    def leakage_batch(self, pt, ct, key, bnum):
+        st1 = _XOR[pt[:, bnum]]
+        if bnum > 0:
+            if key is None:
+                raise ValueError("Successive requires known key")
+            st1 = st1 ^ (pt[:, bnum - 1] ^ key[:, bnum - 1])[:, None]
+        return st1
+
 class SBoxOutputSuccessive(AESLeakageHelper):
     name = 'HD: AES SBox Output i to i+1'
     c_model_enum_value = 5
@@ -191,11 +241,22 @@ class SBoxOutputSuccessive(AESLeakageHelper):
             st2 = 0
         return st1 ^ st2
 
+    def leakage_batch(self, pt, ct, key, bnum):
+        st1 = _SBOX_OUT[pt[:, bnum]]
+        if bnum > 0:
+            if key is None:
+                raise ValueError("Successive requires known key")
+            st1 = st1 ^ _SBOX[pt[:, bnum - 1] ^ key[:, bnum - 1]][:, None]
+        return st1
+
 class AfterKeyMixin(AESLeakageHelper):
     name = 'HW: AES After Key/PT Addition'
     def leakage(self, pt, ct, key, bnum):
         return pt[bnum] ^ key[bnum]
 
+    def leakage_batch(self, pt, ct, key, bnum):
+        return _XOR[pt[:, bnum]]
+
 class Mixcolumns_output(AESLeakageHelper):
     name = 'HW: AES Mixcolumns Output'
     #This is mostly a nonsense leakage model for now, but added for completeness
@@ -265,6 +326,8 @@ class AES128_8bit(ModelsBase, Plugin):
         ModelsBase.__init__(self, 16, 256, model=model)
         self.numRoundKeys = 10
         self._mask = bitmask
+        #HW of every masked intermediate value, for the batch leakage
+        self._hwtable = np.array([self.HW[self._mask & i] for i in range(256)], dtype=np.uint8)
 
     def _updateHwModel(self):
         """" Re-implement this to update leakage model """
@@ -316,5 +379,26 @@ class AES128_8bit(ModelsBase, Plugin):
         #Return HW of guess
         return self.HW[intermediate_value]
 
+    def leakage_batch(self, pt_array, ct_array, bnum, knownkeys=None):
+        try:
+            pt = np.asarray(pt_array, dtype=np.uint8)
+            ct = np.asarray(ct_array, dtype=np.uint8)
+        except (TypeError, ValueError):
+            #Missing text for some traces, let the scalar model deal with it
+            return ModelsBase.leakage_batch(self, pt_array, ct_array, bnum, knownkeys)
+
+        if knownkeys is None or len(knownkeys) == 0 or any(k is None for k in knownkeys):
+            key = None
+        else:
+            key = np.asarray(knownkeys, dtype=np.uint8)
+
+        try:
+            intermediate_values = self.modelobj.leakage_batch(pt, ct, key, bnum)
+        except NotImplementedError:
+            return ModelsBase.leakage_batch(self, pt_array, ct_array, bnum, knownkeys)
+
+        #Mask & HW in one lookup
+        return self._hwtable[intermediate_values]
+
     def keyScheduleRounds(self, inputkey, inputround, desiredround):
         return keyScheduleRounds(inputkey, inputround, desiredround)
\ No newline at end of file
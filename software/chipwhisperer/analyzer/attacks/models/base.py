@@ -14,6 +14,7 @@
 #    along with chipwhisperer.  If not, see <http://www.gnu.org/licenses/>.
 #=================================================
 import sys
+from collections import OrderedDict
 
 from chipwhisperer.common.utils.parameter import Parameterized, setupSetParam
 from chipwhisperer.common.utils import util
@@ -95,6 +96,68 @@ class ModelsBase(Parameterized):
     def leakage(self, pt, ct, guess, bnum, state):
         pass
 
+    def leakage_batch(self, pt_array, ct_array, bnum, knownkeys=None):
+        """
+        Leakage for every guess of subkey bnum over a block of traces.
+
+        Args:
+            pt_array: Plaintexts, one row per trace (may be empty if not used by the model).
+            ct_array: Ciphertexts, one row per trace (may be empty if not used by the model).
+            bnum: Subkey number we are trying to attack.
+            knownkeys: Known key for each trace, or None.
+
+        Returns:
+            uint8 array of shape (ntraces, permPerSubkey) with the leakage of each trace/guess pair.
+
+        Models with a vectorized implementation override this, otherwise it falls back to calling
+        leakage() once per trace and guess.
+        """
+        if pt_array is None:
+            pt_array = []
+        if ct_array is None:
+            ct_array = []
+
+        ntraces = max(len(pt_array), len(ct_array))
+        nguess = self.getPermPerSubkey()
+        hyp = np.empty((ntraces, nguess), dtype=np.uint8)
+        state = {'knownkey':None}
+
+        pt = None
+        ct = None
+        for tnum in range(ntraces):
+            if len(pt_array) > 0:
+                pt = pt_array[tnum]
+
+            if len(ct_array) > 0:
+                ct = ct_array[tnum]
+
+            if knownkeys is not None and len(knownkeys) > 0:
+                state['knownkey'] = knownkeys[tnum]
+            else:
+                state['knownkey'] = None
+
+            row = hyp[tnum]
+            for guess in range(0, nguess):
+                row[guess] = self.leakage(pt, ct, guess, bnum, state)
+
+        return hyp
+
+    def _dict_repr(self):
+        """Settings that change the leakage, e.g. to tell if saved attack state came from the same model"""
+        dict = OrderedDict()
+        dict['model'] = self.__class__.__name__
+        hwmodel = self.getHwModel()
+        dict['hw_model'] = getattr(hwmodel, '__name__', hwmodel)
+        if hasattr(self, '_mask'):
+            dict['bitmask'] = self._mask
+        return dict
+
+    def __repr__(self):
+        return util.dict_to_str(self._dict_repr())
+
+    def __str__(self):
+        return self.__repr__()
+
     def getNumSubKeys(self):
         return self.numSubKeys
 
@@ -48,18 +48,28 @@ class NormBase(object):
     def loadZFile(self, f):
         pass
 
+    def processTraces(self, traces, start):
+        """Normalize a block of traces, row i being trace start+i"""
+        return np.array([self.processTrace(t, start + i) for i, t in enumerate(traces)])
+
 
 class NormMean(NormBase):
     """Normalize by mean (e.g. make traces zero-mean)"""
     def processTrace(self, t, tindex):
         return t - np.mean(t)
 
+    def processTraces(self, traces, start):
+        return traces - np.mean(traces, axis=1, keepdims=True)
+
 
 class NormMeanStd(NormBase):
     """Normalize by mean & std-dev """
     def processTrace(self, t, tindex):
         return (t - np.mean(t)) / np.std(t)
 
+    def processTraces(self, traces, start):
+        return (traces - np.mean(traces, axis=1, keepdims=True)) / np.std(traces, axis=1, keepdims=True)
+
 
 class Normalize(PreprocessingBase):
     """
@@ -120,4 +130,16 @@ class Normalize(PreprocessingBase):
 
             return proc
         else:
-            return self._traceSource.getTrace(n)
\ No newline at end of file
+            return self._traceSource.getTrace(n)
+
+    def getTraces(self, start, end, pointRange=None):
+        """Normalize traces start to end-1 as one block (always over the whole trace)"""
+        if not self.enabled:
+            return self._traceSource.getTraces(start, end, pointRange)
+
+        if pointRange is None:
+            pointRange = (0, None)
+        traces = self._traceSource.getTraces(start, end)
+        if len(traces) == 0:
+            return traces
+        return self._norm.processTraces(traces, start)[:, pointRange[0]:pointRange[1]]
\ No newline at end of file
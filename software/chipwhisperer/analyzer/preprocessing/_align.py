@@ -0,0 +1,138 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2013-2017, NewAE Technology Inc
+# All rights reserved.
+#
+# Find this and more at newae.com - this file is part of the chipwhisperer
+# project, http://www.assembla.com/spaces/chipwhisperer
+#
+#    This file is part of chipwhisperer.
+#
+#    chipwhisperer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    chipwhisperer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with chipwhisperer.  If not, see <http://www.gnu.org/licenses/>.
+#=================================================
+"""
+Block-wise alignment used by the resync modules: score every candidate shift of a whole (traces x points) block
+against the reference at once, then shift all the traces in one go.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from scipy.fftpack import next_fast_len
+
+#Largest temporary (in array elements) made while scoring a block, small enough to stay in cache
+maxTempElements = 1 << 18
+
+
+def shiftTraces(traces, diffs):
+    """Row i of the result is traces[i] moved left by diffs[i] points (right if negative), zero filled"""
+    traces = np.asarray(traces)
+    diffs = np.asarray(diffs)
+    npoints = traces.shape[1]
+    out = np.zeros(traces.shape)
+    #One slice copy per distinct shift (at most 2*maxshift of them) rather than gathering point by point
+    for diff in np.unique(diffs):
+        rows = np.flatnonzero(diffs == diff)
+        if abs(diff) >= npoints:
+            continue
+        if diff >= 0:
+            out[rows, :npoints - diff] = traces[rows, diff:]
+        else:
+            out[rows, -diff:] = traces[rows, :diff]
+    return out
+
+
+class SADAligner(object):
+    """
+    Sum of absolute difference between the reference and the window starting at start+shift of each trace, for shifts
+    -maxshift to maxshift-1. The windows of all shifts are a strided view of the traces, no copies.
+    """
+
+    def __init__(self, reference, start, maxshift):
+        self.reference = np.asarray(reference, dtype=np.float64)
+        self.start = start
+        self.maxshift = maxshift
+
+    def scores(self, traces):
+        """(traces x 2*maxshift) SAD, lowest is the best match"""
+        traces = np.asarray(traces, dtype=np.float64)
+        if traces.ndim == 1:
+            traces = traces[None, :]
+        wdlen = len(self.reference)
+        nshifts = 2 * self.maxshift
+        first = self.start - self.maxshift
+
+        if first < 0:
+            raise ValueError("Invalid size or maximum shift, starting search location is < 0")
+
+        if self.maxshift + self.start + wdlen > traces.shape[1]:
+            raise ValueError("Invalid size or maximum shift, ending search location is outside trace")
+
+        sad = np.zeros((traces.shape[0], nshifts))
+        if nshifts == 0 or traces.shape[0] == 0 or wdlen == 0:
+            return sad
+
+        #windows[t, s, :] is traces[t, first+s:first+s+wdlen]
+        region = np.ascontiguousarray(traces[:, first:first + nshifts + wdlen - 1])
+        windows = as_strided(region, shape=(region.shape[0], nshifts, wdlen),
+                             strides=(region.strides[0], region.strides[1], region.strides[1]))
+
+        #Do as many traces (or for long windows, shifts) at a time as fit in the temporary size
+        tstep = max(1, maxTempElements // (nshifts * wdlen))
+        sstep = max(1, maxTempElements // wdlen) if tstep == 1 else nshifts
+        for t in range(0, traces.shape[0], tstep):
+            for s in range(0, nshifts, sstep):
+                diff = windows[t:t + tstep, s:s + sstep] - self.reference
+                np.abs(diff, out=diff)
+                sad[t:t + tstep, s:s + sstep] = np.sum(diff, axis=2)
+        return sad
+
+
+class CorrelationAligner(object):
+    """
+    Cross-correlation of each trace with the reference, same as fftconvolve(trace, reference[::-1], 'valid') but for a
+    whole block of traces with one batched real FFT. The reference transform is kept between calls.
+    """
+
+    def __init__(self, reference):
+        self.reference = np.asarray(reference, dtype=np.float64)
+        self._nfft = None
+        self._refFFT = None
+
+    def _referenceFFT(self, npoints):
+        nfft = next_fast_len(npoints)
+        if nfft != self._nfft:
+            self._refFFT = np.conj(np.fft.rfft(self.reference, nfft))
+            self._nfft = nfft
+        return self._refFFT
+
+    def scores(self, traces):
+        """(traces x points-len(reference)+1) correlation, highest is the best match"""
+        traces = np.asarray(traces, dtype=np.float64)
+        if traces.ndim == 1:
+            traces = traces[None, :]
+        npoints = traces.shape[1]
+        nvalid = npoints - len(self.reference) + 1
+        if nvalid <= 0 or traces.shape[0] == 0:
+            return np.zeros((traces.shape[0], max(nvalid, 0)))
+
+        refFFT = self._referenceFFT(npoints)
+        #Circular correlation over nfft >= npoints points doesn't wrap in the first nvalid outputs
+        tstep = max(1, maxTempElements // self._nfft)
+        cross = np.empty((traces.shape[0], nvalid))
+        for t in range(0, traces.shape[0], tstep):
+            spectrum = np.fft.rfft(traces[t:t + tstep], self._nfft, axis=1)
+            spectrum *= refFFT
+            cross[t:t + tstep] = np.fft.irfft(spectrum, self._nfft, axis=1)[:, :nvalid]
+        return cross
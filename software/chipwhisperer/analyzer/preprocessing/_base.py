@@ -99,6 +99,22 @@ class PreprocessingBase(TraceSource, ActiveTraceObserver, AutoScript, Plugin):
         else:
             return self._traceSource.getTrace(n)
 
+    def getTraces(self, start, end, pointRange=None):
+        """Get traces start to end-1, straight from the previous source when this module is disabled"""
+        if self.enabled:
+            return TraceSource.getTraces(self, start, end, pointRange)
+        else:
+            return self._traceSource.getTraces(start, end, pointRange)
+
+    def getTextins(self, start, end):
+        return self._traceSource.getTextins(start, end)
+
+    def getTextouts(self, start, end):
+        return self._traceSource.getTextouts(start, end)
+
+    def getKnownKeys(self, start, end):
+        return self._traceSource.getKnownKeys(start, end)
+
     def getTextin(self, n):
         """Get text-in number n"""
         return self._traceSource.getTextin(n)
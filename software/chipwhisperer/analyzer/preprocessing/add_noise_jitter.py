@@ -28,6 +28,7 @@
 import random
 import numpy as np
 from ._base import PreprocessingBase
+from ._align import shiftTraces
 from chipwhisperer.common.utils.parameter import setupSetParam
 
 
@@ -83,6 +84,19 @@ class AddNoiseJitter(PreprocessingBase):
         else:
             return self._traceSource.getTrace(n)
 
+    def getTraces(self, start, end, pointRange=None):
+        """Jitter traces start to end-1 as one block"""
+        if not self.enabled:
+            return self._traceSource.getTraces(start, end, pointRange)
+
+        if pointRange is None:
+            pointRange = (0, None)
+        traces = self._traceSource.getTraces(start, end)
+        if len(traces) == 0:
+            return traces
+        jit = [random.randint(-self._maxJitter, self._maxJitter) for _ in range(len(traces))]
+        return shiftTraces(traces, -np.array(jit))[:, pointRange[0]:pointRange[1]]
+
         
 # This function stolen from: http://stackoverflow.com/questions/2777907/python-numpy-roll-with-padding
 def roll_zeropad(a, shift, axis=None):
@@ -79,3 +79,10 @@ class AddNoiseRandom(PreprocessingBase):
                 return trace + np.random.normal(scale=self._noise_std_dev, size=len(trace))
         else:
             return self._traceSource.getTrace(n)
+
+    def getTraces(self, start, end, pointRange=None):
+        """Add noise to traces start to end-1 as one block"""
+        traces = self._traceSource.getTraces(start, end, pointRange)
+        if not self.enabled or self._noise_std_dev == 0:
+            return traces
+        return traces + np.random.normal(scale=self._noise_std_dev, size=traces.shape)
@@ -69,15 +69,22 @@ class DecimationFixed(PreprocessingBase):
             if trace is None:
                 return None
 
-            outtrace = np.zeros(len(range(0, len(trace), self._dec_factor)))
-
-            for idx, val in enumerate(range(0, len(trace), self._dec_factor)):
-                outtrace[idx] = trace[val]
-
-            return outtrace
+            return np.array(trace[::self._dec_factor], dtype=np.float64)
         else:
             return self._traceSource.getTrace(n)
 
+    def getTraces(self, start, end, pointRange=None):
+        """Decimate traces start to end-1 as one block, reading only the points that are kept"""
+        if not self.enabled:
+            return self._traceSource.getTraces(start, end, pointRange)
+
+        if pointRange is None:
+            pointRange = (0, None)
+        pstart = pointRange[0] * self._dec_factor
+        pend = None if pointRange[1] is None else pointRange[1] * self._dec_factor
+        traces = self._traceSource.getTraces(start, end, (pstart, pend))
+        return np.array(traces[:, ::self._dec_factor], dtype=np.float64)
+
     def numPoints(self):
         if self.enabled:
             return len(range(0, self._traceSource.numPoints(), self._dec_factor))
@@ -50,6 +50,7 @@ class Filter(PreprocessingBase):
         self._freq1 = 0.1
         self._freq2 = 0.8
         self._order = 5
+        self._zeroPhase = False
 
         self.getParams().addChildren([
             {'name':'Form', 'key':'form', 'type':'list', 'values':{"Butterworth":"sp.signal.butter"}, 'default':"sp.signal.butter", 'value':"sp.signal.butter"},
@@ -57,6 +58,8 @@ class Filter(PreprocessingBase):
             {'name':'Critical Freq #1 (0-1)', 'key':'freq1', 'type':'float', 'limits':(0, 1), 'step':0.05, 'get':self._getFreq1, 'set':self._setFreq1},
             {'name':'Critical Freq #2 (0-1)', 'key':'freq2', 'type':'float', 'limits':(0, 1), 'step':0.05, 'get':self._getFreq2, 'set':self._setFreq2},
             {'name':'Order', 'key':'order', 'type':'int', 'limits':(1, 32), 'get':self._getOrder, 'set':self._setOrder},
+            {'name':'Zero Phase', 'key':'zerophase', 'type':'bool', 'get':self._getZeroPhase, 'set':self._setZeroPhase,
+             'tip':'Filter forwards & backwards so the output is not delayed'},
         ])
         self._updateFilterParams()
 
@@ -165,12 +168,41 @@ class Filter(PreprocessingBase):
             raise TypeError("Expected int; got %s" % type(order), order)
         self._setOrder(order)
 
+    def _getZeroPhase(self):
+        return self._zeroPhase
+
+    @setupSetParam("Zero Phase")
+    def _setZeroPhase(self, enabled):
+        self._zeroPhase = enabled
+
+    @property
+    def zero_phase(self):
+        """Whether the filter is run forwards & backwards (no delay, but the
+        output depends on later samples).
+
+        Setter raises TypeError if value not a bool.
+        """
+        return self._getZeroPhase()
+
+    @zero_phase.setter
+    def zero_phase(self, enabled):
+        if not isinstance(enabled, bool):
+            raise TypeError("Expected bool; got %s" % type(enabled), enabled)
+        self._setZeroPhase(enabled)
+
     def _setFilterForm(self, filtform=signal.butter):
         """Set the filter type in object"""
         self.filterForm = filtform
 
     def _setFilterParams(self, form='low', freq=0.8, order=5):
         self.b, self.a = self.filterForm(order, freq, form)
+        #Second-order sections are what's actually used, they stay stable at high orders where b/a don't
+        self.sos = self.filterForm(order, freq, form, output='sos')
+
+    def _filter(self, traces):
+        if self._zeroPhase:
+            return signal.sosfiltfilt(self.sos, traces, axis=-1)
+        return signal.sosfilt(self.sos, traces, axis=-1)
 
     def _updateFilterParams(self):
         if self._type in ("bandpass", "bandstop"):
@@ -185,6 +217,20 @@ class Filter(PreprocessingBase):
             trace = self._traceSource.getTrace(n)
             if trace is None:
                 return None
-            return signal.lfilter(self.b, self.a, trace)
+            return self._filter(trace)
         else:
             return self._traceSource.getTrace(n)
+
+    def getTraces(self, start, end, pointRange=None):
+        """Filter traces start to end-1 as one block"""
+        if not self.enabled:
+            return self._traceSource.getTraces(start, end, pointRange)
+
+        if pointRange is None:
+            pointRange = (0, None)
+
+        #Without zero phase the output only depends on earlier points, so later ones don't need to be read
+        traces = self._traceSource.getTraces(start, end, None if self._zeroPhase else (0, pointRange[1]))
+        if len(traces) == 0:
+            return traces
+        return self._filter(traces)[:, pointRange[0]:pointRange[1]]
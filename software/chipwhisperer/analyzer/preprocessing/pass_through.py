@@ -40,3 +40,6 @@ class PassThrough(PreprocessingBase):
 
     def getTrace(self, n):
         return self._traceSource.getTrace(n)
+
+    def getTraces(self, start, end, pointRange=None):
+        return self._traceSource.getTraces(start, end, pointRange)
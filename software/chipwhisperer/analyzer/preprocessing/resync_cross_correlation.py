@@ -26,10 +26,10 @@
 #=================================================
 
 import numpy as np
-import scipy as sp
 
 from chipwhisperer.common.results.base import ResultsBase
 from ._base import PreprocessingBase
+from ._align import CorrelationAligner, shiftTraces
 from chipwhisperer.common.utils.parameter import setupSetParam
 
 
@@ -107,11 +107,10 @@ class ResyncCrossCorrelation(PreprocessingBase):
    
     def getTrace(self, n):
         if self.enabled:
-            #TODO: fftconvolve
             trace = self._traceSource.getTrace(n)
             if trace is None:
                 return None
-            cross = sp.signal.fftconvolve(trace, self._reftrace, mode='valid')
+            cross = self._aligner.scores(trace)[0]
             if self._debugReturnCorr:
                 return cross
             newmaxloc = np.argmax(cross[self._ccStart:self._ccEnd])
@@ -119,15 +118,28 @@ class ResyncCrossCorrelation(PreprocessingBase):
             # if (maxval > self.refmaxsize * 1.01) | (maxval < self.refmaxsize * 0.99):
             #    return None
             
-            diff = newmaxloc-self._refmaxloc
-            if diff < 0:
-                trace = np.append(np.zeros(-diff), trace[:diff])
-            elif diff > 0:
-                trace = np.append(trace[diff:], np.zeros(diff))
-            return trace
+            return shiftTraces(trace[None, :], [newmaxloc - self._refmaxloc])[0]
             
         else:
             return self._traceSource.getTrace(n)
+
+    def getTraces(self, start, end, pointRange=None):
+        """Align traces start to end-1 as one block, correlating all of them with one batched FFT"""
+        if not self.enabled:
+            return self._traceSource.getTraces(start, end, pointRange)
+
+        if pointRange is None:
+            pointRange = (0, None)
+
+        traces = self._traceSource.getTraces(start, end)
+        if len(traces) == 0:
+            return traces
+        cross = self._aligner.scores(traces)
+        if self._debugReturnCorr:
+            return cross[:, pointRange[0]:pointRange[1]]
+        newmaxloc = np.argmax(cross[:, self._ccStart:self._ccEnd], axis=1)
+        traces = shiftTraces(traces, newmaxloc - self._refmaxloc)
+        return traces[:, pointRange[0]:pointRange[1]]
    
     def _calculateRef(self):
         try:
@@ -142,7 +154,7 @@ class ResyncCrossCorrelation(PreprocessingBase):
 
         self._reftrace = self._traceSource.getTrace(tnum)[self._ccStart:self._ccEnd]
         self._reftrace = self._reftrace[::-1]
-        #TODO: fftconvolve
-        cross = sp.signal.fftconvolve(self._traceSource.getTrace(tnum), self._reftrace, mode='valid')
+        self._aligner = CorrelationAligner(self._reftrace[::-1])
+        cross = self._aligner.scores(self._traceSource.getTrace(tnum))[0]
         self._refmaxloc = np.argmax(cross[self._ccStart:self._ccEnd])
         self._refmaxsize = max(cross[self._ccStart:self._ccEnd])
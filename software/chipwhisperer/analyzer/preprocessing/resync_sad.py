@@ -29,6 +29,7 @@ import numpy as np
 
 from chipwhisperer.common.results.base import ResultsBase
 from ._base import PreprocessingBase
+from ._align import SADAligner, shiftTraces
 from chipwhisperer.common.utils.parameter import setupSetParam
 from collections import OrderedDict
 
@@ -48,6 +49,7 @@ class ResyncSAD(PreprocessingBase):
         self._wdStart = 0
         self._wdEnd = 1
         self._maxshift = 1
+        self._aligner = None
 
         if connectTracePlot:
             traceplot = ResultsBase.registeredObjects["Trace Output Plot"]
@@ -173,14 +175,37 @@ class ResyncSAD(PreprocessingBase):
             if maxval > self.maxthreshold:
                 return None
             
-            diff = newmaxloc-self.refmaxloc
-            if diff < 0:
-                trace = np.append(np.zeros(-diff), trace[:diff])
-            elif diff > 0:
-                trace = np.append(trace[diff:], np.zeros(diff))
-            return trace
+            return shiftTraces(trace[None, :], [newmaxloc - self.refmaxloc])[0]
         else:
             return self._traceSource.getTrace(n)
+
+    def getTraces(self, start, end, pointRange=None):
+        """Align traces start to end-1 as one block. Raises ValueError if any is rejected, as getTrace() returns None"""
+        if not self.enabled:
+            return self._traceSource.getTraces(start, end, pointRange)
+
+        if self._init_not_done:
+            self._calculateRef()
+            self._init_not_done = False
+
+        if pointRange is None:
+            pointRange = (0, None)
+
+        traces = self._traceSource.getTraces(start, end)
+        if len(traces) == 0:
+            return traces
+        sad = self._findSAD(traces)
+        if self._debugReturnSad:
+            return sad[:, pointRange[0]:pointRange[1]]
+        if sad.shape[1] == 0:
+            raise ValueError("Traces %d-%d not available, no shifts to search" % (start, end - 1))
+
+        rejected = np.flatnonzero(np.min(sad, axis=1) > self.maxthreshold)
+        if len(rejected):
+            raise ValueError("Trace %d not available, rejected by %s" % (start + rejected[0], self.getName()))
+
+        traces = shiftTraces(traces, np.argmin(sad, axis=1) - self.refmaxloc)
+        return traces[:, pointRange[0]:pointRange[1]]
    
     def _calculateRef(self):
         try:
@@ -191,33 +216,18 @@ class ResyncSAD(PreprocessingBase):
             pass
         
     def _findSAD(self, inputtrace):
-        sadlen = self._maxshift * 2
-        sadarray = np.ones(sadlen)*1E6
-
-        wdlen = self._wdEnd - self._wdStart
-
-        #Shift values
-        minshift = -self._maxshift
-        maxshift = self._maxshift
-
-        if minshift + self._wdStart < 0:
-            raise ValueError("Invalid size or maximum shift, starting search location is < 0")
-
-        if maxshift + self._wdEnd > len(inputtrace):
-            raise ValueError("Invalid size or maximum shift, ending search location is outside trace")
-
-        for ptoffset in range(minshift, maxshift):
-            ptstart = ptoffset + self._wdStart
-            diff_data = inputtrace[ptstart:(ptstart+wdlen)] - self.reftrace
-            abs_data = np.abs(diff_data)
-            sadarray[ptoffset + self._maxshift] = np.sum(abs_data)
-        return sadarray
+        """SAD of each shift for one trace, or a (traces x shifts) array for a block of them"""
+        if self._aligner is None or self._aligner.maxshift != self._maxshift:
+            self._aligner = SADAligner(self.reftrace, self._wdStart, self._maxshift)
+        sad = self._aligner.scores(inputtrace)
+        return sad[0] if np.ndim(inputtrace) == 1 else sad
         
     def calcRefTrace(self, tnum):
         if self.enabled == False:
             return
         
         self.reftrace = self._traceSource.getTrace(tnum)[self._wdStart:self._wdEnd]
+        self._aligner = SADAligner(self.reftrace, self._wdStart, self._maxshift)
         sad = self._findSAD(self._traceSource.getTrace(tnum))
         self.refmaxloc = np.argmin(sad)
         self.refmaxsize = min(sad)
@@ -36,6 +36,13 @@ from chipwhisperer.analyzer.attacks.models.aes.key_schedule import keyScheduleRo
 from chipwhisperer.common.utils.parameter import Parameterized
 from chipwhisperer.common.utils import util
 
+_SBOX = np.array([sbox(i) for i in range(256)], dtype=np.uint8)
+_INV_SBOX = np.array([inv_sbox(i) for i in range(256)], dtype=np.uint8)
+_HW = np.array([AES128_8bit.getHW(i) for i in range(256)], dtype=np.uint8)
+
+#Position of each byte of the last-round state before ShiftRows
+_INVSHIFT = [0, 5, 10, 15, 4, 9, 14, 3, 8, 13, 2, 7, 12, 1, 6, 11]
+
 
 class PartitionHDLastRound(object):
 
@@ -59,11 +66,26 @@ class PartitionHDLastRound(object):
 
         guess = [0] * 16
         for i in range(0, 16):
-            st10 = ct[AES128_8bit.INVSHIFT[i]]
+            st10 = ct[_INVSHIFT[i]]
             st9 = inv_sbox(ct[i] ^ key[i])
             guess[i] = AES128_8bit.getHW(st9 ^ st10)
         return guess
 
+    def getPartitionNums(self, trace, start, end):
+        keys = np.asarray(trace.getKnownKeys(start, end), dtype=np.uint8)
+        ct = np.asarray(trace.getTextouts(start, end), dtype=np.uint8)
+
+        if keys.shape[1] != 16:
+            raise ValueError("Need to implement for selected AES")
+
+        #Key schedule only done once per different key
+        ukeys, kidx = np.unique(keys, axis=0, return_inverse=True)
+        lastkeys = np.array([keyScheduleRounds(list(k), 0, 10) for k in ukeys], dtype=np.uint8)[kidx]
+
+        st10 = ct[:, _INVSHIFT]
+        st9 = _INV_SBOX[ct ^ lastkeys]
+        return _HW[st9 ^ st10]
+
 
 class PartitionHWIntermediate(object):
 
@@ -83,6 +105,11 @@ class PartitionHWIntermediate(object):
 
         return guess
 
+    def getPartitionNums(self, trace, start, end):
+        keys = np.asarray(trace.getKnownKeys(start, end), dtype=np.uint8)
+        text = np.asarray(trace.getTextins(start, end), dtype=np.uint8)
+        return _HW[_SBOX[text ^ keys]]
+
 
 class PartitionEncKey(object):
 
@@ -96,6 +123,9 @@ class PartitionEncKey(object):
         key = trace.getKnownKey(tnum)
         return key
 
+    def getPartitionNums(self, trace, start, end):
+        return np.asarray(trace.getKnownKeys(start, end), dtype=np.uint8)
+
 
 class PartitionRandvsFixed(object):
     """The Rand vs Fixed partition works with the TVLA test to randomly interleave random and fixed plaintexts.
@@ -109,6 +139,11 @@ class PartitionRandvsFixed(object):
     sectionName = "Partition Based on Rand vs Fixed "
     partitionType = "Rand vs Fixed"
 
+    #Fixed plaintext for each key length
+    fixedText = {16:util.hexStrToByteArray("da 39 a3 ee 5e 6b 4b 0d 32 55 bf ef 95 60 18 90"),
+                 24:util.hexStrToByteArray("da 39 a3 ee 5e 6b 4b 0d 32 55 bf ef 95 60 18 88"),
+                 32:util.hexStrToByteArray("da 39 a3 ee 5e 6b 4b 0d 32 55 bf ef 95 60 18 95")}
+
     def getNumPartitions(self):
         return 2
 
@@ -120,14 +155,18 @@ class PartitionRandvsFixed(object):
         klen = len(trace.getKnownKey(tnum))
 
         pt = trace.getTextin(tnum)
-        if klen == 16 and (pt == util.hexStrToByteArray("da 39 a3 ee 5e 6b 4b 0d 32 55 bf ef 95 60 18 90")).all():
-            return [1]
-        elif klen == 24 and (pt == util.hexStrToByteArray("da 39 a3 ee 5e 6b 4b 0d 32 55 bf ef 95 60 18 88")).all():
-            return [1]
-        elif klen == 32 and (pt == util.hexStrToByteArray("da 39 a3 ee 5e 6b 4b 0d 32 55 bf ef 95 60 18 95")).all():
+        if klen in self.fixedText and (pt == self.fixedText[klen]).all():
             return [1]
         return [0]
 
+    def getPartitionNums(self, trace, start, end):
+        """(traces x 1) array, 1 for the fixed plaintext and 0 for random ones"""
+        klen = len(trace.getKnownKey(start))
+        pt = np.asarray(trace.getTextins(start, end), dtype=np.uint8)
+        if klen not in self.fixedText:
+            return np.zeros((len(pt), 1), dtype=np.uint8)
+        return np.all(pt == np.asarray(self.fixedText[klen], dtype=np.uint8), axis=1).astype(np.uint8)[:, None]
+
 
 class PartitionRandDebug(object):
 
@@ -142,6 +181,79 @@ class PartitionRandDebug(object):
     def getPartitionNum(self, trace, tnum):
         return [random.randint(0, self.numRand - 1)]
 
+    def getPartitionNums(self, trace, start, end):
+        return np.random.randint(0, self.numRand, (end - start, 1)).astype(np.uint8)
+
+
+def partitionLabels(partdata, numtraces, start=0):
+    """
+    Partition data as a (traces x subkeys) array of partition numbers, row i being trace start+i. partdata is either
+    such an array already, or the older nested lists partdata[subkey][partition] = [trace numbers]. Traces in no
+    partition are labelled -1.
+    """
+    #Nested lists come back from np.load() as an object array
+    if isinstance(partdata, np.ndarray) and partdata.dtype != object:
+        return partdata
+
+    labels = np.full((numtraces, len(partdata)), -1, dtype=np.int32)
+    for bnum, parts in enumerate(partdata):
+        for i, tlist in enumerate(parts):
+            tlist = np.asarray(tlist, dtype=np.int64) - start
+            labels[tlist[(tlist >= 0) & (tlist < numtraces)], bnum] = i
+    return labels
+
+
+class PartitionStats(object):
+    """
+    Mean & variance of the traces in each partition of each subkey. Blocks of traces are read once for all subkeys,
+    the per-partition sums come from one matrix product per subkey and are merged into the running totals with the
+    pairwise update of Chan et al.
+    """
+
+    def __init__(self, numKeys, numParts, numPoints):
+        self.numKeys = numKeys
+        self.numParts = numParts
+        self.number = np.zeros((numKeys, numParts), dtype=np.int64)
+        self.mean = np.zeros((numKeys, numParts, numPoints))
+        self.m2 = np.zeros((numKeys, numParts, numPoints))
+
+    def addBlock(self, traces, labels):
+        """Add traces (traces x points) with their partition numbers labels (traces x subkeys)"""
+        traces = np.asarray(traces)
+
+        #Shift by the block mean so the sums of squares don't lose precision
+        shift = np.mean(traces, axis=0, dtype=np.float64)
+        traces = traces - shift
+        squares = np.square(traces)
+        parts = np.arange(self.numParts)
+
+        for bnum in range(self.numKeys):
+            onehot = (np.asarray(labels)[:, bnum, None] == parts).astype(np.float64)
+            cnt = onehot.sum(axis=0)
+            used = cnt > 0
+            if not np.any(used):
+                continue
+            onehot = onehot[:, used]
+            cnt = cnt[used][:, None]
+
+            bmean = onehot.T.dot(traces) / cnt
+            bm2 = onehot.T.dot(squares) - cnt * np.square(bmean)
+            bmean += shift
+
+            n = self.number[bnum, used][:, None]
+            total = n + cnt
+            delta = bmean - self.mean[bnum, used]
+            self.mean[bnum, used] += delta * (cnt / total)
+            self.m2[bnum, used] += bm2 + np.square(delta) * (n * cnt / total)
+            self.number[bnum, used] += cnt[:, 0].astype(np.int64)
+
+    def variance(self):
+        """Sample variance (n-1), same as the sum of squared deviations for partitions with one trace"""
+        return self.m2 / np.maximum(self.number - 1, 1)[:, :, None]
+
+    def stats(self):
+        return {"mean":self.mean, "variance":self.variance(), "number":self.number}
+
 
 class Partition(Parameterized):
     """
@@ -189,41 +301,32 @@ class Partition(Parameterized):
         return partitionTable
 
     def loadPartitions(self, tRange=(0, -1)):
-        """Load partitions from trace files, convert to mapped range"""
+        """Load partitions saved with the trace segments, as a (traces x subkeys) array of partition numbers"""
         start = tRange[0]
         end = tRange[1]
 
         if end == -1:
             end = self._traces.numTraces()
 
-        # Generate blank partition table
-        partitionTable = self.createBlankTable(self._traces.getSegment(start))
-        logging.info(np.shape(partitionTable))
-
+        labels = []
         tnum = start
         while tnum < end:
             t = self._traces.getSegment(tnum)
             # Discover where this trace starts & ends
             tmapstart = t.mappedRange[0]
             tmapend = t.mappedRange[1]
-            tmapend = min(tmapend, end)
 
             partcfg = t.getAuxDataConfig(self.attrDictPartition)
-            # print partcfg
-            # print partcfg["filename"]
-            partdata = t.loadAuxData(partcfg["filename"])
-
-            # Merge tables now - better way to do this?
-            for j in range(0, len(self.partMethod.getPartitionNum(t, 0))):
-                for i in range(0, self.partMethod.getNumPartitions()):
-                    partitionTable[j][i] = partitionTable[j][i] + partdata[j][i]
-
-            # print tmapstart
+            if partcfg is None:
+                raise IOError("No saved partition data for traces %d-%d" % (tmapstart, tmapend))
+            # Older files hold lists of trace numbers per subkey & partition
+            partdata = partitionLabels(t.loadAuxData(partcfg["filename"]), tmapend - tmapstart + 1)
+            labels.append(partdata[max(start - tmapstart, 0):min(end, tmapend + 1) - tmapstart])
 
             # Next trace round
             tnum = tmapend + 1
 
-        return partitionTable
+        return np.concatenate(labels)
 
     def getPartitionData(self):
         return self.partDataCache
@@ -231,63 +334,43 @@ class Partition(Parameterized):
     def generatePartitions(self, partitionClass=None, saveFile=False, loadFile=False, tRange=(0, -1)):
         """
         Generate partitions, using previously setup setTraceManager & partition class, or if they are passed as
-        arguments will update the class data
+        arguments will update the class data. Returns a (traces x subkeys) uint8 array with the partition number of
+        each trace (row i is trace tRange[0]+i), labelled a whole segment at a time.
         """
         if partitionClass:
             self.setPartMethod(partitionClass)
 
-        partitionTable = None
-
         if loadFile:
-            partitionTable = self.loadPartitions(tRange)
-            raise AttributeError("WARNING: loadPartitions broken for split files, disabled for now")
+            self.partDataCache = self.loadPartitions(tRange)
+            return self.partDataCache
 
         start = tRange[0]
         end = tRange[1]
 
-        num_keys=len(self.partMethod.getPartitionNum(self._traces.getSegment(start), 0))
-        num_parts=self.partMethod.getNumPartitions()
-
-        if partitionTable is None:
-            partitionTable = self.createBlankTable(num_keys, num_parts)
-
-            if end == -1:
-                end = self._traces.numTraces()
-
-            tnum = start
-            while tnum < end:
-                t = self._traces.getSegment(tnum)
-                # Discover where this trace starts & ends
-                tmapstart = t.mappedRange[0]
-                tmapend = t.mappedRange[1]
-                
-                partitionTableTemp = self.createBlankTable(num_keys, num_parts)
-
-                for tnum in range(tmapstart, tmapend + 1):
-                    # Check each trace, write partition number
-                    partNum = self.partMethod.getPartitionNum(t, tnum - tmapstart)
-                    for i, pn in enumerate(partNum):
-                        partitionTable[i][pn].append(tnum)
-                        partitionTableTemp[i][pn].append(tnum - tmapstart)
+        if end == -1:
+            end = self._traces.numTraces()
 
-                    # self.traceDone.emit(tnum)
+        labels = []
+        tnum = start
+        while tnum < end:
+            t = self._traces.getSegment(tnum)
+            # Discover where this trace starts & ends
+            tmapstart = t.mappedRange[0]
+            tmapend = t.mappedRange[1]
 
-                if saveFile:
-                    # Save partition table, reference it in config file
-                    newCfgDict = copy.deepcopy(self.attrDictPartition)
-                    updatedDict = t.addAuxDataConfig(newCfgDict)
-                    t.saveAuxData(partitionTableTemp, updatedDict)
+            partdata = np.asarray(self.partMethod.getPartitionNums(t, 0, tmapend - tmapstart + 1), dtype=np.uint8)
 
-                # Debug - Dump Table
-                # for t in range(0, self.partMethod.getNumPartitions()):
-                #    print "Traces in %d:" % t
-                #    print "  ",
-                #    print partitionTable[0][t]
+            if saveFile:
+                # Save partition table, reference it in config file
+                newCfgDict = copy.deepcopy(self.attrDictPartition)
+                updatedDict = t.addAuxDataConfig(newCfgDict)
+                t.saveAuxData(partdata, updatedDict)
 
-                tnum = tmapend + 1
+            labels.append(partdata[max(start - tmapstart, 0):min(end, tmapend + 1) - tmapstart])
+            tnum = tmapend + 1
 
-        self.partDataCache = partitionTable
-        return partitionTable
+        self.partDataCache = np.concatenate(labels)
+        return self.partDataCache
 
     def setTraceSource(self, traces):
         self._traces = traces
@@ -32,7 +32,7 @@ from PySide.QtCore import *
 from PySide.QtGui import *
 import chipwhisperer.common.utils.qt_tweaks as QtFixes
 import pyqtgraph as pg
-from chipwhisperer.analyzer.utils.Partition import Partition
+from chipwhisperer.analyzer.utils.Partition import Partition, PartitionStats, partitionLabels
 from chipwhisperer.common.utils import util
 from chipwhisperer.common.api.autoscript import AutoScript
 from chipwhisperer.common.api.CWCoreAPI import CWCoreAPI
@@ -373,7 +373,12 @@ class PartitionDisplay(Parameterized, AutoScript):
         if ignored == "traceexplorer_show":
             self._autoscript_init = True
 
-    def generatePartitionStats(self, partitionData={"partclass":None, "partdata":None}, saveFile=False, loadFile=False,  tRange=(0, -1), progressBar=None):
+    def generatePartitionStats(self, partitionData={"partclass":None, "partdata":None}, saveFile=False, loadFile=False,  tRange=(0, -1), progressBar=None, blockSize=1000):
+        """
+        Mean, variance & number of traces of every partition. partdata is a (traces x subkeys) array of partition
+        numbers starting at trace tRange[0] (as from Partition.generatePartitions), or the older nested lists of trace
+        numbers per subkey & partition.
+        """
 
         traces = self._traces
 
@@ -405,75 +410,33 @@ class PartitionDisplay(Parameterized, AutoScript):
             fname = self.api.project().convertDataFilepathAbs(foundsecs[0]["filename"])
             stats = np.load(fname)
         else:
-            # Array to hold average + stddev of all traces/partitions
-            A_k = []
-            A_j = []
-            Q_k = []
-            dataArrays = [A_k, A_j, Q_k]
-            ACnt = []
-            for bnum in range(0, self.numKeys):
-                for d in dataArrays:
-                    d.append([])
-                ACnt.append([])
-                for i in range(0, self.partObject.partMethod.getNumPartitions()):
-                    for d in dataArrays:
-                        d[bnum].append(np.zeros(numPoints))
-                    ACnt[bnum].append(0)
-
-            # Get segment list
-            segList = traces.getSegmentList()
+            # Partition numbers of each trace, (traces x subkeys) starting at trace tRange[0]
+            labels = partitionLabels(partitionData["partdata"], tRange[1] - tRange[0], tRange[0])
+            partStats = PartitionStats(self.numKeys, self.partObject.partMethod.getNumPartitions(), numPoints)
+            tend = min(tRange[1], tRange[0] + len(labels))
+            starts = range(tRange[0], tend, blockSize)
 
             if progressBar:
                 progressBar.setWindowTitle("Phase 1: Trace Statistics")
-                progressBar.setMaximum(bnum)  # len(segList['offsetList']) * self.numKeys)
+                progressBar.setMaximum(len(starts))
                 progressBar.show()
 
-            # TODO: Double-check this fix
-            # for tsegn, segtrace in enumerate(segList['offsetList']):
-            tsegn = 0
-            if progressBar: progressBar.setText("Segment %d" % tsegn)
-
-            # Average data needs to be calculated
-            # Require partition list
-            partData = partitionData["partdata"]
-
-
-            # print "Calculating Average + Std-Dev"
-            # Std-Dev calculation:
-            # A[0] = 0
-            # A[k] = A[k-1] + (x[k] - A[k-1]) / k
-            # Q[0] = 0
-            # Q[k] = Q[k-1] + (x[k] - A[k-1])(x[k] - A[k])
-            for bnum in range(0, self.numKeys):
-                progressBar.updateStatus(tsegn * self.numKeys + bnum)
-                if progressBar.wasAborted():
-                    break
-                for i in range(0, self.partObject.partMethod.getNumPartitions()):
+            # Each block of traces is read once, mean & variance of all subkeys/partitions are updated together
+            for blk, start in enumerate(starts):
+                end = min(start + blockSize, tend)
+                if progressBar:
+                    progressBar.setText("Traces %d-%d" % (start, end - 1))
+                    progressBar.updateStatus(blk)
                     util.updateUI()
-                    tlist = partData[bnum][i]
-                    if len(tlist) > 0:
-                        for tnum in tlist:
-                            if tnum > tRange[0] and tnum < tRange[1]:
-                                t = traces.getTrace(tnum)
-                                ACnt[bnum][i] += 1
-                                A_k[bnum][i] = A_k[bnum][i] + (t - A_j[bnum][i]) / ACnt[bnum][i]
-                                Q_k[bnum][i] = Q_k[bnum][i] + ((t - A_j[bnum][i]) * (t - A_k[bnum][i]))
-                                A_j[bnum][i] = A_k[bnum][i]
-
-            if progressBar.wasAborted():
-                progressBar.hide()
-                return
-
-            # Finally get variance
-            for bnum in range(0, self.numKeys):
-                    for i in range(0, self.partObject.partMethod.getNumPartitions()):
-                        # TODO: Should be using population variance or sample variance (e.g. /n or /n-1)?
-                        #      Since this is taken over very large sample sizes I imagine it won't matter
-                        #      ultimately.
-                        Q_k[bnum][i] = Q_k[bnum][i] / max(ACnt[bnum][i] - 1, 1)
-
-            # Average is in A_k
-            stats = {"mean":A_k, "variance":Q_k, "number":ACnt}
+                    if progressBar.wasAborted():
+                        progressBar.hide()
+                        return
+                partStats.addBlock(traces.getTraces(start, end), labels[start - tRange[0]:end - tRange[0]])
+
+            stats = partStats.stats()
+            A_k = stats["mean"]
+            Q_k = stats["variance"]
+            ACnt = stats["number"]
 
             # Wasn't cancelled - save this to project file for future use if requested
             if saveFile:
@@ -488,7 +451,8 @@ class PartitionDisplay(Parameterized, AutoScript):
                 np.savez(fname["abs"], mean=A_k, variance=Q_k, number=ACnt)
                 cfgsec["filename"] = fname["rel"]
 
-        progressBar.hide()
+        if progressBar:
+            progressBar.hide()
         return stats
 
     def generatePartitionDiffs(self, diffModule, statsInfo={"partclass":None, "stats":None}, saveFile=False, loadFile=False, tRange=(0, -1), progressBar=None):
@@ -27,6 +27,7 @@
 from chipwhisperer.analyzer.attacks.models.AES128_8bit import AES128_8bit
 
 import random
+import numpy as np
 
 class base(object):
     def __init__(self, trace_manager, bnum):
@@ -40,6 +41,10 @@ class base(object):
     def get_partition(self, trace_num, key_guess=None):
         return random.randint(0, 2)
 
+    def get_partitions(self, start_trace, end_trace, key_guess=None):
+        """Partition numbers of traces start_trace to end_trace-1 as an int array"""
+        return np.array([self.get_partition(i, key_guess=key_guess) for i in range(start_trace, end_trace)], dtype=int)
+
 class HWAES(base):
     def __init__(self, trace_manager, bnum, model, bmask=0xff):
         self.tm = trace_manager
@@ -59,3 +64,20 @@ class HWAES(base):
 
         return self.aes.leakage(pt, ct, key_guess, bnum, state)
 
+    def get_partitions(self, start_trace, end_trace, key_guess=None):
+        """Partition numbers of a block of traces, computed with the model's batch leakage"""
+        keys = np.asarray(self.tm.getKnownKeys(start_trace, end_trace), dtype=np.uint8)
+        pt = self.tm.getTextins(start_trace, end_trace)
+        ct = self.tm.getTextouts(start_trace, end_trace)
+
+        #Known key only processed (e.g. key schedule) once per different key
+        ukeys, kidx = np.unique(keys, axis=0, return_inverse=True)
+        keys = np.array([self.aes.processKnownKey(list(k)) for k in ukeys], dtype=np.uint8)[kidx]
+
+        #Leakage of every guess, then pick the guess we want (or the known key) for each trace
+        hyp = self.aes.leakage_batch(pt, ct, self._bnum, keys)
+        if key_guess is None:
+            guess = keys[:, self._bnum]
+        else:
+            guess = np.full(len(hyp), key_guess, dtype=int)
+        return hyp[np.arange(len(hyp)), guess].astype(int)
@@ -26,6 +26,8 @@
 
 
 import numpy as np
+import scipy.stats
+from scipy.special import comb
 
 def partition_traces(tracemanager, ptool, start_trace=0, end_trace=None, index_only=False, key_guess=None, point_range=None):
     """
@@ -96,4 +98,152 @@ def dpa(groups, axis=0):
         raise AttributeError("dpa only works between two groups")
 
     dpa = np.subtract(np.mean(groups[1], axis=axis), np.mean(groups[0], axis=axis))
-    return dpa
\ No newline at end of file
+    return dpa
+
+
+class GroupMoments(object):
+    """
+    Running central moments of every trace point for each group of traces (e.g. fixed vs. random plaintext, or the
+    partitions of partitiontools.HWAES), used for t-tests of any order up to 'order' without keeping the traces.
+    Memory only depends on the number of groups & points. Each block of traces is reduced to its own moments & merged
+    with the pairwise update from Pebay (2008), so states from different trace segments or runs can be merged too.
+        n:    number of traces in each group
+        mean: mean of each group (groups x points)
+        cs:   cs[k] is the sum of (x - mean)^k of each group (groups x points), for k = 2 to 2*order
+    """
+
+    def __init__(self, num_groups, num_points, order=2):
+        self.order = order
+        self.n = np.zeros(num_groups, dtype=np.int64)
+        self.mean = np.zeros((num_groups, num_points))
+        self.cs = np.zeros((2 * order + 1, num_groups, num_points))
+
+    def add_block(self, traces, groups):
+        """
+        Add a block of traces.
+        Args:
+            traces: (traces x points) array.
+            groups: group number of each trace, traces with a negative number are skipped.
+        """
+        groups = np.asarray(groups)
+        for g in np.unique(groups):
+            if g < 0:
+                continue
+            x = np.asarray(traces[groups == g], dtype=np.float64)
+            mean = np.mean(x, axis=0)
+            x -= mean
+            cs = np.zeros((len(self.cs), len(mean)))
+            xk = x
+            for k in range(2, len(self.cs)):
+                xk = xk * x
+                cs[k] = np.sum(xk, axis=0)
+            self._merge_group(g, len(x), mean, cs)
+
+    def merge(self, other):
+        """Add the traces other was built from (same groups, points & order) to this state"""
+        for g in range(len(self.n)):
+            if other.n[g] > 0:
+                self._merge_group(g, other.n[g], other.mean[g], other.cs[:, g])
+
+    def _merge_group(self, g, nb, meanb, csb):
+        na = float(self.n[g])
+        nb = float(nb)
+        if na == 0:
+            self.n[g] = nb
+            self.mean[g] = meanb
+            self.cs[:, g] = csb
+            return
+
+        n = na + nb
+        delta = meanb - self.mean[g]
+        csa = self.cs[:, g].copy()
+        for p in range(2, len(csa)):
+            m = csa[p] + csb[p]
+            for k in range(1, p - 1):
+                m += comb(p, k) * delta ** k * ((-nb / n) ** k * csa[p - k] + (na / n) ** k * csb[p - k])
+            m += (na * nb / n * delta) ** p * (1.0 / nb ** (p - 1) - (-1.0 / na) ** (p - 1))
+            self.cs[p, g] = m
+        self.mean[g] += delta * (nb / n)
+        self.n[g] = n
+
+    def preprocessed(self, order=1):
+        """
+        Mean & variance of each group after the usual preprocessing for a t-test of this order: none for 1st order,
+        squared centered traces for 2nd order, standardized traces to the power 'order' above that.
+        Returns: (mean, variance), each (groups x points).
+        """
+        if order < 1 or 2 * order >= len(self.cs):
+            raise ValueError("Order %d test needs moments up to %d, only have up to %d" %
+                             (order, 2 * order, len(self.cs) - 1))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cm = self.cs / self.n[:, None]
+            if order == 1:
+                return self.mean, cm[2]
+            if order == 2:
+                return cm[2], cm[4] - cm[2] ** 2
+            return cm[order] / cm[2] ** (order / 2.0), (cm[2 * order] - cm[order] ** 2) / cm[2] ** order
+
+    def ttest(self, order=1, groups=(0, 1)):
+        """Welch t-test of this order between two of the groups, same sign & layout as wttest()"""
+        mean, var = self.preprocessed(order)
+        a, b = groups
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ttest = (mean[a] - mean[b]) / np.sqrt(var[a] / self.n[a] + var[b] / self.n[b])
+        return np.nan_to_num(ttest)
+
+    def chi2test(self, order=1):
+        """
+        Test if all groups with traces have the same mean after preprocessing for this order. The statistic is the
+        sum of squared differences to the common (inverse-variance weighted) mean, each divided by the variance of
+        that group's mean, which follows a chi-squared distribution with groups-1 degrees of freedom if there's no
+        leakage. For two groups it is the square of ttest().
+        Returns: (statistic, p-value), each one value per point.
+        """
+        mean, var = self.preprocessed(order)
+        used = self.n > 1
+        mean = mean[used]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            w = self.n[used, None] / var[used]
+            common = np.sum(w * mean, axis=0) / np.sum(w, axis=0)
+            chi2 = np.nan_to_num(np.sum(w * (mean - common) ** 2, axis=0))
+        return chi2, scipy.stats.chi2.sf(chi2, max(np.count_nonzero(used) - 1, 1))
+
+
+def streaming_ttest(tracemanager, ptool, start_trace=0, end_trace=None, order=2, key_guess=None, point_range=None,
+                    block_size=10000, moments=None):
+    """
+    Partitions traces like partition_traces(), but only keeps the moments of each group so any number of traces can
+    be used. Traces are read block_size at a time.
+
+    Args:
+        tracemanager: traceManager object.
+        ptool: partition tool object.
+        start_trace: Starting trace number.
+        end_trace: Ending trace number.
+        order: Highest order of t-test the result can be used for.
+        key_guess: Overrides known-key with specified guess, None if you want to use known-key for partition.
+        point_range: (start, end) of points to use, or None for all.
+        block_size: Number of traces read at once.
+        moments: GroupMoments from a previous call (e.g. an earlier trace segment) to add these traces to.
+
+    Returns: GroupMoments, use ttest() / chi2test() on it.
+
+    """
+    ptool.new_run()
+    if end_trace is None:
+        end_trace = tracemanager.numTraces()
+
+    if moments is None:
+        if point_range:
+            num_points = point_range[1] - point_range[0]
+        else:
+            num_points = tracemanager.numPoints()
+        moments = GroupMoments(ptool.num_parts, num_points, order)
+
+    for start in range(start_trace, end_trace, block_size):
+        end = min(start + block_size, end_trace)
+        groups = ptool.get_partitions(start, end, key_guess=key_guess)
+        moments.add_block(tracemanager.getTraces(start, end, point_range), groups)
+
+    return moments
@@ -22,12 +22,79 @@
 #    You should have received a copy of the GNU General Public License
 #    along with chipwhisperer.  If not, see <http://www.gnu.org/licenses/>.
 #=================================================
+import copy
 import logging
+import Queue
+import sys
+import threading
 import time
+from collections import deque, OrderedDict
+import numpy as np
 from chipwhisperer.common.utils import util
+from chipwhisperer.common.utils.profiling import profiler
 from chipwhisperer.common.utils.util import cw_bytearray
 
 
+class TraceWriterThread(object):
+    """Adds captured traces to a trace writer from a background thread.
+
+    Saving a trace (and the config update done with each one) then overlaps
+    with capturing the next one. put() blocks once 'maxsize' traces are
+    waiting, so a slow disk slows down the capture instead of filling memory.
+    An error in the writer (other than a trace being skipped) stops the
+    writing & is raised on the capture thread by the next put() or close().
+    """
+
+    def __init__(self, writer, maxsize=64):
+        self._writer = writer
+        self._queue = Queue.Queue(maxsize)
+        self._error = None
+        self.skipped = 0
+        self._thread = threading.Thread(target=self._run, name="TraceWriter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, key, traces, textin, textout):
+        """Queue one capture, traces is a list of (channelNum, trace)"""
+        self._raiseError()
+        #Scope & pattern may reuse their buffers for the next capture
+        traces = [(channelNum, np.array(trace)) for channelNum, trace in traces]
+        self._queue.put((copy.copy(key), traces, copy.copy(textin), copy.copy(textout)))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is not None:
+                #Writer failed, only drain the queue so put() can't block forever
+                continue
+
+            key, traces, textin, textout = item
+            try:
+                self._writer.setKnownKey(key)
+                for channelNum, trace in traces:
+                    self._writer.addTrace(trace, textin, textout, key, channelNum=channelNum)
+            except ValueError as e:
+                self.skipped += 1
+                logging.warning('Exception caught in adding trace, trace skipped.')
+                logging.debug(str(e))
+            except Exception:
+                self._error = sys.exc_info()
+
+    def _raiseError(self):
+        if self._error is not None:
+            raise self._error[0], self._error[1], self._error[2]
+
+    def close(self):
+        """Wait until every queued trace is written & stop the thread"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._raiseError()
+
+
 class AcquisitionController:
     """High level class for controlling captures.
 
@@ -44,13 +111,22 @@ class AcquisitionController:
     which can perform any other tasks during a capture, such as resetting
     """
 
-    def __init__(self, scope, target=None, writer=None, aux=None, keyTextPattern=None):
+    def __init__(self, scope, target=None, writer=None, aux=None, keyTextPattern=None, writeQueueSize=0,
+                 pipelined=False, pairBatch=64, overlapUpload=False):
+        """
+        writeQueueSize: traces doReadings() may capture ahead of the writer thread, 0 (default) writes them
+            synchronously. With the thread, a trace the writer rejects is skipped instead of redone with the same pair.
+        pipelined: key/text pairs are generated pairBatch at a time, and the key is only sent to the target when it
+            changed. With overlapUpload the next pair is also sent while the scope reads out the current trace, which
+            needs the target & scope on separate interfaces (e.g. CW305, or an external serial port).
+        """
         # TODO: use project objects instead of writers?
         self.sigTraceDone = util.Signal()
         self.sigNewTextResponse = util.Signal()
 
         self.currentTrace = 0
         self.maxtraces = 0
+        self.skippedTraces = 0
 
         self.key = [0]
         self.textin = [0]
@@ -59,6 +135,15 @@ class AcquisitionController:
         self._target = target
         self._scope = scope
         self._writer = writer
+        self._writeQueueSize = writeQueueSize
+        self._pipelined = pipelined
+        self._pairBatch = pairBatch
+        self._overlapUpload = overlapUpload
+        self._pairs = deque()
+        self._pairsMade = 0
+        self._preloaded = None
+        self._loadedKey = None
+        self.stageTimes = OrderedDict()
         self._aux_dict = aux
         self._pattern = keyTextPattern
         self._pattern.setTarget(target)
@@ -73,13 +158,13 @@ class AcquisitionController:
             return []
 
         self._target.go()
-        timeout = 50
-        while self._target.isDone() is False and timeout:
-            timeout -= 1
-            time.sleep(0.01)
-
-        if timeout == 0:
-            logging.warning('Target timeout')
+        starttime = time.time()
+        backoff = util.Backoff(0.0005, 0.01)
+        while self._target.isDone() is False:
+            if time.time() - starttime > 0.5:
+                logging.warning('Target timeout')
+                break
+            backoff.sleep()
 
         self.textout = self._target.readOutput()
         try:
@@ -112,6 +197,7 @@ class AcquisitionController:
             - the auxiliary functions that need to be executed after the trace are
              executed
         """
+        t = time.time()
         if self._aux_dict is not None:
             for func in self._aux_dict['before_trace']:
                 func(self._scope, self._target, self._writer)
@@ -120,17 +206,17 @@ class AcquisitionController:
 
         if self._target:
             self._target.reinit()
+            if getattr(self._target, "reinitResetsState", False):
+                # Whatever was loaded ahead of this trace is gone, send it again
+                self._loadedKey = None
+                if self._preloaded is not None:
+                    self._pairs.appendleft(self._preloaded)
+                    self._preloaded = None
+        t = self._timeStage('before trace', t)
 
         if self._target:
-            # Get key / plaintext now
-            if previous_ok:
-                self.key, self.textin = self._pattern.newPair()
-            else:
-                logging.info('Previous trace failed. Redoing with same pair.')
-
-            self._target.setModeEncrypt()
-            self._target.loadEncryptionKey(self.key)
-            self._target.loadInput(self.textin)
+            self._loadPair(previous_ok)
+        t = self._timeStage('target load', t)
 
         if self._aux_dict is not None:
             for func in self._aux_dict['before_arm']:
@@ -142,11 +228,16 @@ class AcquisitionController:
         if self._aux_dict is not None:
             for func in self._aux_dict['after_arm']:
                 func(self._scope, self._target, self._writer)
+        t = self._timeStage('arm', t)
 
         if self._target:
             # Load input, start encryption, get output
             self.targetDoTrace()
             self.sigNewTextResponse.emit(self.key, self.textin, self.textout, self._target.getExpected())
+        t = self._timeStage('target run', t)
+
+        # Next pair goes to the target while the scope is read
+        upload = self._startUpload()
 
         # Get ADC reading
         if self._scope:
@@ -159,12 +250,103 @@ class AcquisitionController:
                 logging.error('IOError: %s' % str(e))
                 capture_ok = False
 
+        if upload:
+            self._finishUpload(*upload)
+        t = self._timeStage('capture', t)
+
         if self._aux_dict is not None:
             for func in self._aux_dict['after_trace']:
                 func(self._scope, self._target, self._writer)
+        self._timeStage('after trace', t)
 
         return capture_ok
 
+    def _timeStage(self, stage, start):
+        """Add the time since start to a stage of the timing breakdown, returns the time now"""
+        now = time.time()
+        total, count = self.stageTimes.get(stage, (0.0, 0))
+        self.stageTimes[stage] = (total + now - start, count + 1)
+        profiler.addTime("acq." + stage, now - start)
+        return now
+
+    def timingReport(self):
+        """Where the time of the last doReadings() went, one line per stage"""
+        total = sum(t for t, _ in self.stageTimes.values())
+        lines = ['Capture timing, %d traces in %.3f s:' % (self.currentTrace, total)]
+        for stage, (t, count) in self.stageTimes.items():
+            lines.append('  %-12s %9.3f s %5.1f%% %9.3f ms/call' % (stage, t, 100 * t / max(total, 1E-9), 1000 * t / count))
+        return '\n'.join(lines)
+
+    def _canPreload(self):
+        """Target can be set up ahead of time, unless it or aux functions might reset it between traces"""
+        if self._target and getattr(self._target, "reinitResetsState", False):
+            return False
+        return self._pipelined and not (self._aux_dict is not None and self._aux_dict['before_trace'])
+
+    def _nextPair(self):
+        """Next key/text pair, pipelined mode asks the pattern for a batch at a time"""
+        if not self._pipelined:
+            return self._pattern.newPair()
+
+        if not self._pairs:
+            # Don't run ahead of maxtraces, some patterns balance their groups over it
+            n = max(1, min(self._pairBatch, self.maxtraces - self._pairsMade))
+            for _ in range(n):
+                key, textin = self._pattern.newPair()
+                self._pairs.append((copy.copy(key), copy.copy(textin)))
+            self._pairsMade += n
+        return self._pairs.popleft()
+
+    def _loadPair(self, previous_ok):
+        if previous_ok:
+            if self._preloaded is not None:
+                # Already sent while the previous trace was read
+                self.key, self.textin = self._preloaded
+                self._preloaded = None
+                return
+            self.key, self.textin = self._nextPair()
+        else:
+            logging.info('Previous trace failed. Redoing with same pair.')
+            if self._preloaded is not None:
+                self._pairs.appendleft(self._preloaded)
+                self._preloaded = None
+
+        self._sendPair(self.key, self.textin)
+
+    def _sendPair(self, key, textin):
+        self._target.setModeEncrypt()
+        if not self._canPreload() or key != self._loadedKey:
+            self._target.loadEncryptionKey(key)
+            self._loadedKey = copy.copy(key)
+        self._target.loadInput(textin)
+
+    def _startUpload(self):
+        """Start sending the next pair on another thread, returns what _finishUpload() needs or None"""
+        if not (self._overlapUpload and self._target and self._canPreload()) or self.currentTrace + 1 >= self.maxtraces:
+            return None
+
+        pair = self._nextPair()
+        errors = []
+
+        def upload():
+            try:
+                self._sendPair(*pair)
+            except Exception:
+                errors.append(sys.exc_info())
+
+        thread = threading.Thread(target=upload, name="TargetUpload")
+        thread.start()
+        return thread, pair, errors
+
+    def _finishUpload(self, thread, pair, errors):
+        thread.join()
+        if errors:
+            # Target state unknown, load the key again with the next pair
+            self._loadedKey = None
+            self._pairs.appendleft(pair)
+            raise errors[0][0], errors[0][1], errors[0][2]
+        self._preloaded = pair
+
     def setMaxtraces(self, maxtraces):
         self.maxtraces = maxtraces
 
@@ -176,34 +358,69 @@ class AcquisitionController:
 
         if self._writer:
             self._writer.prepareDisk()
+            if self._scope and self._scope.getAdcScaling():
+                self._writer.setTraceScaling(*self._scope.getAdcScaling())
 
         if self._target:
             self._target.init()
 
+        self._pairs.clear()
+        self._pairsMade = 0
+        self._preloaded = None
+        self._loadedKey = None
+        self.stageTimes = OrderedDict()
+
+        writerThread = None
+        if self._scope and self._writer and self._writeQueueSize > 0:
+            writerThread = TraceWriterThread(self._writer, self._writeQueueSize)
+
         self.currentTrace = 0
+        self.skippedTraces = 0
         previous_ok = True
-        while self.currentTrace < self.maxtraces:
-            if self.doSingleReading(previous_ok):
-                try:
-                    if self._scope and self._writer:
-                        self._writer.setKnownKey(self.key)
-                        for channelNum in channelNumbers:
-                            self._writer.addTrace(self._scope.channels[channelNum].getTrace(), self.textin, self.textout,
-                                                  self.key, channelNum=channelNum)
-                    previous_ok = True
-                except ValueError as e:
-                    logging.warning('Exception caught in adding trace %d, trace skipped.' % self.currentTrace)
-                    logging.debug(str(e))
+        try:
+            while self.currentTrace < self.maxtraces:
+                if self.doSingleReading(previous_ok):
+                    t = time.time()
+                    if writerThread:
+                        # Skipped traces are only known later, so the pair isn't redone
+                        writerThread.put(self.key, [(channelNum, self._scope.channels[channelNum].getTrace()) for channelNum in channelNumbers],
+                                         self.textin, self.textout)
+                        previous_ok = True
+                    else:
+                        try:
+                            if self._scope and self._writer:
+                                self._writer.setKnownKey(self.key)
+                                for channelNum in channelNumbers:
+                                    self._writer.addTrace(self._scope.channels[channelNum].getTrace(), self.textin, self.textout,
+                                                          self.key, channelNum=channelNum)
+                            previous_ok = True
+                        except ValueError as e:
+                            logging.warning('Exception caught in adding trace %d, trace skipped.' % self.currentTrace)
+                            logging.debug(str(e))
+                            previous_ok = False
+                    self._timeStage('write', t)
+                    self.sigTraceDone.emit()
+                    self.currentTrace += 1
+                else:
                     previous_ok = False
-                self.sigTraceDone.emit()
-                self.currentTrace += 1
-            else:
-                previous_ok = False
-                util.updateUI()  # Check if it was aborted
-
-            if progressBar is not None:
-                if progressBar.wasAborted():
-                    break
+                    util.updateUI()  # Check if it was aborted
+
+                if progressBar is not None:
+                    if progressBar.wasAborted():
+                        break
+        finally:
+            # Everything captured has to be written before the writer is closed
+            if writerThread:
+                t = time.time()
+                writerThread.close()
+                self._timeStage('write', t)
+                self.skippedTraces = writerThread.skipped
+
+        if self.skippedTraces > 0:
+            logging.warning('%d of %d traces were rejected by the trace writer and skipped, not redone.' %
+                            (self.skippedTraces, self.currentTrace))
+
+        logging.info(self.timingReport())
 
         if self._aux_dict is not None:
             for func in self._aux_dict['after_capture']:
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2014-2017, NewAE Technology Inc
+# All rights reserved.
+#
+# Find this and more at newae.com - this file is part of the chipwhisperer
+# project, http://www.assembla.com/spaces/chipwhisperer
+#
+#    This file is part of chipwhisperer.
+#
+#    chipwhisperer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    chipwhisperer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with chipwhisperer.  If not, see <http://www.gnu.org/licenses/>.
+#=================================================
+
+import array
+import pickle
+from collections import OrderedDict
+import numpy as np
+
+#Classification of a glitch attempt, index into statusNames
+NORMAL = 0
+SUCCESS = 1
+FAILED = 2
+statusNames = ["Normal", "Success", "Failed"]
+
+
+def classify(normal, success):
+    """Status of an attempt from its 'normal' & 'success' predicate results, success wins if both matched"""
+    if success:
+        return SUCCESS
+    elif normal == False:
+        return FAILED
+    else:
+        return NORMAL
+
+
+def compilePredicate(expr, name="predicate"):
+    """
+    Compile a user expression of the response 's' (e.g. 's.startswith("Bad")') once into a function returning a
+    bool. An empty expression is always False.
+    """
+    if len(expr.strip()) == 0:
+        return lambda s: False
+
+    #Newline before the closing bracket so a trailing comment in expr can't swallow it
+    func = eval(compile("lambda s: (%s\n)" % expr, "<%s>" % name, "eval"), {}, {})
+
+    def predicate(s):
+        result = func(s)
+        if not isinstance(result, bool):
+            raise ValueError("Result of '%s' eval() not a bool, got %s (result: %s)" % (name, type(result), result))
+        return result
+    return predicate
+
+
+class GlitchResults(object):
+    """
+    All glitch attempts, stored by column (settings tuple, response, status, date) with running totals & counters
+    per glitch setting so nothing needs to walk the whole history. Attempts can also be streamed to a file as they
+    are added, in the format loadRecordings() reads.
+    """
+
+    def __init__(self):
+        self.clear()
+        self._file = None
+
+    def clear(self):
+        self.settings = []
+        self.outputs = []
+        self.status = array.array('B')
+        self.dates = []
+        self.counts = [0] * len(statusNames)
+        #settings tuple -> number of attempts with each status
+        self.binCounts = OrderedDict()
+
+    def __len__(self):
+        return len(self.status)
+
+    def add(self, settings, output, normal, success, date, save=True):
+        """
+        Record one attempt from the raw predicate results, returns it as the dict saved in recordings. With save=False
+        it isn't written to an open file (e.g. when loading old recordings).
+        """
+        status = classify(normal, success)
+        settings = tuple(settings)
+        self.settings.append(settings)
+        self.outputs.append(output)
+        self.status.append(status)
+        self.dates.append(date)
+        self.counts[status] += 1
+        binCount = self.binCounts.get(settings)
+        if binCount is None:
+            binCount = self.binCounts[settings] = [0] * len(statusNames)
+        binCount[status] += 1
+
+        newdata = {"input":"", "output":output, "normal":normal, "success":success, "settings":list(settings), "date":date}
+        if save and self._file is not None:
+            pickle.dump({"data":newdata}, self._file, pickle.HIGHEST_PROTOCOL)
+        return newdata
+
+    def addRecord(self, newdata, save=False):
+        """Record an attempt given as a recordings dict, by default without writing it to the open file"""
+        return self.add(newdata["settings"], newdata["output"], newdata["normal"], newdata["success"], newdata["date"], save)
+
+    def numSuccessful(self):
+        return self.counts[SUCCESS]
+
+    def settingsArray(self):
+        """Settings of all attempts as an (attempts, settings) array"""
+        return np.array(self.settings)
+
+    def statusArray(self):
+        return np.frombuffer(self.status, dtype=np.uint8) if len(self.status) else np.zeros(0, dtype=np.uint8)
+
+    def openFile(self, fname, notes, commands):
+        """Start streaming attempts to fname, after a header with the notes & setting names"""
+        self.closeFile()
+        self._file = open(fname, "wb")
+        pickle.dump({"notes":notes}, self._file, pickle.HIGHEST_PROTOCOL)
+        pickle.dump({"commands":commands}, self._file, pickle.HIGHEST_PROTOCOL)
+
+    def isFileOpen(self):
+        return self._file is not None
+
+    def closeFile(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def loadRecordings(fname):
+    """Returns (notes, commands, list of attempt dicts) from a file written by GlitchResults"""
+    data = []
+    with open(fname, "rb") as f:
+        notes = pickle.load(f)['notes']
+        commands = pickle.load(f)['commands']
+        while 1:
+            try:
+                data.append(pickle.load(f)['data'])
+            except EOFError:
+                break
+    return notes, commands, data
@@ -240,6 +240,12 @@ class OpenADC(ScopeTemplate, Plugin, util.DisableNewAttr):
             self.setAutorefreshDCM(self.findParam('Auto-Refresh DCM Status'))
         return ret
 
+    def getAdcScaling(self):
+        """The 10-bit ADC codes are scaled to code/1024 - offset"""
+        if self.qtadc.sc is None:
+            return None
+        return (1 / 1024.0, -self.qtadc.sc.offset)
+
     def getLastTrace(self):
         """Return the last trace captured with this scope.
         """
@@ -11,6 +11,7 @@ import sys
 import time
 import datetime
 from chipwhisperer.common.utils import util
+from chipwhisperer.common.utils import profiling
 from chipwhisperer.common.utils.parameter import Parameter, Parameterized, setupSetParam
 import array
 import numpy as np
@@ -1596,6 +1597,7 @@ class OpenADCInterface(object):
         self.sysFreq = 0
         self._streammode = False
         self._sbuf = []
+        self._sdata = None
         self.settings()
         self._support_decimate = True
         self._nosampletimeout = 100
@@ -1944,6 +1946,7 @@ class OpenADCInterface(object):
             # Stream mode adds 500mS of extra timeout on USB traffic itself...
             self.serial.initStreamModeCapture(self._stream_len, self._sbuf, timeout_ms=int(self._timeout * 1000) + 500)
 
+    @profiling.timed("openadc.capture")
     def capture(self):
         timeout = False
 
@@ -1951,9 +1954,10 @@ class OpenADCInterface(object):
 
             # Wait for a trigger, letting the UI run when it can
             starttime = datetime.datetime.now()
+            backoff = util.Backoff()
             while self.serial.cmdReadStream_isDone() == False:
-                # Wait for a moment before re-running the loop
-                time.sleep(0.05)
+                # Wait for a moment before re-running the loop, short at first as the trigger is often already done
+                backoff.sleep()
                 diff = datetime.datetime.now() - starttime
 
                 # If we've timed out, don't wait any longer for a trigger
@@ -1983,13 +1987,14 @@ class OpenADCInterface(object):
         else:
             status = self.getStatus()
             starttime = datetime.datetime.now()
+            backoff = util.Backoff()
 
             # Wait for a trigger, letting the UI run when it can
             while ((status & STATUS_ARM_MASK) == STATUS_ARM_MASK) | ((status & STATUS_FIFO_MASK) == 0):
                 status = self.getStatus()
 
-                # Wait for a moment before re-running the loop
-                time.sleep(0.05)
+                # Wait for a moment before re-running the loop, short at first as the trigger is often already done
+                backoff.sleep()
                 diff = datetime.datetime.now() - starttime
 
                 # If we've timed out, don't wait any longer for a trigger
@@ -2020,31 +2025,41 @@ class OpenADCInterface(object):
         # Flush output FIFO
         self.sendMessage(CODE_READ, ADDR_ADCDATA, None, False, None)
 
-    def readData(self, NumberPoints=None, progressDialog=None):
+    @profiling.timed("openadc.readData")
+    def readData(self, NumberPoints=None, progressDialog=None, out=None, raw=False):
+        """
+        Read & unpack the captured samples. If given, out is a preallocated array the samples are written to (a view
+        of it is returned). With raw=True the samples are the 10-bit ADC codes instead of floats.
+        """
         logging.debug("Reading data fromm OpenADC...")
         if self._streammode:
             # Process data
             bsize = self.serial.cmdReadStream_size_of_fpgablock()
             num_bytes, num_samples = self.serial.cmdReadStream_bufferSize(self._stream_len)
 
-            # Remove sync bytes from trace
-            data = np.zeros(num_bytes, dtype=np.uint8)
-            data[0] = self._sbuf[0]
-            dbuf2_idx = 1
-            for i in range(0, self._stream_rx_bytes, bsize):
-                if self._sbuf[i] != 0xAC:
-                    logging.warning("Stream mode: Expected sync byte (AC) at location %d but got %x" % (i, self._sbuf[i]))
-                    break
-                s = i + 1
-                data[dbuf2_idx: (dbuf2_idx + (bsize - 1))] = self._sbuf[s:(s + (bsize - 1))]
-
-                # Write to next section
-                dbuf2_idx += (bsize - 1)
+            # Each block of the stream buffer starts with a sync byte: view it as one block per row
+            sbuf = np.frombuffer(self._sbuf, dtype=np.uint8)
+            nblocks = min(-(-self._stream_rx_bytes // bsize), len(sbuf) // bsize)
+            blocks = sbuf[:nblocks * bsize].reshape((nblocks, bsize))
+            badsync = np.flatnonzero(blocks[:, 0] != 0xAC)
+            if len(badsync):
+                i = badsync[0] * bsize
+                logging.warning("Stream mode: Expected sync byte (AC) at location %d but got %x" % (i, sbuf[i]))
+                nblocks = badsync[0]
+
+            # Remove sync bytes from trace, keeping the first one for processData(). The buffer is kept between traces
+            if self._sdata is None or len(self._sdata) != num_bytes:
+                self._sdata = np.zeros(num_bytes, dtype=np.uint8)
+            data = self._sdata
+            data[0] = sbuf[0]
+            end = 1 + nblocks * (bsize - 1)
+            data[1:end].reshape((nblocks, bsize - 1))[:] = blocks[:nblocks, 1:]
+            data[end:] = 0
 
             logging.debug("Stream mode: read %d bytes"%len(data))
 
             # Turn raw bytes into samples
-            datapoints = self.processData(data, 0.0)
+            datapoints = self.processData(data, 0.0, out=out, raw=raw)
 
             if datapoints is not None and len(datapoints):
                 logging.debug("Stream mode: done, %d samples processed"%len(datapoints))
@@ -2125,8 +2140,7 @@ class OpenADCInterface(object):
                 #       print "%x "%p,
 
                 if data is not None:
-                    data = np.array(data)
-                    datapoints = self.processData(data, 0.0)
+                    datapoints = self.processData(data, 0.0, out=out, raw=raw)
 
                 if progressDialog:
                     progressDialog.setValue(status)
@@ -2146,20 +2160,28 @@ class OpenADCInterface(object):
 
             return datapoints
 
-    def processData(self, data, pad=float('NaN'), debug=False):
+    @profiling.timed("openadc.processData")
+    def processData(self, data, pad=float('NaN'), debug=False, out=None, raw=False):
+        """
+        Unpack the sync byte + 32-bit words (3 10-bit samples & 2 trigger bits each) read from the ADC, then pad/chop
+        so the trigger lands at presamples_desired. Samples are written to out if given, else to a new array, and
+        are floats (code/1024 - offset) or with raw=True the ADC codes. Padding can't be NaN in an integer array,
+        it's 0 there instead.
+        """
+        data = np.asarray(data, dtype=np.uint8)
         if data[0] != 0xAC:
             logging.warning('Unexpected sync byte in processData(): 0x%x' % data[0])
             return None
 
+        trigfound = False
+        trigsamp = 0
         if debug:
-            fpData = []
+            samples = []
             # Slow, verbose processing method
             # Useful for fixing issues in ADC read
             for i in xrange(1, len(data) - 3, 4):
                 # Convert
-                temppt = (data[i + 3] << 0) | (data[i + 2] << 8) | (data[i + 1] << 16) | (data[i + 0] << 24)
-
-                # print("%2x "%data[i])
+                temppt = (int(data[i + 3]) << 0) | (int(data[i + 2]) << 8) | (int(data[i + 1]) << 16) | (int(data[i + 0]) << 24)
 
                 # print "%x %x %x %x"%(data[i +0], data[i +1], data[i +2], data[i +3]);
                 # print "%x"%temppt
@@ -2168,8 +2190,6 @@ class OpenADCInterface(object):
                 intpt2 = (temppt >> 10) & 0x3FF
                 intpt3 = (temppt >> 20) & 0x3FF
 
-                # print "%x %x %x" % (intpt1, intpt2, intpt3)
-
                 if trigfound == False:
                     mergpt = temppt >> 30
                     if (mergpt != 3):
@@ -2187,57 +2207,55 @@ class OpenADCInterface(object):
 
                 # print "%x %x %x"%(intpt1, intpt2, intpt3)
 
-                fpData.append(float(intpt1) / 1024.0 - self.offset)
-                fpData.append(float(intpt2) / 1024.0 - self.offset)
-                fpData.append(float(intpt3) / 1024.0 - self.offset)
+                samples.extend([intpt1, intpt2, intpt3])
+            samples = np.array(samples, dtype=np.uint16)
         else:
             # Fast, efficient NumPy implementation
 
-            # Figure out how many bytes we're going to process
             # Cut off some bytes at the end: we need the length to be a multiple of 4, and we probably have extra data
-            numbytes = len(data) - 1
-            extralen = (len(data) - 1) % 4
-
-            # Copy the data into a NumPy array. For long traces this is the longest part
-            data = data[1:1+numbytes-extralen]
-
-            # Split data into groups of 4 bytes and combine into words
-            data = np.reshape(data, (-1, 4))
-            data = np.left_shift(data, [24, 16, 8, 0])
-            data = np.sum(data, 1)
-
-            # Split words into samples and trigger bytes
-            data = np.right_shift(np.reshape(data, (-1, 1)), [0, 10, 20, 30]) & 0x3FF
-            fpData = np.reshape(data[:, [0, 1, 2]], (-1))
-            trigger = data[:, 3] % 4
-            fpData = fpData / 1024.0 - self.offset
-
-            # Search for the trigger signal
-            trigfound = False
-            trigsamp = 0
-            for t in trigger:
-                if(t != 3):
-                    trigfound = True
-                    trigsamp = trigsamp + (t & 0x3)
-                    #print "Trigger found at %d"%trigsamp
-                    break
-                else:
-                    trigsamp += 3
+            nwords = (len(data) - 1) // 4
 
-        #print len(fpData)
+            # View the bytes as big-endian words (no copy) & convert them to native order once
+            words = data[1:1 + 4 * nwords].view('>u4').astype(np.uint32)
+
+            # Split words into samples: one row of 3 samples per word
+            samples = np.empty((nwords, 3), dtype=np.uint16)
+            np.bitwise_and(words, 0x3FF, out=samples[:, 0], casting='unsafe')
+            np.bitwise_and(words >> 10, 0x3FF, out=samples[:, 1], casting='unsafe')
+            np.bitwise_and(words >> 20, 0x3FF, out=samples[:, 2], casting='unsafe')
+            samples = samples.reshape(-1)
+
+            # Search for the trigger signal: the top 2 bits of the first word they aren't 3 in are its offset
+            trigger = words >> 30
+            if nwords:
+                first = int(np.argmax(trigger != 3))
+                trigfound = trigger[first] != 3
+            trigsamp = 3 * first + int(trigger[first]) if trigfound else 3 * nwords
 
         if trigfound == False:
             logging.warning('Trigger not found in ADC data. No data reported!')
 
         #Ensure that the trigger point matches the requested by padding/chopping
         diff = self.presamples_desired - trigsamp
+        lead = max(diff, 0)
+        samples = samples[max(-diff, 0):]
         if diff > 0:
-               #fpData = [pad]*diff + fpData
-               fpData = np.append([pad]*diff, fpData)
                logging.warning('Pretrigger not met: Do not use downsampling and pretriggering at same time.')
                logging.debug('Pretrigger not met: can attempt to increase presampleTempMargin(in the code).')
+
+        if out is None:
+            out = np.empty(lead + len(samples), dtype=np.uint16 if raw else np.float64)
+        fpData = out[:lead + len(samples)]
+        lead = min(lead, len(fpData))
+        if lead:
+            fpData[:lead] = pad if fpData.dtype.kind == 'f' else 0
+        samples = samples[:len(fpData) - lead]
+        if raw:
+            fpData[lead:] = samples
         else:
-               fpData = fpData[-diff:]
+            #1/1024 is exact, so this matches samples / 1024.0 - offset without the temporaries
+            np.multiply(samples, 1 / 1024.0, out=fpData[lead:], casting='unsafe')
+            fpData[lead:] -= self.offset
 
         logging.debug("Processed data, ended up with %d samples total"%len(fpData))
 
@@ -27,6 +27,7 @@ import logging
 import _OpenADCInterface as openadc
 from chipwhisperer.common.utils.parameter import Parameterized, Parameter
 from chipwhisperer.common.utils import util, timer
+from chipwhisperer.common.utils.profiling import profiler
 
 
 class OpenADCQt(Parameterized):
@@ -95,6 +96,7 @@ class OpenADCQt(Parameterized):
             self.datapoints = self.sc.readData(numberPoints)
         except IndexError, e:
             raise IOError("Error reading data: %s" % str(e))
+        profiler.count("openadc.samples", len(self.datapoints))
 
         self.dataUpdated.emit(channelNr, self.datapoints, -self.parm_trigger._get_presamples(True), self.parm_clock._adcSampleRate())
 
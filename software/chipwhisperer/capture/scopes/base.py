@@ -50,6 +50,10 @@ class ScopeTemplate(Parameterized):
     def setCurrentScope(self, scope):
         pass
 
+    def getAdcScaling(self):
+        """(scale, offset) with trace = code*scale + offset if the scope has an integer ADC, otherwise None"""
+        return None
+
     def newDataReceived(self, channelNum, data=None, offset=0, sampleRate=0):
         self.channels[channelNum].newScopeData(data, offset, sampleRate)
 
@@ -289,6 +289,9 @@ class SaseboGII(TargetTemplate):
         if self.sasebo:
             self.sasebo.close()
         
+    #init() resets the AES core
+    reinitResetsState = True
+
     def reinit(self):
         self.init()
 
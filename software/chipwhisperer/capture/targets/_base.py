@@ -84,6 +84,9 @@ class TargetTemplate(Parameterized, Plugin):
         """Init Hardware"""
         pass
     
+    #True if reinit() (called before every trace) resets the key & input already loaded into the target
+    reinitResetsState = False
+
     def reinit(self):
         pass
 
@@ -23,7 +23,7 @@
 #    along with chipwhisperer.  If not, see <http://www.gnu.org/licenses/>.
 #=================================================
 
-from chipwhisperer.common.utils import util
+from chipwhisperer.common.utils import util, profiling
 from chipwhisperer.common.utils.pluginmanager import Plugin
 from chipwhisperer.common.utils.parameter import Parameterized, Parameter
 import collections
@@ -60,6 +60,9 @@ class SimpleSerialTemplate(Parameterized, Plugin):
 
         self.max_queue_size = 384
 
+        #Time the last command was written, for the command -> response round trip time
+        self._cmdStart = None
+
     def selectionChanged(self):
         pass
 
@@ -78,6 +81,7 @@ class SimpleSerialTemplate(Parameterized, Plugin):
     def flushInput(self):
         self.flush()
 
+    @profiling.timed("serial.write")
     def write(self, string):
         """
         Write a string to the device.
@@ -95,7 +99,9 @@ class SimpleSerialTemplate(Parameterized, Plugin):
         """
 
         # Write to hardware
+        self._cmdStart = profiling.default_timer()
         self.hardware_write(string)
+        profiling.profiler.count("serial.bytesWritten", len(string))
 
         # Update terminal buffer
         for c in string:
@@ -105,6 +111,7 @@ class SimpleSerialTemplate(Parameterized, Plugin):
             else:
                 self.terminal_queue.popleft()
 
+    @profiling.timed("serial.read")
     def read(self, num=0, timeout=250):
         """
         Attempt to read a string from the device.
@@ -136,6 +143,10 @@ class SimpleSerialTemplate(Parameterized, Plugin):
 
         # If we didn't get enough data, try to read more from the hardware
         data = str(bytearray(self.hardware_read(num, timeout=timeout)))
+        profiling.profiler.count("serial.bytesRead", len(data))
+        if data and self._cmdStart is not None:
+            profiling.profiler.addTime("serial.roundtrip", profiling.default_timer() - self._cmdStart)
+            self._cmdStart = None
         for c in data:
             self.terminal_queue.append(['in', c])
             if self.terminal_count < self.max_queue_size:
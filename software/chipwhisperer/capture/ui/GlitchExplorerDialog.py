@@ -26,7 +26,6 @@
 # Python standard imports
 import logging
 import math
-import pickle
 import sys
 from collections import OrderedDict
 from datetime import datetime
@@ -37,6 +36,7 @@ import chipwhisperer.common.utils.qt_tweaks as QtFixes
 from chipwhisperer.common.utils.parameter import Parameterized, Parameter
 from chipwhisperer.common.utils import util
 from chipwhisperer.common.results.base import ResultsBase
+from chipwhisperer.capture.api import glitch_results
 
 
 class GlitchExplorerDialog(Parameterized, QtFixes.QDialog):
@@ -52,7 +52,8 @@ class GlitchExplorerDialog(Parameterized, QtFixes.QDialog):
         self.mainSplitter = QSplitter(self)
         self.mainSplitter.setOrientation(Qt.Vertical)
 
-        self.tableList = []
+        self.results = glitch_results.GlitchResults()
+        self._predicates = None
         self.tune_parameter_list = OrderedDict()
 
         #Add default table
@@ -66,6 +67,8 @@ class GlitchExplorerDialog(Parameterized, QtFixes.QDialog):
             {'name':'Plot Widget', 'type':'action', 'action':self.openPlotWidget},
             {'name':'Normal Response', 'type':'str', 'key':'normalresp', 'value':'s.startswith("Bad")'},
             {'name':'Successful Response', 'type':'str', 'key':'successresp', 'value':'s.startswith("Welcome")'},
+            {'name':'Table Rows', 'type':'int', 'key':'tablerows', 'value':1000, 'limits':(1, 1000000),
+             'tip':'Only the newest results are kept in the table, all of them are counted & saved'},
 
             {'name':'Recordings', 'type':'group', 'expanded':False, 'children':[
                 {'name':'Load existing', 'type':'action', 'key':'open', 'action':lambda _:self.loadRecordings()},
@@ -127,32 +130,24 @@ class GlitchExplorerDialog(Parameterized, QtFixes.QDialog):
     def campaignStart(self, prefixname):
         """Called when acqusition campaign (multi-api) starts, generates filename"""
         self._autosavefname = self.parent().api.project().getDataFilepath(prefixname + "_glitchresults.p", subdirectory="glitchresults")["abs"]
-        self._autosavef = None
         self._campaignRunning = True
+        self._predicates = None
         self.clearPlotWidget()
 
     def campaignDone(self):
         self._campaignRunning = False
-
-        if self._autosavef:
-            self._autosavef.close()
-            self._autosavef = None
+        self.results.closeFile()
         self.table.setSortingEnabled(True)
 
     def updateStatus(self):
-        okcnt = 0
-        for t in self.tableList:
-            if t["success"]:
-                okcnt += 1
-
-        lbl = "Total %d, Glitches Successful %d" % (len(self.tableList), okcnt)
+        lbl = "Total %d, Glitches Successful %d" % (len(self.results), self.results.numSuccessful())
         self.statusLabel.setText(lbl)
 
     def reset(self, ignored=None):
         self.tune_parameter_list = OrderedDict()
 
     def clearTable(self, ignored=None):
-        self.tableList = []
+        self.results.clear()
         self.table.clear()
         self.table.setRowCount(0)
         self.table.setColumnCount(0)
@@ -210,6 +205,11 @@ class GlitchExplorerDialog(Parameterized, QtFixes.QDialog):
 
             self.table.resizeRowToContents(0)
 
+            # Drop the oldest rows, everything is still in self.results
+            maxrows = self.findParam('tablerows').getValue()
+            while self.table.rowCount() > maxrows:
+                self.table.removeRow(self.table.rowCount() - 1)
+
             widget = ResultsBase.registeredObjects.get("Glitch Explorer", None)
             if widget is not None:
                 widget.plot([newdata["settings"][0] if len(newdata["settings"])>0 else 0],
@@ -221,31 +221,22 @@ class GlitchExplorerDialog(Parameterized, QtFixes.QDialog):
         except AttributeError as e:
             raise StopIteration("Error when adding data to the table. Plese clear it and try again. Details:" + str(e))
 
-    def addResponse(self, resp):
-        """ Add a response from the system to glitch table + logs """
-
+    def compilePredicates(self):
+        """Compile the normal/successful expressions, done again only when they change"""
         normeval = self.findParam('normalresp').getValue()
         succeval = self.findParam('successresp').getValue()
+        if self._predicates is None or self._predicates[0] != (normeval, succeval):
+            self._predicates = ((normeval, succeval),
+                                glitch_results.compilePredicate(normeval, "normal"),
+                                glitch_results.compilePredicate(succeval, "success"))
+        return self._predicates[1:]
 
-        if len(normeval) > 0:
-            #Check if Normal
-            normresult = eval(normeval, {'s':resp}, {})
-        else:
-            normresult = False
-
-        #Check if Successful
-        if len(succeval) > 0:
-            #Check if Normal
-            succresult = eval(succeval, {'s':resp}, {})
-        else:
-            succresult = False
-
-        #Check ?
-        if not isinstance(normresult, bool):
-            raise ValueError("Result of 'normal' eval() not a bool, got %s (result: %s)" % (type(normresult), normresult))
+    def addResponse(self, resp):
+        """ Add a response from the system to glitch table + logs """
 
-        if not isinstance(succresult, bool):
-            raise ValueError("Result of 'success' eval() not a bool, got %s (result: %s)" % (type(succresult), succresult))
+        isnormal, issuccess = self.compilePredicates()
+        normresult = isnormal(resp)
+        succresult = issuccess(resp)
 
         if normresult and succresult:
             logging.warning('Both normresult and succresult True!')
@@ -255,48 +246,37 @@ class GlitchExplorerDialog(Parameterized, QtFixes.QDialog):
         respstr = str(bytearray(resp))
         # respstr = ' '.join(["%02x" % t for t in bytearray(resp)])
 
-        settingsList = self.tune_parameter_list.values()
-        newdata = {"input":"", "output":respstr, "normal":normresult, "success":succresult, "settings":settingsList, "date":starttime}
-
-        self.tableList.append(newdata)
+        saving = self._campaignRunning and self.findParam(["Recordings","saveresults"]).getValue()
+        if not saving:
+            self.results.closeFile()
+        elif not self.results.isFileOpen():
+            # File previously not open
+            try:
+                self.results.openFile(self._autosavefname, self.findParam(["Recordings",'savenotes']).getValue(),
+                                      self.tune_parameter_list.keys())
+            except Exception as e:
+                self.findParam(["Recordings","saveresults"]).setValue(False)
+                raise Warning("Could not save recordings to file: %s. Reason: %s. Disabling it in order to continue." % (self._autosavefname, str(e)))
+            self.findParam(["Recordings",'savefilename']).setValue(self._autosavefname, ignoreReadonly=True)
+
+        newdata = self.results.add(self.tune_parameter_list.values(), respstr, normresult, succresult, starttime)
         self.appendToTable(newdata)
         self.updateStatus()
 
-        if self._campaignRunning and self.findParam(["Recordings","saveresults"]).getValue():
-            if self._autosavef is None:
-                # File previously not open
-                try:
-                    self._autosavef = open(self._autosavefname, "w")
-                except Exception as e:
-                    self.findParam(["Recordings","saveresults"]).setValue(False)
-                    raise Warning("Could not save recordings to file: %s. Reason: %s. Disabling it in order to continue." % (self._autosavefname, str(e)))
-                self.findParam(["Recordings",'savefilename']).setValue(self._autosavefname, ignoreReadonly=True)
-
-                # Add notes
-                pickle.dump({"notes":self.findParam(["Recordings",'savenotes']).getValue()}, self._autosavef)
-
-                # Add headers
-                cmds = self.tune_parameter_list.keys()
-                pickle.dump({"commands":cmds}, self._autosavef)
-
-            # Add data
-            pickle.dump({"data":newdata}, self._autosavef)
-
     def loadRecordings(self, fname=None):
         if fname == None:
             fname, _ = QFileDialog.getOpenFileName(self, 'Open file', QSettings().value("open_glitch_file"),'*.p')
 
         if fname:
+            # Loaded attempts aren't part of the live autosave file
+            self.results.closeFile()
             self.clearTable()
-            file = open(fname, 'r')
-            self.findParam(["Recordings",'savenotes']).setValue(pickle.load(file)['notes'])
-            self.updateTableHeaders(override=pickle.load(file)['commands'])
-            while 1:
-                try:
-                    self.appendToTable(pickle.load(file)['data'])
-                except EOFError:
-                    break
-            file.close()
+            notes, commands, data = glitch_results.loadRecordings(fname)
+            self.findParam(["Recordings",'savenotes']).setValue(notes)
+            self.updateTableHeaders(override=commands)
+            for newdata in data:
+                self.appendToTable(self.results.addRecord(newdata))
+            self.updateStatus()
 
 
 def main():
@@ -35,6 +35,7 @@ from chipwhisperer.common.api.ProjectFormat import ProjectFormat
 from chipwhisperer.common.results.base import ResultsBase
 from chipwhisperer.common.ui.ProgressBar import *
 from chipwhisperer.common.utils import util, pluginmanager
+from chipwhisperer.common.utils.profiling import profiler
 from chipwhisperer.common.utils.parameter import Parameterized, Parameter, setupSetParam
 from chipwhisperer.common.utils.tracesource import TraceSource
 from chipwhisperer.common.api.settings import Settings
@@ -80,6 +81,9 @@ class CWCoreAPI(Parameterized):
         self._auxList = AuxList()
         self._numTraces = 50
         self._numTraceSets = 1
+        self._pipelined = False
+        self._overlapUpload = False
+        self._backgroundWrite = False
 
 
         # Storage for last key/plaintext/ciphertext
@@ -99,6 +103,13 @@ class CWCoreAPI(Parameterized):
                      'as each segment is buffered into RAM before being written to disk.'},
                     {'name':'Traces per Set', 'type':'int', 'readonly':True, 'get':self.tracesPerSet},
                     {'name':'Key/Text Pattern', 'type':'list', 'values':self.valid_acqPatterns, 'get':self.getAcqPattern, 'set':self.setAcqPattern},
+                    {'name':'Pipelined Capture', 'type':'bool', 'get':self.getPipelined, 'set':self.setPipelined, 'tip':'Generate key/text pairs in batches '
+                     'and only send the key to the target when it changes. Key isn\'t skipped if aux modules run before each trace, as they may reset the target.'},
+                    {'name':'Overlap Target Upload', 'type':'bool', 'get':self.getOverlapUpload, 'set':self.setOverlapUpload, 'tip':'With pipelined capture, '
+                     'send the next key/text to the target while the scope is read. Only if the target isn\'t connected through the scope\'s USB interface.'},
+                    {'name':'Background Trace Writing', 'type':'bool', 'get':self.getBackgroundWrite, 'set':self.setBackgroundWrite, 'tip':'Save traces '
+                     'from a separate thread while the next ones are captured. A trace the writer rejects is then skipped (and counted in the log) '
+                     'instead of being captured again with the same key/text.'},
             ]},
         ])
         self.scopeParam = Parameter(name="Scope Settings", type='group', addLoadSave=True).register()
@@ -327,6 +338,37 @@ class CWCoreAPI(Parameterized):
         """Set the number of sets/segments"""
         self._numTraceSets = s
 
+    def getPipelined(self):
+        """Return if captures are pipelined"""
+        return self._pipelined
+
+    @setupSetParam(["Acquisition Settings", "Pipelined Capture"])
+    def setPipelined(self, enabled):
+        """Batch key/text generation & skip sending unchanged keys during captures"""
+        self._pipelined = enabled
+
+    def getOverlapUpload(self):
+        """Return if the next key/text is sent during scope readout"""
+        return self._overlapUpload
+
+    @setupSetParam(["Acquisition Settings", "Overlap Target Upload"])
+    def setOverlapUpload(self, enabled):
+        """Send the next key/text to the target while the scope is read (pipelined captures only)"""
+        self._overlapUpload = enabled
+
+    def getBackgroundWrite(self):
+        """Return if traces are saved from a writer thread during captures"""
+        return self._backgroundWrite
+
+    @setupSetParam(["Acquisition Settings", "Background Trace Writing"])
+    def setBackgroundWrite(self, enabled):
+        """Save traces on a separate thread, rejected traces are skipped instead of redone"""
+        self._backgroundWrite = enabled
+
+    def getProfiler(self):
+        """Return the profiler collecting capture stage timings & counters"""
+        return profiler
+
     def tracesPerSet(self):
         """Return the number of traces in each set/segment"""
         return int(self._numTraces / self._numTraceSets)
@@ -366,6 +408,7 @@ class CWCoreAPI(Parameterized):
                 if progressBar.wasAborted(): break
 
                 this_seg_size = min(seg_size, N - i*seg_size)
+                profiler.startSegment()
                 if trace_fmt is not None:
                     currentTrace = self.getNewTrace(trace_fmt)
                     # Load trace writer information
@@ -391,7 +434,8 @@ class CWCoreAPI(Parameterized):
                     for func in aux_dict['set_prefix']:
                         func(prefix)
 
-                ac = AcquisitionController(scope, target, currentTrace, aux_dict, ktp)
+                ac = AcquisitionController(scope, target, currentTrace, aux_dict, ktp, pipelined=self._pipelined,
+                                           overlapUpload=self._overlapUpload, writeQueueSize=64 if self._backgroundWrite else 0)
                 ac.setMaxtraces(this_seg_size)
                 ac.sigNewTextResponse.connect(self.updateLastKeyText)
                 ac.sigTraceDone.connect(self.sigTraceDone.emit)
@@ -402,6 +446,9 @@ class CWCoreAPI(Parameterized):
 
                 if currentTrace is not None:
                     project.saveAllSettings(os.path.dirname(currentTrace.config.configFilename()) + "/%s_settings.cwset" % prefix, onlyVisibles=True)
+                    profilename = os.path.splitext(currentTrace.config.configFilename())[0] + "_profile"
+                    profiler.saveJSON(profilename + ".json", segment=True)
+                    profiler.saveCSV(profilename + ".csv", segment=True)
                     waveBuffer = currentTrace.traces  # Re-use the wave buffer to avoid memory reallocation
                 self.sigCampaignDone.emit()
                 tcnt += seg_size
@@ -24,10 +24,14 @@
 
 import ConfigParser
 import logging
+from collections import OrderedDict
 import os.path
 import re
+import numpy as np
 
 from chipwhisperer.common.traces.TraceContainerNative import TraceContainerNative
+from chipwhisperer.common.traces.TraceContainerChunked import TraceContainerChunked
+from chipwhisperer.common.traces._cfgfile import TraceContainerConfig
 from chipwhisperer.common.utils import util
 from chipwhisperer.common.utils.tracesource import TraceSource
 
@@ -39,7 +43,10 @@ class TraceManager(TraceSource):
     load and manage the traces.
     """
 
-    def __init__(self, name = "Trace Management"):
+    #Formats segments can be loaded as from a project file, keyed by the 'format' attribute of their config
+    _segmentFormats = {"native":TraceContainerNative, "chunked":TraceContainerChunked}
+
+    def __init__(self, name = "Trace Management", cacheSegments=8, cacheBytes=256*1024*1024):
         TraceSource.__init__(self, name)
         self.name = name
         self.dirty = util.Observable(False)
@@ -48,10 +55,14 @@ class TraceManager(TraceSource):
         self._sampleRate = 0
         self.lastUsedSegment = None
         self.traceSegments = []
+        self._loadedSegments = OrderedDict()  # id(segment) -> segment, least recently used first
+        self.setSegmentCache(cacheSegments, cacheBytes)
+        self.resetCacheStats()
         if __debug__: logging.debug('Created: ' + str(self))
 
     def newProject(self):
         """Create a new empty set of traces."""
+        self._flushSegmentCache()
         self.traceSegments = []
         self.dirty.setValue(False)
         self.sigTracesChanged.emit()
@@ -78,7 +89,7 @@ class TraceManager(TraceSource):
                 fname = fdir + t[1]
                 fname = os.path.normpath(fname.replace("\\", "/"))
                 # print "Opening %s"%fname
-                ti = TraceContainerNative()
+                ti = self._segmentFormats.get(self._segmentFormat(fname), TraceContainerNative)()
                 try:
                     ti.config.loadTrace(fname)
                 except Exception, e:
@@ -90,6 +101,14 @@ class TraceManager(TraceSource):
         self._setModified()
         self.dirty.setValue(False)
 
+    @staticmethod
+    def _segmentFormat(configfilename):
+        """Format name saved in a trace config file, 'native' if it can't be read"""
+        try:
+            return TraceContainerConfig(configfilename).attr("format")
+        except Exception:
+            return "native"
+
     def removeTraceSegments(self, positions):
         """Remove a list of trace segments. Do not repeat numbers!!"""
         if not isinstance(positions, list):
@@ -123,24 +142,78 @@ class TraceManager(TraceSource):
 
     def getSegment(self, traceIndex):
         """Return the trace segment with the specified trace in the list with all enabled segments."""
-        if self.lastUsedSegment is not None:
-            if self.lastUsedSegment.mappedRange is not None and self.lastUsedSegment.mappedRange[0] <= traceIndex <= \
-                    self.lastUsedSegment.mappedRange[1]:
-                return self.lastUsedSegment
-            else:
-                # Only load one segment at a time for memory reasons
-                self.lastUsedSegment.unloadAllTraces()
-                self.lastUsedSegment = None
+        if self.lastUsedSegment is not None and self.lastUsedSegment.mappedRange is not None and \
+                self.lastUsedSegment.mappedRange[0] <= traceIndex <= self.lastUsedSegment.mappedRange[1]:
+            self.cacheHits += 1
+            return self.lastUsedSegment
 
         for traceSegment in self.traceSegments:
             if traceSegment.mappedRange and traceSegment.mappedRange[0] <= traceIndex <= traceSegment.mappedRange[1]:
-                if not traceSegment.isLoaded():
-                    traceSegment.loadAllTraces(None, None)
+                if id(traceSegment) in self._loadedSegments and traceSegment.isLoaded():
+                    self.cacheHits += 1
+                else:
+                    self.cacheMisses += 1
+                    if not traceSegment.isLoaded():
+                        traceSegment.loadAllTraces(None, None)
+
+                self._loadedSegments.pop(id(traceSegment), None)
+                self._loadedSegments[id(traceSegment)] = traceSegment
                 self.lastUsedSegment = traceSegment
+                self._trimSegmentCache()
                 return traceSegment
 
         raise ValueError("Error: Trace %d is not in mapped range." % traceIndex)
 
+    def setSegmentCache(self, maxSegments, maxBytes):
+        """
+        Set how many segments are kept loaded at once, and how much memory (in bytes) they may use. Memory mapped
+        trace data isn't counted, the OS can page it out. The segment in use is always kept.
+        """
+        self._cacheSegments = max(1, maxSegments)
+        self._cacheBytes = maxBytes
+        self._trimSegmentCache()
+
+    def getSegmentCache(self):
+        """Return (maxSegments, maxBytes) of the segment cache"""
+        return self._cacheSegments, self._cacheBytes
+
+    def resetCacheStats(self):
+        self.cacheHits = 0
+        self.cacheMisses = 0
+
+    def cacheStats(self):
+        """Return a dictionary with the hits/misses of the segment cache, and what is loaded right now"""
+        return {'hits':self.cacheHits, 'misses':self.cacheMisses, 'segments':len(self._loadedSegments),
+                'bytes':sum(self._segmentBytes(t) for t in self._loadedSegments.values())}
+
+    @staticmethod
+    def _segmentBytes(segment):
+        """Memory used by a loaded segment"""
+        total = 0
+        for attr in ('traces', 'textins', 'textouts', 'keylist'):
+            data = getattr(segment, attr, None)
+            if isinstance(data, np.ndarray) and not isinstance(data, np.memmap):
+                total += data.nbytes
+        return total
+
+    def _trimSegmentCache(self):
+        """Unload least recently used segments until the cache fits in its limits"""
+        if len(self._loadedSegments) <= 1:
+            return
+
+        usedBytes = sum(self._segmentBytes(t) for t in self._loadedSegments.values())
+        while len(self._loadedSegments) > 1 and (len(self._loadedSegments) > self._cacheSegments or usedBytes > self._cacheBytes):
+            _, t = self._loadedSegments.popitem(last=False)
+            usedBytes -= self._segmentBytes(t)
+            t.unloadAllTraces()
+
+    def _flushSegmentCache(self):
+        """Unload every cached segment, e.g. after the segment list changed"""
+        for t in self._loadedSegments.values():
+            t.unloadAllTraces()
+        self._loadedSegments.clear()
+        self.lastUsedSegment = None
+
     def getAuxData(self, n, auxDic):
         """Return data about a segment"""
         t = self.getSegment(n)
@@ -175,6 +248,43 @@ class TraceManager(TraceSource):
         except ValueError:
             return []
 
+    def _segmentPieces(self, start, end):
+        """
+        Split traces start to end-1 into (segment, local start, local end) pieces. Generator as getSegment() may
+        unload the least recently used segment from the cache, so each piece has to be read before asking for the next.
+        """
+        n = start
+        while n < end:
+            t = self.getSegment(n)
+            pend = min(end, t.mappedRange[1] + 1)
+            yield t, n - t.mappedRange[0], pend - t.mappedRange[0]
+            n = pend
+
+    def getTraces(self, start, end, pointRange=None):
+        """Return traces start to end-1 as a 2-D array, slicing each segment directly"""
+        data = [t.getTraces(s, e, pointRange) for t, s, e in self._segmentPieces(start, end)]
+        if len(data) == 1:
+            return data[0]
+
+        #Segments may differ in length, only the common part can be stacked
+        npoints = min(d.shape[1] for d in data)
+        return np.concatenate([d[:, :npoints] for d in data])
+
+    def getTextins(self, start, end):
+        """Return the input texts of traces start to end-1"""
+        return np.concatenate([np.asarray(t.getTextins(s, e)) for t, s, e in self._segmentPieces(start, end)])
+
+    def getTextouts(self, start, end):
+        """Return the output texts of traces start to end-1"""
+        return np.concatenate([np.asarray(t.getTextouts(s, e)) for t, s, e in self._segmentPieces(start, end)])
+
+    def getKnownKeys(self, start, end):
+        """Return the known encryption keys of traces start to end-1"""
+        keys = []
+        for t, s, e in self._segmentPieces(start, end):
+            keys.extend(t.getKnownKeys(s, e))
+        return keys
+
     def _updateRanges(self):
         """Update the trace range for each segments."""
         startTrace = 0
@@ -185,13 +295,13 @@ class TraceManager(TraceSource):
                 tlen = t.numTraces()
                 t.mappedRange = [startTrace, startTrace+tlen-1]
                 startTrace = startTrace + tlen
-                np = int(t.config.attr("numPoints"))
-                if self._numPoints != np and np != 0:
+                npoints = int(t.config.attr("numPoints"))
+                if self._numPoints != npoints and npoints != 0:
                     if self._numPoints == 0:
-                        self._numPoints = np
+                        self._numPoints = npoints
                     else:
-                        logging.warning("Selected trace segments have different number of points: %d!=%d" % (self._numPoints, np))
-                        self._numPoints = min(self._numPoints, np)
+                        logging.warning("Selected trace segments have different number of points: %d!=%d" % (self._numPoints, npoints))
+                        self._numPoints = min(self._numPoints, npoints)
 
                 sr = int(float(t.config.attr("scopeSampleRate")))
                 if self._sampleRate != sr and sr != 0:
@@ -220,6 +330,7 @@ class TraceManager(TraceSource):
     def _setModified(self):
         """Notify passive and active observers to be updated."""
         self.dirty.setValue(True)
+        self._flushSegmentCache()
         self._updateRanges()
         self.sigTracesChanged.emit()
 
@@ -57,14 +57,11 @@ class CorrelationVsTrace(AttackResultPlot, Plugin):
             newdata = [0] * self._numKeys()
             for bnum in enabledlist:
                 maxdata = data[bnum]
-                tlist = []
-                for m in maxdata:
-                    tlist.append(m['trace'])
+                tlist = list(maxdata['trace'])
 
                 maxlist = np.zeros((self._numPerms(bnum), len(tlist)))
                 for i, m in enumerate(maxdata):
-                    for j in range(0, self._numPerms(bnum)):
-                        maxlist[m['maxes'][j][0], i] = m['maxes'][j][2]
+                    maxlist[m['maxes']['hyp'], i] = m['maxes']['value']
 
                 newdata[bnum] = maxlist
                 xrangelist[bnum] = tlist
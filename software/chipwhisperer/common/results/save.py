@@ -24,7 +24,7 @@
 #    along with chipwhisperer.  If not, see <http://www.gnu.org/licenses/>.
 #=================================================
 
-import copy
+import json
 from datetime import datetime
 import numpy as np
 from chipwhisperer.analyzer.attacks._base import AttackObserver
@@ -32,6 +32,32 @@ from .base import ResultsBase
 from chipwhisperer.common.utils.pluginmanager import Plugin
 from chipwhisperer.common.utils.parameter import setupSetParam
 
+#First line of a results file, followed by the JSON shape info on the same line & then the raw records
+_MAGIC = "CWRESULTS1 "
+
+
+def resultsDtype(numKeys, numPerms):
+    """One record per analysis update: traces used per subkey (-1 if not attacked), max & min of each guess"""
+    return np.dtype([('tracecnt', np.int64, (numKeys,)),
+                     ('diffsmax', np.float64, (numKeys, numPerms)),
+                     ('diffsmin', np.float64, (numKeys, numPerms))])
+
+
+def loadResults(filename):
+    """
+    Read a file written by ResultsSave back as a record array, e.g. loadResults(f)['diffsmax'] is an array of shape
+    (updates, subkeys, guesses).
+    """
+    with open(filename, 'rb') as f:
+        header = f.readline()
+        if not header.startswith(_MAGIC):
+            raise IOError("%s is not a results file" % filename)
+        info = json.loads(header[len(_MAGIC):])
+        dtype = resultsDtype(info['numKeys'], info['numPerms'])
+        #A record cut short (e.g. the attack was killed mid-write) is ignored
+        data = f.read()
+    return np.frombuffer(data[:len(data) - len(data) % dtype.itemsize], dtype=dtype)
+
 
 class ResultsSave(ResultsBase, AttackObserver, Plugin):
     _name = "Save to Files"
@@ -41,14 +67,14 @@ class ResultsSave(ResultsBase, AttackObserver, Plugin):
         AttackObserver.__init__(self)
         self._filename = None
         self._enabled = False
-        self.dataarray = None
+        self._dtype = None
 
         self.getParams().addChildren([
             {'name':'Save Raw Results', 'type':'bool', 'get':self.getEnabled, 'set':self.setEnabled}
         ])
 
     def analysisUpdated(self):
-        """Stats have been updated"""
+        """Stats have been updated, append one record to the results file (read it back with loadResults())"""
         if self._enabled == False:
             return
 
@@ -61,30 +87,37 @@ class ResultsSave(ResultsBase, AttackObserver, Plugin):
 
         if self._filename is None:
             # Generate filename
-            self._filename = "tempstats_%s.npy" % datetime.now().strftime('%Y%m%d_%H%M%S')
+            self._filename = "tempstats_%s.cwres" % datetime.now().strftime('%Y%m%d_%H%M%S')
 
-            # Generate Array
-            self.dataarray = []
+            # Record size is fixed by the first update
+            info = {'numKeys':self._numKeys(), 'numPerms':self._maxNumPerms()}
+            self._dtype = resultsDtype(info['numKeys'], info['numPerms'])
+            with open(self._filename, 'wb') as f:
+                f.write(_MAGIC + json.dumps(info) + "\n")
 
         # Record max & min, used as we don't know if user wanted absolute mode or not
-
-        tempmin = np.ndarray((self._numKeys(), self._maxNumPerms()))
-        tempmax = np.ndarray((self._numKeys(), self._maxNumPerms()))
-
-        for i in range(0, self._numKeys()):
-            for j in range(0, self._numPerms(i)):
+        rec = np.zeros(1, dtype=self._dtype)
+        tracecnt = rec['tracecnt'][0]
+        tempmax = rec['diffsmax'][0]
+        tempmin = rec['diffsmin'][0]
+        tempmax[:] = np.nan
+        tempmin[:] = np.nan
+        numKeys, numPerms = tempmax.shape
+
+        for i in range(0, min(self._numKeys(), numKeys)):
+            tnum = attackStats.diffs_tnum[i]
+            tracecnt[i] = -1 if tnum is None else tnum
+            for j in range(0, min(self._numPerms(i), numPerms)):
                 tempmax[i][j] = np.nanmax(attackStats.diffs[i][j])
                 tempmin[i][j] = np.nanmin(attackStats.diffs[i][j])
 
-        newdata = {"tracecnt":copy.deepcopy(attackStats.diffs_tnum), "diffsmax":tempmax, "diffsmin":tempmin}
-
-        self.dataarray.append(newdata)
-        np.save(self._filename, self.dataarray)
+        with open(self._filename, 'ab') as f:
+            f.write(rec.tobytes())
 
     def processAnalysis(self):
         """Attack is done"""
         self._filename = None
-        self.dataarray = None
+        self._dtype = None
 
     def getEnabled(self):
         return self._enabled
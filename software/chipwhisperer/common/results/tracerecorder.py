@@ -78,7 +78,12 @@ class TraceRecorder(ResultsBase, PassiveTraceObserver, Plugin):
         trace = CWCoreAPI.getInstance().getNewTrace(self.findParam('tracefmt').getValue())
         trace.config.setAttr("scopeSampleRate", self._traceSource.getSampleRate())
         trace.config.setAttr("notes", "Recorded from \"%s\" output: Traces (%s,%s). Points (%s,%s)" % (self.findParam('Input').getValueKey(), tstart, tend, pstart, pend))
-        for tnum in range(tstart, tend+1):
-            trace.addTrace(self.getTraceSource().getTrace(tnum)[pstart:pend+1], self.getTraceSource().getTextin(tnum), self.getTraceSource().getTextout(tnum), self.getTraceSource().getKnownKey(tnum))
+        traceSource = self.getTraceSource()
+        waves = traceSource.getTraces(tstart, tend+1, (pstart, pend+1))
+        textins = traceSource.getTextins(tstart, tend+1)
+        textouts = traceSource.getTextouts(tstart, tend+1)
+        keys = traceSource.getKnownKeys(tstart, tend+1)
+        for i in range(len(waves)):
+            trace.addTrace(waves[i], textins[i], textouts[i], keys[i])
         trace.closeAll()
         CWCoreAPI.getInstance().project().traceManager().appendSegment(trace, enabled=False)
@@ -0,0 +1,373 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2013-2017, NewAE Technology Inc
+# All rights reserved.
+#
+# Find this and more at newae.com - this file is part of the chipwhisperer
+# project, http://www.assembla.com/spaces/chipwhisperer
+#
+#    This file is part of chipwhisperer.
+#
+#    chipwhisperer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    chipwhisperer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with chipwhisperer.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import zlib
+from collections import OrderedDict
+import numpy as np
+from _base import TraceContainer
+from chipwhisperer.common.utils import profiling
+from chipwhisperer.common.utils.parameter import setupSetParam
+
+
+def packChunk(data):
+    """
+    Losslessly compress a block of traces. Integer codes (e.g. 10-bit ADC values) are stored as the difference to
+    the previous point, which stays small, and the bytes are shuffled so all high bytes end up next to each other.
+    """
+    data = np.ascontiguousarray(data)
+    if data.dtype.kind in 'iu' and data.shape[1] > 1:
+        #Wraps around for large steps, undone exactly by the (also wrapping) cumsum when unpacking
+        delta = data.copy()
+        delta[:, 1:] = np.diff(data, axis=1)
+        data = delta
+    shuffled = data.view(np.uint8).reshape(data.shape + (data.dtype.itemsize,)).transpose(2, 0, 1)
+    return zlib.compress(np.ascontiguousarray(shuffled).tostring(), 6)
+
+
+def unpackChunk(packed, shape, dtype):
+    """Undo packChunk(), shape & dtype are those of the original block"""
+    dtype = np.dtype(dtype)
+    data = np.frombuffer(zlib.decompress(packed), dtype=np.uint8).reshape((dtype.itemsize,) + tuple(shape))
+    data = np.ascontiguousarray(data.transpose(1, 2, 0)).view(dtype).reshape(shape)
+    if dtype.kind in 'iu' and shape[1] > 1:
+        data = np.cumsum(data, axis=1, dtype=dtype)
+    return data
+
+
+class ChunkedTraces(object):
+    """
+    Read-only 2-D array of all traces in a TraceContainerChunked, behaves enough like the ndarray of the native format
+    for TraceContainer (traces[n], traces[start:end, p0:p1], shape, dtype, np.asarray). Slices inside one uncompressed
+    chunk are memory-mapped views, otherwise the needed chunks are read & joined. The chunk still being captured is
+    read from memory.
+    """
+
+    ndim = 2
+
+    def __init__(self, owner, cacheChunks=16):
+        self._owner = owner
+        self._cacheChunks = cacheChunks
+        self._cache = OrderedDict()
+
+    @property
+    def dtype(self):
+        return self._owner._chunkDtype
+
+    @property
+    def shape(self):
+        return (len(self), self._owner._numPoints)
+
+    def __len__(self):
+        return self._owner._numTraces
+
+    def __array__(self, dtype=None):
+        data = self[0:len(self)]
+        if dtype is not None:
+            return np.asarray(data, dtype=dtype)
+        return np.asarray(data)
+
+    def dropCache(self):
+        self._cache.clear()
+
+    def chunk(self, k):
+        """All stored traces of chunk k"""
+        owner = self._owner
+        if k == owner._flushedChunks and owner._buffer is not None:
+            return owner._buffer[:owner._numTraces - k * owner._chunkSize]
+
+        if k in self._cache:
+            data = self._cache.pop(k)
+        else:
+            rows = min(owner._chunkSize, owner._numTraces - k * owner._chunkSize)
+            fname = owner.chunkFilename(k)
+            if owner._compression == 'zlib':
+                with open(fname, 'rb') as f:
+                    data = unpackChunk(f.read(), (rows, owner._numPoints), owner._chunkDtype)
+            else:
+                data = np.load(fname, mmap_mode='r')
+
+        #Least recently used chunk dropped first, each memory-mapped one holds a file handle open
+        self._cache[k] = data
+        while len(self._cache) > self._cacheChunks:
+            self._cache.popitem(last=False)
+        return data
+
+    def __getitem__(self, idx):
+        if isinstance(idx, tuple):
+            rows, cols = idx[0], idx[1:]
+        else:
+            rows, cols = idx, ()
+
+        csize = self._owner._chunkSize
+        if isinstance(rows, (int, long, np.integer)):
+            n = rows + len(self) if rows < 0 else rows
+            if not 0 <= n < len(self):
+                raise IndexError("Trace %d out of range (%d traces)" % (rows, len(self)))
+            return self.chunk(n // csize)[(n % csize,) + cols]
+
+        if not isinstance(rows, slice):
+            return np.asarray(self)[idx]
+
+        start, stop, step = rows.indices(len(self))
+        if step != 1:
+            return self[start:stop][(slice(None, None, step),) + cols]
+        if stop <= start:
+            return np.zeros((0, self._owner._numPoints), dtype=self.dtype)[(slice(None),) + cols]
+
+        pieces = []
+        for k in range(start // csize, (stop - 1) // csize + 1):
+            s = max(start - k * csize, 0)
+            e = min(stop - k * csize, csize)
+            pieces.append(self.chunk(k)[(slice(s, e),) + cols])
+        if len(pieces) == 1:
+            return pieces[0]
+        return np.concatenate(pieces)
+
+
+class TraceContainerChunked(TraceContainer):
+    """
+    Traces stored in files of a fixed number of traces ('chunks'). Adding a trace only writes to the current chunk
+    buffer, & a full chunk is written once without touching the earlier ones, so captures of any length never
+    copy or resize the whole trace array. Chunks are either plain .npy files which are memory-mapped when read, or
+    losslessly compressed. The chunk size & compression are kept in the config file, which acts as the index: chunk k
+    holds traces k*chunkSize to (k+1)*chunkSize-1.
+    """
+    _name = "ChipWhisperer/Chunked"
+    _compressionTypes = {'None (memory-mapped reads)':'none', 'zlib (lossless)':'zlib'}
+
+    def __init__(self, configfile=None):
+        self._chunkSize = 1000
+        self._compression = 'none'
+        TraceContainer.__init__(self, configfile)
+        self.getParams().addChildren([
+                {'name':'Chunk Size', 'key':'chunksize', 'type':'int', 'limits':(1, 1E6), 'get':self.getChunkSize, 'set':self.setChunkSize,
+                 'tip':'Number of traces in each file. Only the chunk being captured is kept in memory.'},
+                {'name':'Compression', 'key':'compression', 'type':'list', 'values':self._compressionTypes, 'get':self.getCompression, 'set':self.setCompression,
+                 'tip':'Compressed chunks are smaller (especially with integer storage), but have to be decompressed when read.'},
+        ])
+
+    def clear(self):
+        TraceContainer.clear(self)
+        self._buffer = None
+        self._flushedChunks = 0
+        self._numPoints = 0
+        self._chunkDtype = None
+        self.config.attrList.append({
+                "sectionName":"Chunked Trace Config",
+                "moduleName":"chunked",
+                "module":None,
+                "values":{
+                    "chunkSize":{"order":0, "value":self._chunkSize, "desc":"Number of traces in each chunk file", "changed":False, "editable":False},
+                    "compression":{"order":1, "value":self._compression, "desc":"Compression of the chunk files", "changed":False, "editable":False},
+                    },
+                })
+        self.config.syncFile(sectionname="Chunked Trace Config")
+
+        #Format name must agree with names from TraceContainerFormatList
+        self.config.setAttr("format", "chunked")
+
+    def getChunkSize(self):
+        return self._chunkSize
+
+    @setupSetParam("Chunk Size")
+    def setChunkSize(self, size):
+        """Traces per chunk file, used for traces captured from now on"""
+        self._chunkSize = int(size)
+
+    def getCompression(self):
+        return self._compression
+
+    @setupSetParam("Compression")
+    def setCompression(self, compression):
+        """'none' or 'zlib', used for traces captured from now on"""
+        self._compression = compression
+
+    def chunkFilename(self, k, kind="traces"):
+        directory = os.path.dirname(self.config.configFilename())
+        prefix = self.config.attr("prefix")
+        if kind == "traces":
+            ext = "zlib" if self._compression == 'zlib' else "npy"
+        else:
+            ext = "npz"
+        return os.path.join(directory, "%s%s_%06d.%s" % (prefix, kind, k, ext))
+
+    def setTraceBuffer(self, tracebuffer):
+        """Each segment only needs one chunk buffer, nothing to reuse"""
+        pass
+
+    def numPoints(self):
+        return self._numPoints
+
+    def writeDataToConfig(self):
+        TraceContainer.writeDataToConfig(self)
+        self.config.setAttr("chunkSize", self._chunkSize)
+        self.config.setAttr("compression", self._compression)
+
+    def addWave(self, trace, dtype=None):
+        if self._buffer is None:
+            if self._numTraces > 0:
+                raise Warning("Traces can only be added to a chunked trace file while it is being captured.")
+            if dtype is None:
+                dtype = np.dtype(self._storageType)
+            self.tracedtype = dtype
+            self._chunkDtype = np.dtype(dtype)
+            self._numPoints = len(trace)
+            self._buffer = np.zeros((self._chunkSize, self._numPoints), dtype=dtype)
+            self.traces = ChunkedTraces(self)
+
+        #Validate traces fit - if too short warn & pad (prevents aborting long captures)
+        pad = self._numPoints - len(trace)
+        if pad > 0:
+            logging.warning('Trace too short (length=%d)' % len(trace) + " *This MAY SUGGEST DATA CORRUPTION*")
+            logging.warning('Padding with %d zero points' % pad)
+            trace = np.concatenate((trace, [0]*pad))
+
+        self._buffer[self._numTraces - self._flushedChunks * self._chunkSize][:] = self._encode(trace)
+        self._numTraces += 1
+        self.setDirty(True)
+        self.writeDataToConfig()
+
+    def addTrace(self, trace, textin, textout, key, dtype=None, channelNum=0):
+        TraceContainer.addTrace(self, trace, textin, textout, key, dtype, channelNum)
+        if self._numTraces - self._flushedChunks * self._chunkSize == self._chunkSize:
+            self.flushChunk()
+
+    @profiling.timed("traces.flushChunk")
+    def flushChunk(self):
+        """Write the chunk being captured (full or not) & the config file, only a full chunk moves on to the next"""
+        rows = self._numTraces - self._flushedChunks * self._chunkSize
+        if self._buffer is None or rows == 0:
+            return
+        if not self.config.configFilename():
+            raise Warning("Chunked traces are written next to their config file, set a config file name first.")
+
+        k = self._flushedChunks
+        data = self._buffer[:rows]
+        if self._compression == 'zlib':
+            with open(self.chunkFilename(k), 'wb') as f:
+                f.write(packChunk(data))
+        else:
+            np.save(self.chunkFilename(k), data)
+
+        tslice = slice(k * self._chunkSize, k * self._chunkSize + rows)
+        #Everything is stored as plain uint8 arrays, object arrays can't be loaded back without pickle
+        np.savez(self.chunkFilename(k, "text"), textin=np.array(self.textins[tslice], dtype=np.uint8),
+                 textout=np.array(self.textouts[tslice], dtype=np.uint8),
+                 keylist=np.array(self.keylist[tslice], dtype=np.uint8),
+                 knownkey=np.array(bytearray(self.knownkey if self.knownkey is not None else []), dtype=np.uint8))
+
+        if rows == self._chunkSize:
+            self._flushedChunks += 1
+        self.config.saveTrace()
+        self.setDirty(False)
+
+    def loadAllTraces(self, directory=None, prefix=""):
+        """Text & keys are loaded into memory, traces are only read from their chunks when used"""
+        self._chunkSize = int(self.config.attr("chunkSize"))
+        self._compression = self.config.attr("compression")
+        self._chunkDtype = np.dtype(self.config.attr("traceDtype"))
+        self.tracedtype = self._chunkDtype
+        self._numPoints = int(self.config.attr("numPoints"))
+        self._numTraces = int(self.config.attr("numTraces"))
+        self._flushedChunks = self._numTraces // self._chunkSize
+        self._buffer = None
+        self.traces = ChunkedTraces(self)
+        self.loadTraceScaling()
+
+        textins, textouts, keylist = [], [], []
+        self.knownkey = None
+        for k in range(-(-self._numTraces // self._chunkSize)):
+            text = np.load(self.chunkFilename(k, "text"))
+            textins.append(text["textin"])
+            textouts.append(text["textout"])
+            keylist.append(text["keylist"])
+            #No known key is saved as an empty array
+            if "knownkey" in text.files and text["knownkey"].size:
+                self.knownkey = text["knownkey"]
+        if textins:
+            self.textins = np.concatenate(textins)
+            self.textouts = np.concatenate(textouts)
+            self.keylist = np.concatenate(keylist)
+
+        self.setDirty(False)
+        self._isloaded = True
+
+    def unloadAllTraces(self):
+        """Drop traces from memory to save space """
+        self.traces = None
+        self._buffer = None
+        self.textins = None
+        self.textouts = None
+        self.knownkey = None
+        self.keylist = None
+        self._isloaded = False
+
+    def saveAuxData(self, data, configDict, filenameKey="filename"):
+        path = os.path.dirname(self.config.configFilename())
+        prefix = self.config.attr("prefix")
+        fname = "%s%s_aux_%04d.npy" % (prefix, configDict["moduleName"], configDict["auxNumber"])
+        np.save(path + "/" + fname, data)
+
+        configDict["values"][filenameKey]["value"] = fname
+        configDict["values"][filenameKey]["changed"] = True
+        self.config.syncFile(sectionname=configDict["sectionName"])
+        self.config.saveTrace()
+
+        return fname
+
+    def loadAuxData(self, fname):
+        path = os.path.dirname(self.config.configFilename())
+        return np.load(path + "/" + fname)
+
+    def copyTo(self, srcTraces=None):
+        """Copy another container into chunks, one trace at a time so the source never has to be copied whole"""
+        if hasattr(srcTraces, 'getTraceScaling'):
+            self.setTraceScaling(*srcTraces.getTraceScaling())
+        self.setKnownKey(srcTraces.knownkey)
+        dtype = srcTraces.tracedtype if srcTraces.tracedtype else np.float64
+        for n in range(srcTraces.numTraces()):
+            self.addTrace(srcTraces.getTrace(n), srcTraces.getTextin(n), srcTraces.getTextout(n),
+                          srcTraces.getKnownKey(n), dtype=dtype)
+
+    def saveAllTraces(self, directory=None, prefix=""):
+        """Earlier chunks are already on disk, only the one being captured is written"""
+        self.flushChunk()
+
+    def closeAll(self, clearTrace=True, clearText=True, clearKeys=True):
+        self.flushChunk()
+
+        # Release memory associated with data in case this isn't deleted
+        if clearTrace:
+            self.traces = None
+            self._buffer = None
+
+        if clearText:
+            self.textins = None
+            self.textouts = None
+
+        if clearKeys:
+            self.keylist = None
+            self.knownkey = None
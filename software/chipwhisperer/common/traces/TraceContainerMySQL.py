@@ -250,6 +250,20 @@ class TraceContainerMySQL(TraceContainer):
         wv = self.db.query("SELECT Wave FROM %s LIMIT 1 OFFSET %d"%(self.tableName, n)).rows[0][0]
         return self.formatWave(wv, read=True)
 
+    def getTraces(self, start, end, pointRange=None):
+        if pointRange is None:
+            pointRange = (0, None)
+        return np.array([self.getTrace(n)[pointRange[0]:pointRange[1]] for n in range(start, end)])
+
+    def getTextins(self, start, end):
+        return np.array([self.getTextin(n) for n in range(start, end)])
+
+    def getTextouts(self, start, end):
+        return np.array([self.getTextout(n) for n in range(start, end)])
+
+    def getKnownKeys(self, start, end):
+        return [self.getKnownKey(n) for n in range(start, end)]
+
     def asc2list(self, asc):
         lst = []
         for i in range(0,len(asc),2):
@@ -51,6 +51,8 @@ class TraceContainerNative(TraceContainer):
             userdtype = np.float
 
         self.traces = np.array(srcTraces.traces, dtype=userdtype)
+        if hasattr(srcTraces, 'getTraceScaling'):
+            self.setTraceScaling(*srcTraces.getTraceScaling())
 
         # Traces copied in means not saved
         self.setDirty(True)
@@ -65,6 +67,7 @@ class TraceContainerNative(TraceContainer):
                 prefix = self.config.attr("prefix")
 
         self.traces = np.load(directory + "/%straces.npy" % prefix, mmap_mode='r')
+        self.loadTraceScaling()
         self.textins = np.load(directory + "/%stextin.npy" % prefix)
         self.textouts = np.load(directory + "/%stextout.npy" % prefix)
 
@@ -24,6 +24,7 @@
 __author__ = "Colin O'Flynn"
 
 import TraceContainerNative
+import TraceContainerChunked
 try:
     import TraceContainerMySQL
 except ImportError:
@@ -31,6 +32,7 @@ except ImportError:
 
 import TraceContainerDPAv3
 
-TraceContainerFormatList = {"native":TraceContainerNative.TraceContainerNative, "dpav3":TraceContainerDPAv3.TraceContainerDPAv3 }
+TraceContainerFormatList = {"native":TraceContainerNative.TraceContainerNative, "dpav3":TraceContainerDPAv3.TraceContainerDPAv3,
+                            "chunked":TraceContainerChunked.TraceContainerChunked }
 if TraceContainerMySQL is not None:
     TraceContainerFormatList["mysql"] = TraceContainerMySQL.TraceContainerMySQL
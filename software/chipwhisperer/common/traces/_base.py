@@ -27,8 +27,9 @@ import logging
 import re
 import numpy as np
 import _cfgfile
+from chipwhisperer.common.utils import profiling
 from chipwhisperer.common.utils.pluginmanager import Plugin
-from chipwhisperer.common.utils.parameter import Parameterized, Parameter
+from chipwhisperer.common.utils.parameter import Parameterized, Parameter, setupSetParam
 
 
 class TraceContainer(Parameterized, Plugin):
@@ -40,14 +41,19 @@ class TraceContainer(Parameterized, Plugin):
     adds functions for reading/storing data in the 'native' ChipWhisperer format.
     """
     _name = "Trace Configuration"
+    _storageTypes = {'Float 64-bit':'float64', 'Float 32-bit':'float32', 'Integer 16-bit (raw ADC codes)':'int16'}
     
     def __init__(self, configfile=None):
         self.configfile = configfile
         self.fmt = None
+        self._storageType = 'float64'
         self.getParams().register()
         self.getParams().addChildren([
                 {'name':'Config File', 'key':'cfgfile', 'type':'str', 'readonly':True, 'value':''},
                 {'name':'Format', 'key':'format', 'type':'str', 'readonly':True, 'value':''},
+                {'name':'Storage Type', 'key':'storage', 'type':'list', 'values':self._storageTypes, 'get':self.getStorageType, 'set':self.setStorageType,
+                 'tip':'Data type new traces are stored as. Integer storage keeps the raw ADC codes and scales them when read, '
+                       'this needs a scope which reports its ADC scaling.'},
         ])
         self.clear()
 
@@ -59,6 +65,8 @@ class TraceContainer(Parameterized, Plugin):
         self.knownkey = None
         self.dirty = False
         self.tracedtype = np.double
+        self.traceScale = None
+        self.traceOffset = 0.0
         self.traces = None
         self.tracehint = 1
         self.pointhint = 0
@@ -67,6 +75,49 @@ class TraceContainer(Parameterized, Plugin):
 
     def setDirty(self, dirty):
         self.dirty = dirty
+
+    def getStorageType(self):
+        return self._storageType
+
+    @setupSetParam("Storage Type")
+    def setStorageType(self, storage):
+        """Data type ('float64', 'float32' or 'int16') traces added from now on are stored as"""
+        self._storageType = storage
+
+    def setTraceScaling(self, scale, offset=0.0):
+        """Integer traces are stored as codes, with value = code*scale + offset. Ignored for float storage."""
+        self.traceScale = scale
+        self.traceOffset = offset
+
+    def getTraceScaling(self):
+        """(scale, offset) of the stored trace points, (1.0, 0.0) if they aren't scaled"""
+        if self.traces is None or self.traces.dtype.kind == 'f' or self.traceScale is None:
+            return (1.0, 0.0)
+        return (self.traceScale, self.traceOffset)
+
+    def loadTraceScaling(self):
+        """Restore the trace scaling from the config file, after the traces were loaded"""
+        self.traceScale = float(self.config.attr("traceScale"))
+        self.traceOffset = float(self.config.attr("traceOffset"))
+
+    def _encode(self, trace):
+        """Trace as stored, integer storage rounds to the nearest code"""
+        if self.traces.dtype.kind == 'f':
+            return trace
+        if self.traceScale is None:
+            raise Warning("Storing traces as %s needs the ADC scaling of the scope, use float storage with this scope." % self.traces.dtype.name)
+        info = np.iinfo(self.traces.dtype)
+        return np.clip(np.round((np.asarray(trace) - self.traceOffset) / self.traceScale), info.min, info.max)
+
+    def _decode(self, data):
+        """Stored points to values, integer codes are scaled to float32 as they are read"""
+        if data.dtype.kind == 'f':
+            return data
+        scale, offset = self.getTraceScaling()
+        data = data.astype(np.float32)
+        data *= scale
+        data += offset
+        return data
         
     def updateConfigData(self):
         return
@@ -93,7 +144,8 @@ class TraceContainer(Parameterized, Plugin):
             self._numTraces = max(cfint, self._numTraces)
         return self._numTraces
 
-    def addTrace(self, trace, textin, textout, key, dtype=np.double, channelNum=0):
+    @profiling.timed("traces.addTrace")
+    def addTrace(self, trace, textin, textout, key, dtype=None, channelNum=0):
         if channelNum!=0:
             raise NotImplementedError
         self.addWave(trace, dtype)
@@ -103,16 +155,21 @@ class TraceContainer(Parameterized, Plugin):
 
     def writeDataToConfig(self):
         self.config.setAttr("numTraces", self._numTraces)
-        self.config.setAttr("numPoints", self.numPoints())      
+        self.config.setAttr("numPoints", self.numPoints())
+        if self.traces is not None:
+            self.config.setAttr("traceDtype", self.traces.dtype.name)
+            scale, offset = self.getTraceScaling()
+            self.config.setAttr("traceScale", scale)
+            self.config.setAttr("traceOffset", offset)
 
     def addWave(self, trace, dtype=None):
         try:
             if self.traces is None:
                 if dtype is None:
-                    dtype = np.double
+                    dtype = np.dtype(self._storageType)
                 self.tracedtype = dtype
                 self.traces = np.zeros((self.tracehint, len(trace)), dtype=dtype)
-                self.traces[self._numTraces][:] = trace
+                self.traces[self._numTraces][:] = self._encode(trace)
             else:
                 # Check can fit this
                 if self.traces.shape[0] <= self._numTraces:
@@ -130,7 +187,7 @@ class TraceContainer(Parameterized, Plugin):
                     logging.warning('Padding with %d zero points' % pad)
                     trace = np.concatenate((trace, [0]*pad))
 
-                self.traces[self._numTraces][:] = trace
+                self.traces[self._numTraces][:] = self._encode(trace)
         except MemoryError:
             raise Warning("Failed to allocate/resize array for %d x %d, if you have sufficient memory it may be fragmented. Use smaller segments and retry." % (self.tracehint, self.traces.shape[1]))
             
@@ -151,7 +208,7 @@ class TraceContainer(Parameterized, Plugin):
         self.textouts.append(data)
         
     def getTrace(self, n):
-        data = self.traces[n]
+        data = self._decode(self.traces[n])
 
         #Following line will normalize all traces relative to each
         #other by mean & standard deviation
@@ -170,6 +227,28 @@ class TraceContainer(Parameterized, Plugin):
                 return self.keylist[n]
 
         return self.knownkey
+
+    def getTraces(self, start, end, pointRange=None):
+        """
+        Traces start to end-1 as a 2-D array. When float traces are mmap'd this is a view and nothing is read yet,
+        integer traces are read & scaled to float32.
+        """
+        if pointRange is None:
+            return self._decode(self.traces[start:end])
+        return self._decode(self.traces[start:end, pointRange[0]:pointRange[1]])
+
+    def getTextins(self, start, end):
+        return np.asarray(self.textins[start:end])
+
+    def getTextouts(self, start, end):
+        return np.asarray(self.textouts[start:end])
+
+    def getKnownKeys(self, start, end):
+        if hasattr(self, 'keylist'):
+            if self.keylist is not None:
+                return self.keylist[start:end]
+
+        return [self.knownkey] * (end - start)
     
     def getAuxDataConfig(self, newmodule):
         """
@@ -0,0 +1,174 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2013-2017, NewAE Technology Inc
+# All rights reserved.
+#
+# Find this and more at newae.com - this file is part of the chipwhisperer
+# project, http://www.assembla.com/spaces/chipwhisperer
+#
+#    This file is part of chipwhisperer.
+#
+#    chipwhisperer is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    chipwhisperer is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with chipwhisperer.  If not, see <http://www.gnu.org/licenses/>.
+#=================================================
+"""
+Lightweight capture profiling. Stages report into the module-level 'profiler' with named timers (total, min, max &
+a histogram of call times) and counters (e.g. bytes moved). Everything is kept both since the last reset() and
+since the last startSegment(), so each capture segment can be saved next to its trace config.
+
+    from chipwhisperer.common.utils import profiling
+
+    @profiling.timed("serial.write")
+    def write(self, data):
+        profiling.profiler.count("serial.bytesWritten", len(data))
+"""
+
+import bisect
+import csv
+import functools
+import json
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from timeit import default_timer
+
+
+class TimerStats(object):
+    """Call count, total/min/max time & histogram of one timer"""
+
+    #Upper edges (seconds) of the histogram bins, doubling from ~8us to ~8s, last bin is everything slower
+    binEdges = [2.0 ** e for e in range(-17, 4)]
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.histogram = [0] * (len(self.binEdges) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+        self.histogram[bisect.bisect_left(self.binEdges, seconds)] += 1
+
+    def asDict(self):
+        return OrderedDict([('count', self.count), ('total', self.total),
+                            ('mean', self.total / self.count if self.count else 0.0),
+                            ('min', self.min), ('max', self.max), ('histogram', list(self.histogram))])
+
+
+class Profiler(object):
+    """Named timers & counters, safe to report into from several threads"""
+
+    def __init__(self):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear everything"""
+        with self._lock:
+            self._timers = (OrderedDict(), OrderedDict())
+            self._counters = (OrderedDict(), OrderedDict())
+
+    def startSegment(self):
+        """Clear only the per-segment numbers, e.g. when a new capture segment starts"""
+        with self._lock:
+            self._timers[1].clear()
+            self._counters[1].clear()
+
+    def addTime(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            for timers in self._timers:
+                stats = timers.get(name)
+                if stats is None:
+                    stats = timers[name] = TimerStats()
+                stats.add(seconds)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            for counters in self._counters:
+                counters[name] = counters.get(name, 0) + n
+
+    @contextmanager
+    def timer(self, name):
+        """Time a block: with profiler.timer("name"): ..."""
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.addTime(name, default_timer() - start)
+
+    def report(self, segment=False):
+        """{'timers':{name:stats}, 'counters':{name:value}} since the last reset(), or startSegment() if segment"""
+        idx = 1 if segment else 0
+        with self._lock:
+            return OrderedDict([('timers', OrderedDict((k, v.asDict()) for k, v in self._timers[idx].items())),
+                                ('counters', OrderedDict(self._counters[idx]))])
+
+    def summary(self, segment=False):
+        """Report as a text table"""
+        rep = self.report(segment)
+        lines = ['%-28s %8s %10s %10s %10s' % ('timer', 'calls', 'total s', 'mean ms', 'max ms')]
+        for name, st in rep['timers'].items():
+            lines.append('%-28s %8d %10.3f %10.3f %10.3f' % (name, st['count'], st['total'], 1000 * st['mean'], 1000 * (st['max'] or 0)))
+        for name, value in rep['counters'].items():
+            lines.append('%-28s %8d' % (name, value))
+        return '\n'.join(lines)
+
+    def saveJSON(self, fname, segment=False):
+        rep = self.report(segment)
+        rep['binEdges'] = TimerStats.binEdges
+        with open(fname, 'w') as f:
+            json.dump(rep, f, indent=2)
+
+    def saveCSV(self, fname, segment=False):
+        """One row per timer & counter, histogram bins as the last columns"""
+        rep = self.report(segment)
+        with open(fname, 'wb') as f:
+            w = csv.writer(f)
+            w.writerow(['name', 'type', 'count', 'total', 'mean', 'min', 'max'] +
+                       ['<=%g' % e for e in TimerStats.binEdges] + ['>%g' % TimerStats.binEdges[-1]])
+            for name, st in rep['timers'].items():
+                w.writerow([name, 'timer', st['count'], st['total'], st['mean'], st['min'], st['max']] + st['histogram'])
+            for name, value in rep['counters'].items():
+                w.writerow([name, 'counter', value])
+
+
+#Everything reports here, CWCoreAPI.getProfiler() returns it
+profiler = Profiler()
+
+
+def timed(name):
+    """Decorator adding the time of each call to timer 'name' of the profiler"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            start = default_timer()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.addTime(name, default_timer() - start)
+        return wrapper
+    return decorator
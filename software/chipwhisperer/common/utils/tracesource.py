@@ -26,6 +26,7 @@
 #=================================================
 import logging
 import uuid
+import numpy as np
 from chipwhisperer.common.utils import util
 from chipwhisperer.common.utils.parameter import Parameterized, setupSetParam
 
@@ -72,6 +73,38 @@ class TraceSource(object):
         """Get known-key number n"""
         raise NotImplementedError
 
+    def getTraces(self, start, end, pointRange=None):
+        """
+        Return traces start to end-1 as one 2-D array (trace x point), optionally only the points
+        pointRange[0] to pointRange[1]-1. Raises ValueError if one of the traces is not available.
+        Sources which can do better than one getTrace() call per trace override this.
+        """
+        if pointRange is None:
+            pointRange = (0, None)
+
+        data = []
+        for n in range(start, end):
+            d = self.getTrace(n)
+            if d is None:
+                raise ValueError("Trace %d not available" % n)
+            data.append(d[pointRange[0]:pointRange[1]])
+
+        if len(data) == 0:
+            return np.zeros((0, 0))
+        return np.array(data)
+
+    def getTextins(self, start, end):
+        """Get text-in for traces start to end-1"""
+        return np.array([self.getTextin(n) for n in range(start, end)])
+
+    def getTextouts(self, start, end):
+        """Get text-out for traces start to end-1"""
+        return np.array([self.getTextout(n) for n in range(start, end)])
+
+    def getKnownKeys(self, start, end):
+        """Get known-key for traces start to end-1"""
+        return [self.getKnownKey(n) for n in range(start, end)]
+
     def getSegmentList(self):
         """Return a list of segments."""
         raise NotImplementedError
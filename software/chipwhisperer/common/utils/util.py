@@ -27,6 +27,7 @@ import ast
 import collections
 import os.path
 import shutil
+import time
 import weakref
 import numpy as np
 
@@ -308,6 +309,25 @@ class WeakMethod(object):
         return self.target is not None and self.target() is None
 
 
+class Backoff(object):
+    """
+    Sleep for polling loops which starts short & doubles up to a maximum, so hardware which is ready quickly is noticed
+    within a millisecond or two, while long waits don't flood the bus with status requests.
+    """
+
+    def __init__(self, first=0.001, longest=0.05):
+        self.first = first
+        self.longest = longest
+        self.delay = first
+
+    def reset(self):
+        self.delay = self.first
+
+    def sleep(self):
+        time.sleep(self.delay)
+        self.delay = min(self.delay * 2, self.longest)
+
+
 class Command:
     """Converts a method call with arguments to be ignored in a simple call with no/fixed arguments (replaces lambda)"""
     def __init__(self, callback, *args, **kwargs):
@@ -27,9 +27,12 @@ import usb.backend.libusb0 as libusb0
 import usb.core
 import usb.util
 import math
+from collections import OrderedDict
 from threading import Condition, Thread
 import array
 
+from chipwhisperer.common.utils.profiling import profiler
+
 import chipwhisperer.hardware.firmware.cwlite as fw_cwlite
 import chipwhisperer.hardware.firmware.cw1200 as fw_cw1200
 import chipwhisperer.hardware.firmware.cw305  as fw_cw305
@@ -83,6 +86,7 @@ class NAEUSB(object):
     fwversion_latest = [0, 11]
     def __init__(self):
         self._usbdev = None
+        self.streamStats = OrderedDict([('captures', 0), ('bytes', 0), ('timeouts', 0), ('overflows', 0), ('underruns', 0)])
 
     def get_possible_devices(self, idProduct):
         """
@@ -323,6 +327,13 @@ class NAEUSB(object):
         self.streamModeCaptureStream = NAEUSB.StreamModeCaptureThread(self, dlen, dbuf_temp, timeout_ms)
         self.streamModeCaptureStream.start()
 
+    def cmdReadStream_stats(self):
+        """
+        Counters over all stream mode captures: captures, bytes received, USB timeouts, FIFO overflows reported by the
+        hardware and underruns (transfer ended before all the requested samples arrived).
+        """
+        return OrderedDict(self.streamStats)
+
     def cmdReadStream_isDone(self):
         return self.streamModeCaptureStream.isAlive() == False
 
@@ -331,22 +342,41 @@ class NAEUSB(object):
         Gets data acquired in streaming mode.
         initStreamModeCapture should be called first in order to make it work.
         """
-        self.streamModeCaptureStream.join()
+        stream = self.streamModeCaptureStream
+        stream.join()
 
-        # Flush input buffers in case anything was left
-        try:
-            self.usbdev().read(self.rep, 4096, timeout=10)
-            self.usbdev().read(self.rep, 4096, timeout=10)
-            self.usbdev().read(self.rep, 4096, timeout=10)
-            self.usbdev().read(self.rep, 4096, timeout=10)
-        except IOError:
-            pass
+        # Flush input buffers only if something was left, the flush reads otherwise each wait for their timeout
+        samples_left, overflow_location, unknown_overflow = self.cmdReadStream_getStatus()
+        overflow = unknown_overflow or overflow_location != 0
+        if stream.timeout or overflow or samples_left:
+            try:
+                for i in range(4):
+                    if len(self.usbdev().read(self.rep, 4096, timeout=10)) < 4096:
+                        break
+            except IOError:
+                pass
+
+        # Sample bytes plus one sync byte per FPGA block
+        _, num_samplebytes = self.cmdReadStream_bufferSize(stream.dlen)
+        expected = num_samplebytes + int(math.ceil(float(num_samplebytes) / 4096))
+        self._countStream('captures')
+        self._countStream('bytes', stream.drx)
+        if stream.timeout:
+            self._countStream('timeouts')
+        if overflow:
+            self._countStream('overflows')
+        if stream.drx < expected:
+            self._countStream('underruns')
 
         # Ensure stream mode disabled
         self.sendCtrl(NAEUSB.CMD_MEMSTREAM, data=packuint32(0))
 
         return self.streamModeCaptureStream.drx, self.streamModeCaptureStream.timeout
 
+    def _countStream(self, name, n=1):
+        self.streamStats[name] += n
+        profiler.count("usb.stream." + name, n)
+
     def enterBootloader(self, forreal=False):
         """Erase the SAM3U contents, forcing bootloader mode. Does not screw around."""
 
@@ -386,8 +416,11 @@ class NAEUSB(object):
             logging.debug("Streaming: starting USB read")
             start = time.time()
             try:
+                # One transfer for the whole preallocated buffer: libusb splits it up & queues all the pieces at once,
+                # so the FIFO keeps draining even if this thread doesn't get scheduled for a while
                 self.drx = self.serial.usbdev().read(self.serial.rep, self.dbuf_temp, timeout=self.timeout_ms)
             except IOError as e:
+                self.timeout = True
                 logging.warning('Streaming: USB stream read timed out')
             diff = time.time() - start
             logging.debug("Streaming: Received %d bytes in time %.20f)" % (self.drx, diff))
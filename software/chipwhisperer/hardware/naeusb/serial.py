@@ -25,6 +25,7 @@
 
 import time
 from naeusb import packuint32
+from chipwhisperer.common.utils.util import Backoff
 
 class USART(object):
     """
@@ -51,6 +52,9 @@ class USART(object):
         self._stopbits = 1
         self._parity = "none"
 
+        #Bytes already pulled from the USB interface but not yet returned by read()
+        self._rxbuf = bytearray()
+
     def init(self, baud=115200, stopbits=1, parity="none"):
         """
         Open the serial port, set baud rate, parity, etc.
@@ -107,6 +111,7 @@ class USART(object):
 
         datasent = 0
 
+        # 58 bytes is the largest transfer the firmware takes, so this is already the fewest transfers possible
         while datasent < len(data):
             datatosend = len(data) - datasent
             datatosend = min(datatosend, 58)
@@ -117,48 +122,67 @@ class USART(object):
         """
         Flush all input buffers
         """
-        inwait = self.inWaiting()
+        self._rxbuf = bytearray()
+        inwait = self._hwWaiting()
         while(inwait):
-            self.read(inwait)
-            inwait = self.inWaiting()
+            self._pull(inwait)
+            self._rxbuf = bytearray()
+            inwait = self._hwWaiting()
 
     def inWaiting(self):
         """
         Get number of bytes waiting to be read.
         """
-        # print "Checking Waiting..."
-        data = self._usartRxCmd(self.USART_CMD_NUMWAIT, dlen=4)
-        # print data
-        return data[0]
+        return len(self._rxbuf) + self._hwWaiting()
 
     def read(self, dlen=0, timeout=0):
         """
         Read data from input buffer, if 'dlen' is 0 everything present is read. If timeout is non-zero
         system will block for a while until data is present in buffer.
-        """
 
-        waiting = self.inWaiting()
-
-        if dlen == 0:
-            dlen = waiting
+        Everything waiting in the USB interface is pulled in one transfer and kept for the next read, and the wait is
+        a deadline of timeout ms, polling quickly at first then backing off.
+        """
 
         if timeout == 0:
             timeout = self.timeout
 
-
-        resp = []
-
-        while dlen and timeout > 0:
-            if waiting > 0:
-                newdata = self._usb.usbdev().ctrl_transfer(0xC1, self.CMD_USART0_DATA, 0, 0, min(waiting, dlen), timeout=timeout)
-                resp.extend(newdata)
-                dlen -= len(newdata)
-            waiting = self.inWaiting()
-            timeout -= 1
-            time.sleep(0.001)
-
+        if dlen == 0:
+            waiting = self._hwWaiting()
+            if waiting:
+                self._pull(waiting)
+            dlen = len(self._rxbuf)
+
+        deadline = time.time() + timeout / 1000.0
+        backoff = Backoff(0.0002, 0.005)
+        while len(self._rxbuf) < dlen:
+            waiting = self._hwWaiting()
+            if waiting:
+                self._pull(waiting)
+                backoff.reset()
+            elif time.time() > deadline:
+                break
+            else:
+                backoff.sleep()
+
+        resp = list(self._rxbuf[:dlen])
+        del self._rxbuf[:dlen]
         return resp
 
+    def _hwWaiting(self):
+        """
+        Number of bytes waiting in the USB interface itself (internal function).
+        """
+        # print "Checking Waiting..."
+        data = self._usartRxCmd(self.USART_CMD_NUMWAIT, dlen=4)
+        # print data
+        return data[0]
+
+    def _pull(self, dlen):
+        """
+        Move dlen bytes from the USB interface to the host-side buffer (internal function).
+        """
+        self._rxbuf.extend(self._usb.usbdev().ctrl_transfer(0xC1, self.CMD_USART0_DATA, 0, 0, dlen, timeout=self.timeout))
 
     def _usartTxCmd(self, cmd, data=[]):
         """
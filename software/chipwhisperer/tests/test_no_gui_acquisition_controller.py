@@ -0,0 +1,229 @@
+import time
+import unittest
+
+import numpy as np
+
+from chipwhisperer.capture.api.acquisition_controller import AcquisitionController
+
+
+class FakeChannel(object):
+    """Hands out the same buffer for every trace, like the scope drivers do"""
+
+    def __init__(self):
+        self.trace = np.zeros(10)
+
+    def getTrace(self):
+        return self.trace
+
+    def getSampleRate(self):
+        return 1
+
+
+class FakeScope(object):
+
+    def __init__(self, fail=()):
+        self.channels = [FakeChannel()]
+        self.fail = set(fail)
+        self.captures = 0
+
+    def arm(self):
+        pass
+
+    def capture(self):
+        self.captures += 1
+        self.channels[0].trace[:] = self.captures
+        return self.captures in self.fail
+
+    def getAdcScaling(self):
+        return None
+
+
+class FakeTarget(object):
+
+    def __init__(self):
+        self.keyloads = 0
+        self.runs = []
+        self.key = None
+        self.input = None
+
+    def getName(self):
+        return "Fake"
+
+    def init(self):
+        pass
+
+    def reinit(self):
+        pass
+
+    def setModeEncrypt(self):
+        pass
+
+    def loadEncryptionKey(self, key):
+        self.keyloads += 1
+        self.key = key
+
+    def loadInput(self, inputtext):
+        self.input = inputtext
+
+    def go(self):
+        self.runs.append(self.input[0])
+
+    def isDone(self):
+        return True
+
+    def readOutput(self):
+        return self.input
+
+    def getExpected(self):
+        return None
+
+
+class FakePattern(object):
+    """Same key every time, text i starts with byte i"""
+
+    def __init__(self):
+        self.pairs = 0
+
+    def setTarget(self, target):
+        pass
+
+    def initPair(self, maxtraces):
+        pass
+
+    def newPair(self):
+        self.pairs += 1
+        text = bytearray(16)
+        text[0] = self.pairs
+        return bytearray(16), text
+
+
+class FakeWriter(object):
+    """Rejects the addTrace() calls numbered in reject with a ValueError, or fails with error. Takes delay s per trace."""
+
+    def __init__(self, reject=(), error=None, delay=0):
+        self.reject = set(reject)
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+        self.textins = []
+        self.traces = []
+
+    def prepareDisk(self):
+        pass
+
+    def setKnownKey(self, key):
+        pass
+
+    def addTrace(self, trace, textin, textout, key, channelNum=0):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        if self.calls in self.reject:
+            raise ValueError("Trace %d rejected" % self.calls)
+        self.textins.append(textin[0])
+        self.traces.append(trace[0])
+
+    def numTraces(self):
+        return 0
+
+
+def capture(writer, maxtraces=10, scope=None, target=None, **kwargs):
+    ac = AcquisitionController(scope or FakeScope(), target or FakeTarget(), writer, None, FakePattern(), **kwargs)
+    ac.setMaxtraces(maxtraces)
+    ac.doReadings()
+    return ac
+
+
+class TestTraceWriter(unittest.TestCase):
+
+    def test_synchronous(self):
+        """A trace the writer rejects is redone with the same pair"""
+        writer = FakeWriter(reject=(3, 7))
+        ac = capture(writer)
+        self.assertEqual(ac.skippedTraces, 0)
+        self.assertEqual(writer.textins, [1, 2, 3, 4, 5, 6, 7, 8])
+        self.assertEqual(writer.traces, [1, 2, 4, 5, 6, 8, 9, 10])
+
+    def test_writer_thread(self):
+        """With the writer thread rejected traces are counted & skipped, the scope buffer is copied when queued"""
+        #Slow writer, so the queue fills up & later captures overwrite the scope buffer
+        writer = FakeWriter(reject=(3, 7), delay=0.005)
+        ac = capture(writer, writeQueueSize=4)
+        self.assertEqual(ac.skippedTraces, 2)
+        self.assertEqual(writer.textins, [1, 2, 4, 5, 6, 8, 9, 10])
+        self.assertEqual(writer.traces, [1, 2, 4, 5, 6, 8, 9, 10])
+
+    def test_writer_error(self):
+        """Other writer errors stop the capture"""
+        self.assertRaises(IOError, capture, FakeWriter(error=IOError("Disk full")), 50, writeQueueSize=4)
+
+
+class ResetTarget(FakeTarget):
+    """Target that forgets its key & input when reinit() is called"""
+    reinitResetsState = True
+
+    def reinit(self):
+        self.key = None
+        self.input = None
+
+    def go(self):
+        if self.key is None or self.input is None:
+            raise AssertionError("Target run without a key or input")
+        FakeTarget.go(self)
+
+
+class TestPipelined(unittest.TestCase):
+
+    def distinctRuns(self, target):
+        """Texts the target ran, a retry of the same pair only counted once"""
+        runs = []
+        for r in target.runs:
+            if not runs or runs[-1] != r:
+                runs.append(r)
+        return runs
+
+    def test_pairs_in_order(self):
+        """Every pair is run in order, a failed capture is retried with the same pair"""
+        for kwargs in ({}, {'pipelined':True}, {'pipelined':True, 'overlapUpload':True}):
+            target = FakeTarget()
+            ac = capture(None, 30, FakeScope(fail=(5, 6, 20)), target, pairBatch=8, **kwargs)
+            self.assertEqual(self.distinctRuns(target), range(1, 31), kwargs)
+            self.assertEqual(len(target.runs), 33, kwargs)
+            self.assertEqual(ac.currentTrace, 30)
+
+    def test_key_loads(self):
+        """The unchanged key is only sent once when pipelined"""
+        target = FakeTarget()
+        capture(None, 30, FakeScope(), target)
+        self.assertEqual(target.keyloads, 30)
+
+        for kwargs in ({'pipelined':True}, {'pipelined':True, 'overlapUpload':True}):
+            target = FakeTarget()
+            capture(None, 30, FakeScope(), target, **kwargs)
+            self.assertEqual(target.keyloads, 1, kwargs)
+
+    def test_batch_within_maxtraces(self):
+        """Pairs are generated in batches, but never more than maxtraces of them"""
+        ac = AcquisitionController(FakeScope(), FakeTarget(), None, None, FakePattern(), pipelined=True, pairBatch=8)
+        ac.setMaxtraces(20)
+        ac.doReadings()
+        self.assertEqual(ac._pattern.pairs, 20)
+
+    def test_reinit_resets_state(self):
+        """Targets that lose their state on reinit() get the key & input again for every trace"""
+        target = ResetTarget()
+        ac = capture(None, 20, FakeScope(fail=(4,)), target, pipelined=True, overlapUpload=True)
+        self.assertFalse(ac._canPreload())
+        self.assertEqual(self.distinctRuns(target), range(1, 21))
+        self.assertEqual(target.keyloads, 21)
+
+    def test_timing_report(self):
+        ac = capture(FakeWriter(), 5, pipelined=True)
+        for stage in ('target load', 'arm', 'target run', 'capture', 'write'):
+            self.assertEqual(ac.stageTimes[stage][1], 5)
+            self.assertIn(stage, ac.timingReport())
+
+
+if __name__ == '__main__':
+    unittest.main()
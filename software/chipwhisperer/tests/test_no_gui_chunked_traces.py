@@ -0,0 +1,75 @@
+import copy
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from chipwhisperer.common.traces.TraceContainerChunked import TraceContainerChunked, packChunk, unpackChunk
+
+
+class TestChunkedTraces(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.rng = np.random.RandomState(0)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def capture(self, compression, storage, numTraces, knownkey):
+        """Write numTraces random traces to a new chunked container, returns (config file, traces, textins)"""
+        proto = TraceContainerChunked()
+        proto.setChunkSize(100)
+        proto.setCompression(compression)
+        proto.setStorageType(storage)
+        tc = copy.copy(proto)
+        tc.clear()
+        prefix = "%s_%s_" % (compression, storage)
+        cfgfile = "%s/config_%s.cfg" % (self.dir, prefix)
+        tc.config.setConfigFilename(cfgfile)
+        tc.config.setAttr("prefix", prefix)
+        tc.prepareDisk()
+        tc.setTraceScaling(1 / 1024., -0.5)
+
+        traces = self.rng.randint(0, 1024, (numTraces, 50)) / 1024. - 0.5
+        textins = self.rng.randint(0, 256, (numTraces, 16))
+        for i in range(numTraces):
+            if knownkey is not None:
+                tc.setKnownKey(knownkey)
+            tc.addTrace(traces[i], list(textins[i]), list(textins[i] ^ 0xff), range(16))
+        tc.closeAll(clearTrace=False)
+        return cfgfile, traces, textins
+
+    def reload(self, cfgfile):
+        tc = TraceContainerChunked()
+        tc.config.loadTrace(cfgfile)
+        tc.loadAllTraces()
+        return tc
+
+    def test_pack_roundtrip(self):
+        codes = self.rng.randint(0, 1024, (37, 500)).astype(np.int16)
+        self.assertTrue(np.array_equal(unpackChunk(packChunk(codes), codes.shape, np.int16), codes))
+        floats = self.rng.randn(5, 7).astype(np.float32)
+        self.assertTrue(np.array_equal(unpackChunk(packChunk(floats), floats.shape, np.float32), floats))
+
+    def test_roundtrip(self):
+        for compression, storage in (('none', 'float64'), ('zlib', 'int16'), ('none', 'int16')):
+            cfgfile, traces, textins = self.capture(compression, storage, 345, range(16))
+            tc = self.reload(cfgfile)
+            self.assertEqual(tc.numTraces(), 345)
+            self.assertTrue(np.allclose(tc.getTraces(0, 345), traces))
+            self.assertTrue(np.allclose(tc.getTraces(90, 310, (5, 20)), traces[90:310, 5:20]))
+            self.assertTrue(np.array_equal(tc.getTextins(0, 345), textins))
+            self.assertEqual(list(tc.knownkey), range(16))
+
+    def test_no_known_key(self):
+        cfgfile, traces, _ = self.capture('zlib', 'float64', 150, None)
+        tc = self.reload(cfgfile)
+        self.assertIsNone(tc.knownkey)
+        self.assertTrue(np.allclose(tc.getTraces(0, 150), traces))
+        self.assertEqual(list(tc.getKnownKey(0)), range(16))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import itertools
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from chipwhisperer.analyzer.attacks.cpa_algorithms.progressive import CPAProgressive
+from chipwhisperer.analyzer.attacks.models.AES128_8bit import AES128_8bit
+from chipwhisperer.analyzer.attacks.models.aes.funcs import sbox
+from chipwhisperer.analyzer.preprocessing.Normalize import Normalize
+from chipwhisperer.common.api.TraceManager import TraceManager
+from chipwhisperer.common.traces.TraceContainerNative import TraceContainerNative
+
+_names = itertools.count()
+_HW = np.array([bin(i).count('1') for i in range(256)])
+_SBOX = np.array([sbox(i) for i in range(256)])
+
+
+def segment(directory, seed, key, numTraces=200, numPoints=8):
+    """Segment saved in directory, where point 3 leaks HW(sbox(pt ^ key)) of every byte"""
+    rng = np.random.RandomState(seed)
+    tc = TraceContainerNative()
+    tc.config.setConfigFilename(os.path.join(directory, "config_segment_%d_.cfg" % seed))
+    tc.config.setAttr("prefix", "segment_%d_" % seed)
+    tc.config.setAttr("date", "2017-01-01 00:00:%02d" % seed)
+    tc.prepareDisk()
+    tc.setKnownKey(list(key))
+    for _ in range(numTraces):
+        pt = rng.randint(0, 256, 16)
+        trace = rng.normal(0, 1, numPoints)
+        trace[3] += np.sum(_HW[_SBOX[pt ^ key]])
+        tc.addTrace(trace, list(pt), list(pt), list(key))
+    tc.closeAll(clearTrace=False)
+    tc.enabled = True
+    return tc
+
+
+def manager(*segments):
+    tm = TraceManager(name="Checkpoint Test %d" % next(_names))
+    for s in segments:
+        tm.appendSegment(s, s.enabled)
+    tm._updateRanges()
+    return tm
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.dir, "attack-checkpoint-0.npz")
+        self.keyA = np.arange(16) * 7 + 1
+        self.keyB = np.arange(16) * 13 + 5
+
+    def segment(self, seed, key):
+        return segment(self.dir, seed, key)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def attack(self, traceSource, checkpoint=True, bitmask=0xFF):
+        a = CPAProgressive()
+        a.setModel(AES128_8bit(bitmask=bitmask))
+        a.setTargetSubkeys(range(16))
+        a.setReportingInterval(50)
+        if checkpoint:
+            a.setCheckpointFile(self.fname)
+        a.addTraces(traceSource, (0, traceSource.numTraces() - 1), None, (0, traceSource.numPoints()))
+        return a
+
+    def resumesAfter(self, traceSource, bitmask=0xFF):
+        """Number of traces loadCheckpoint() would skip for an attack on traceSource, None if it starts over"""
+        a = CPAProgressive()
+        a.setModel(AES128_8bit(bitmask=bitmask))
+        a.setTargetSubkeys(range(16))
+        a.setCheckpointFile(self.fname)
+        checkpoint = a.loadCheckpoint(traceSource, (0, traceSource.numTraces() - 1), (0, traceSource.numPoints()))
+        return None if checkpoint is None else checkpoint[0]
+
+    def assertSameResults(self, a, b):
+        for bnum in range(16):
+            self.assertTrue(np.allclose(a.getStatistics().diffs[bnum], b.getStatistics().diffs[bnum]))
+
+    def test_resume(self):
+        tm = manager(self.segment(1, self.keyA))
+        first = self.attack(tm)
+        self.assertEqual(self.resumesAfter(tm), 200)
+
+        self.assertSameResults(self.attack(tm), first)
+
+    def test_append(self):
+        seg1, seg2 = self.segment(1, self.keyA), self.segment(2, self.keyA)
+        self.attack(manager(seg1))
+
+        tm = manager(seg1, seg2)
+        self.assertEqual(self.resumesAfter(tm), 200)
+        self.assertSameResults(self.attack(tm), self.attack(tm, checkpoint=False))
+
+    def test_reject_other_traces(self):
+        self.attack(manager(self.segment(1, self.keyA)))
+        tm = manager(self.segment(3, self.keyB))
+        self.assertIsNone(self.resumesAfter(tm))
+        self.assertSameResults(self.attack(tm), self.attack(tm, checkpoint=False))
+
+    def test_reject_changed_segments(self):
+        seg1, seg2 = self.segment(1, self.keyA), self.segment(2, self.keyA)
+        self.attack(manager(seg1, seg2))
+        #Segment removed, or a different one in front of the same traces
+        self.assertIsNone(self.resumesAfter(manager(seg2)))
+        self.assertIsNone(self.resumesAfter(manager(self.segment(4, self.keyA), seg1, seg2)))
+        seg1.enabled = False
+        self.assertIsNone(self.resumesAfter(manager(seg1, seg2)))
+
+    def test_reject_model_change(self):
+        tm = manager(self.segment(1, self.keyA))
+        self.attack(tm)
+        self.assertIsNone(self.resumesAfter(tm, bitmask=0x01))
+
+    def test_reject_preprocessing_change(self):
+        tm = manager(self.segment(1, self.keyA))
+        self.attack(tm)
+
+        norm = Normalize(tm, name="Checkpoint Normalize %d" % next(_names))
+        norm.enabled = True
+        self.assertIsNone(self.resumesAfter(norm))
+        self.attack(norm)
+        self.assertEqual(self.resumesAfter(norm), 200)
+        norm.enabled = False
+        self.assertIsNone(self.resumesAfter(norm))
+
+
+if __name__ == '__main__':
+    unittest.main()
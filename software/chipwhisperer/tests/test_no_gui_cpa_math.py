@@ -0,0 +1,202 @@
+import itertools
+import unittest
+
+import numpy as np
+
+from chipwhisperer.analyzer.attacks._moments import CoMoments
+from chipwhisperer.analyzer.attacks._parallel import subkeyTiles
+from chipwhisperer.analyzer.attacks.cpa_algorithms import progressive_caccel
+from chipwhisperer.analyzer.attacks.cpa_algorithms.progressive import CPAProgressive
+from chipwhisperer.analyzer.attacks.models.AES128_8bit import AES128_8bit, enc_list, dec_list, PtKey_XOR, SBox_output
+from chipwhisperer.analyzer.attacks.models.base import ModelsBase
+from chipwhisperer.common.utils.tracesource import TraceSource
+
+_names = itertools.count()
+
+
+class AttackSource(TraceSource):
+    """Random traces & plaintexts with a fixed key"""
+
+    def __init__(self, numTraces, numPoints):
+        TraceSource.__init__(self, "CPA Math Source %d" % next(_names))
+        rng = np.random.RandomState(7)
+        self.traces = rng.normal(0, 1, (numTraces, numPoints))
+        self.textins = rng.randint(0, 256, (numTraces, 16))
+        self.textouts = rng.randint(0, 256, (numTraces, 16))
+        self.key = range(16)
+
+    def getTrace(self, n):
+        return self.traces[n]
+
+    def getTextin(self, n):
+        return self.textins[n]
+
+    def getTextout(self, n):
+        return self.textouts[n]
+
+    def getKnownKey(self, n=None):
+        return self.key
+
+    def numTraces(self):
+        return len(self.traces)
+
+    def numPoints(self):
+        return self.traces.shape[1]
+
+
+def attack(cls, source, model, pointRange, brange=range(16), workers=1):
+    a = cls()
+    a.setModel(model)
+    a.setTargetSubkeys(brange)
+    a.setReportingInterval(300)
+    a.setWorkers(workers)
+    a.addTraces(source, (0, source.numTraces() - 1), None, pointRange)
+    return a
+
+
+def reference(source, model, bnum, pointRange):
+    """Correlation of every key guess with every point, over all the traces in one go"""
+    hyp = model.leakage_batch(source.textins, source.textouts, bnum, [source.key] * source.numTraces())
+    traces = source.traces[:, pointRange[0]:pointRange[1]]
+    return np.corrcoef(hyp.T, traces.T)[:hyp.shape[1], hyp.shape[1]:]
+
+
+class TestProgressive(unittest.TestCase):
+
+    def test_against_correlation(self):
+        """Adding the traces a reporting interval at a time ends at the correlation over all of them"""
+        source = AttackSource(1000, 40)
+        model = AES128_8bit()
+        a = attack(CPAProgressive, source, model, (5, 35))
+        for bnum in range(16):
+            self.assertTrue(np.allclose(a.getStatistics().diffs[bnum], reference(source, model, bnum, (5, 35))))
+            self.assertEqual(a.getStatistics().diffs_tnum[bnum], 1000)
+
+
+class TestLeakageBatch(unittest.TestCase):
+
+    def test_against_scalar(self):
+        """Vectorized leakage of every AES model matches the per-trace, per-guess leakage()"""
+        rng = np.random.RandomState(1)
+        pts = rng.randint(0, 256, (8, 16)).astype(np.uint8)
+        cts = rng.randint(0, 256, (8, 16)).astype(np.uint8)
+        keys = list(rng.randint(0, 256, (8, 16)).astype(np.uint8))
+        for cls in enc_list + dec_list:
+            for bitmask in (0xff, 0x01):
+                model = AES128_8bit(cls, bitmask=bitmask)
+                for bnum in (0, 15):
+                    batch = model.leakage_batch(pts, cts, bnum, keys)
+                    scalar = ModelsBase.leakage_batch(model, pts, cts, bnum, keys)
+                    self.assertEqual(batch.shape, (8, 256))
+                    self.assertTrue(np.array_equal(batch, scalar), "%s, bnum %d, bitmask %02x" % (cls.__name__, bnum, bitmask))
+
+
+class TestWorkers(unittest.TestCase):
+    """Spreading the subkeys over worker processes must not change the results"""
+
+    def assertSameDiffs(self, a, b, brange):
+        for bnum in brange:
+            self.assertTrue(np.allclose(a.getStatistics().diffs[bnum], b.getStatistics().diffs[bnum]))
+            self.assertEqual(a.getStatistics().diffs_tnum[bnum], b.getStatistics().diffs_tnum[bnum])
+
+    def test_tiles(self):
+        ranges = {0:(0, 10), 3:(5, 6)}
+        tiles = subkeyTiles([0, 3], ranges, 5)
+        self.assertEqual([t for t in tiles if t[0] == 0], [(0, (0, 3)), (0, (3, 6)), (0, (6, 10))])
+        self.assertEqual([t for t in tiles if t[0] == 3], [(3, (5, 6))])
+
+    def test_against_serial(self):
+        source = AttackSource(700, 40)
+        model = AES128_8bit()
+        a = CPAProgressive()
+        a.setModel(model)
+        a.setWorkers(3)
+        pool = a.createSubkeyPool(source, (0, 699), 300)
+        self.assertIsNotNone(pool)
+        pool.close()
+
+        for brange in (range(16), [2, 9]):
+            self.assertSameDiffs(attack(CPAProgressive, source, model, (5, 35), brange, workers=3),
+                                 attack(CPAProgressive, source, model, (5, 35), brange), brange)
+
+        #Different point range for each subkey
+        pointRange = [(i, 20 + i) for i in range(16)]
+        self.assertSameDiffs(attack(CPAProgressive, source, model, pointRange, workers=3),
+                             attack(CPAProgressive, source, model, pointRange), range(16))
+
+
+class TestCoMoments(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(3)
+        self.hyp = rng.randint(0, 9, (1000, 4))
+        #Large offset, the raw sums would lose most of their precision
+        self.traces = rng.randn(1000, 3) + 1E7
+
+    def reference(self):
+        """Correlation of every hypothesis column with every trace point, one at a time"""
+        return np.array([[np.corrcoef(self.hyp[:, g], self.traces[:, p])[0, 1] for p in range(self.traces.shape[1])]
+                         for g in range(self.hyp.shape[1])])
+
+    def test_one_block(self):
+        self.assertTrue(np.allclose(CoMoments.fromBlock(self.hyp, self.traces).correlation(), self.reference()))
+
+    def test_merge(self):
+        acc = CoMoments()
+        for i in range(0, 1000, 137):
+            acc.merge(CoMoments.fromBlock(self.hyp[i:i + 137], self.traces[i:i + 137]))
+        full = CoMoments.fromBlock(self.hyp, self.traces)
+        self.assertEqual(acc.n, 1000)
+        self.assertTrue(np.allclose(acc.correlation(), self.reference()))
+        self.assertTrue(np.allclose(acc.m2t, full.m2t))
+        self.assertTrue(np.allclose(acc.cht, full.cht))
+
+    def test_from_sums(self):
+        t = self.traces - 1E7
+        m = CoMoments.fromSums(len(t), np.sum(self.hyp, axis=0), np.sum(np.square(self.hyp), axis=0), np.sum(t, axis=0),
+                               np.sum(np.square(t), axis=0), np.dot(self.hyp.T, t), toffset=1E7)
+        self.assertTrue(np.allclose(m.correlation(), self.reference()))
+        self.assertTrue(np.allclose(m.meant, np.mean(self.traces, axis=0)))
+
+    def test_concat_points(self):
+        parts = [CoMoments.fromBlock(self.hyp, self.traces[:, :1]), CoMoments.fromBlock(self.hyp, self.traces[:, 1:])]
+        self.assertTrue(np.allclose(CoMoments.concatPoints(parts).correlation(), self.reference()))
+
+
+class TestCAccel(unittest.TestCase):
+    """The C accelerated attack must give the same results as the Python one"""
+
+    def setUp(self):
+        try:
+            progressive_caccel.CPAProgressiveOneSubkey()
+        except Exception, e:
+            self.skipTest(str(e))
+        self.source = AttackSource(700, 40)
+
+    def assertMatches(self, model, pointRange, workers=1):
+        a = attack(progressive_caccel.CPAProgressive_CAccel, self.source, model, pointRange, workers=workers)
+        b = attack(CPAProgressive, self.source, model, pointRange)
+        for bnum in range(16):
+            self.assertTrue(np.allclose(a.getStatistics().diffs[bnum], b.getStatistics().diffs[bnum]))
+
+    def test_models(self):
+        for cls in (SBox_output, PtKey_XOR):
+            self.assertMatches(AES128_8bit(cls), (5, 35))
+            self.assertMatches(AES128_8bit(cls), (5, 35), workers=3)
+        self.assertMatches(AES128_8bit(), [(i, 20 + i) for i in range(16)], workers=2)
+
+    def test_prebuilt_models(self):
+        """Libraries without hypothesisSums() fall back to the AES models built into the C code"""
+        init = progressive_caccel.CPAProgressiveOneSubkey.__init__
+        def oldLibrary(self):
+            init(self)
+            self.hsums = None
+        progressive_caccel.CPAProgressiveOneSubkey.__init__ = oldLibrary
+        try:
+            self.assertMatches(AES128_8bit(SBox_output), (5, 35))
+        finally:
+            progressive_caccel.CPAProgressiveOneSubkey.__init__ = init
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import itertools
+import unittest
+
+import numpy as np
+
+from chipwhisperer.analyzer.attacks.cpa_algorithms.simpleloop import CPASimpleLoop
+from chipwhisperer.analyzer.attacks.cpa_algorithms.bayesian import AttackCPA_Bayesian
+from chipwhisperer.analyzer.attacks.models.AES128_8bit import AES128_8bit
+from chipwhisperer.common.utils.tracesource import TraceSource
+
+_names = itertools.count()
+
+
+class AttackSource(TraceSource):
+    """Random traces & plaintexts with a fixed key, the leakage doesn't matter for comparing results"""
+
+    def __init__(self, numTraces, numPoints):
+        TraceSource.__init__(self, "Streaming Source %d" % next(_names))
+        rng = np.random.RandomState(5)
+        self.traces = rng.normal(0, 1, (numTraces, numPoints))
+        self.textins = rng.randint(0, 256, (numTraces, 16))
+        self.key = range(16)
+
+    def getTrace(self, n):
+        return self.traces[n]
+
+    def getTextin(self, n):
+        return self.textins[n]
+
+    def getTextout(self, n):
+        return self.textins[n]
+
+    def getKnownKey(self, n=None):
+        return self.key
+
+    def numTraces(self):
+        return len(self.traces)
+
+    def numPoints(self):
+        return self.traces.shape[1]
+
+
+class TestStreamingAttacks(unittest.TestCase):
+    """The simple loop & Bayesian attacks read the traces in blocks, results must match one pass over all of them"""
+
+    def setUp(self):
+        #With 16MB the traces are read in blocks of a few hundred
+        self.source = AttackSource(1000, 1000)
+        self.brange = [0, 5]
+
+    def attack(self, cls):
+        a = cls()
+        a.setModel(AES128_8bit())
+        a.setTargetSubkeys(self.brange)
+        a.setMemoryBudget(16)
+        a.addTraces(self.source, (0, self.source.numTraces() - 1), None, (0, self.source.numPoints()))
+        return a
+
+    def reference(self, model, bnum):
+        hyp = model.leakage_batch(self.source.textins, self.source.textins, bnum, [self.source.key] * self.source.numTraces())
+        return np.corrcoef(hyp.T, self.source.traces.T)[:hyp.shape[1], hyp.shape[1]:]
+
+    def test_memory_budget_param(self):
+        a = CPASimpleLoop()
+        a.setMemoryBudget(64)
+        self.assertEqual(a.getMemoryBudget(), 64)
+        self.assertEqual(a.findParam('Memory Budget (MB)').getValue(), 64)
+
+    def test_simple_loop(self):
+        a = self.attack(CPASimpleLoop)
+        for bnum in self.brange:
+            self.assertTrue(np.allclose(a.getStatistics().diffs[bnum], self.reference(a.model, bnum)))
+
+    def test_bayesian(self):
+        a = self.attack(AttackCPA_Bayesian)
+        q = self.source.numTraces()
+        for bnum in self.brange:
+            logp = -q * (0.5 * np.log(2.0 * q * (1.0 - self.reference(a.model, bnum))) - np.log(q))
+            peak = np.max(logp, axis=0)
+            logp -= np.log(np.sum(np.exp(logp - peak), axis=0)) + peak
+            self.assertTrue(np.allclose(a.all_diffs[bnum], logp))
+            self.assertTrue(np.allclose(np.sum(a.getDiff(bnum), axis=0), 1.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
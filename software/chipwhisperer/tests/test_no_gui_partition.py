@@ -0,0 +1,139 @@
+import itertools
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from chipwhisperer.analyzer.utils.Partition import Partition, PartitionStats, partitionLabels, PartitionHDLastRound, \
+    PartitionHWIntermediate, PartitionEncKey, PartitionRandvsFixed, PartitionRandDebug
+from chipwhisperer.common.api.TraceManager import TraceManager
+from chipwhisperer.common.traces.TraceContainerNative import TraceContainerNative
+
+_names = itertools.count()
+
+
+def segment(directory, seed, numTraces):
+    """Segment saved in directory with two different keys, and the fixed TVLA plaintext in every third trace"""
+    rng = np.random.RandomState(seed)
+    tc = TraceContainerNative()
+    tc.config.setConfigFilename(os.path.join(directory, "config_segment_%d_.cfg" % seed))
+    tc.config.setAttr("prefix", "segment_%d_" % seed)
+    tc.prepareDisk()
+    keys = rng.randint(0, 256, (2, 16))
+    tc.setKnownKey(list(keys[0]))
+    for i in range(numTraces):
+        pt = rng.randint(0, 256, 16)
+        if i % 3 == 0:
+            pt = np.array(PartitionRandvsFixed.fixedText[16])
+        tc.addTrace(rng.normal(0, 1, 4), list(pt), list(rng.randint(0, 256, 16)), list(keys[i % 2]))
+    tc.closeAll(clearTrace=False)
+    return tc
+
+
+class TestPartitionStats(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(2)
+        #Offset so sums of squares without the block shift would lose precision
+        self.traces = rng.normal(0, 1, (500, 6)) + 1E5
+        self.labels = rng.randint(0, 9, (500, 3))
+        #Partition 8 of subkey 2 only gets one trace, partition 7 none
+        self.labels[:, 2] = np.where(self.labels[:, 2] >= 7, 0, self.labels[:, 2])
+        self.labels[123, 2] = 8
+
+    def test_against_direct(self):
+        ps = PartitionStats(3, 9, 6)
+        for i in range(0, 500, 64):
+            ps.addBlock(self.traces[i:i + 64], self.labels[i:i + 64])
+        stats = ps.stats()
+
+        for bnum in range(3):
+            for part in range(9):
+                t = self.traces[self.labels[:, bnum] == part]
+                self.assertEqual(stats["number"][bnum, part], len(t))
+                if len(t) == 0:
+                    self.assertTrue(np.all(stats["mean"][bnum, part] == 0))
+                    continue
+                self.assertTrue(np.allclose(stats["mean"][bnum, part], np.mean(t, axis=0), rtol=0, atol=1E-8))
+                if len(t) > 1:
+                    self.assertTrue(np.allclose(stats["variance"][bnum, part], np.var(t, axis=0, ddof=1)))
+                else:
+                    self.assertTrue(np.allclose(stats["variance"][bnum, part], 0))
+
+    def test_unlabelled(self):
+        """Traces labelled -1 are in no partition"""
+        labels = self.labels.copy()
+        labels[:100] = -1
+        ps = PartitionStats(3, 9, 6)
+        ps.addBlock(self.traces, labels)
+        self.assertEqual(ps.number.sum(), 400 * 3)
+
+
+class TestPartitionLabels(unittest.TestCase):
+
+    def test_array(self):
+        labels = np.arange(12, dtype=np.uint8).reshape(4, 3)
+        self.assertIs(partitionLabels(labels, 4), labels)
+
+    def test_lists(self):
+        """Older nested lists of trace numbers per subkey & partition"""
+        partdata = [[[10, 12], [11], []], [[], [13], [10, 11, 14]]]
+        labels = partitionLabels(partdata, 4, start=10)
+        self.assertEqual(labels.tolist(), [[0, 2], [1, 2], [0, -1], [-1, 1]])
+
+        #As saved with np.save() & loaded back
+        objdata = np.empty(2, dtype=object)
+        objdata[0], objdata[1] = partdata
+        self.assertTrue(np.array_equal(partitionLabels(objdata, 4, start=10), labels))
+
+
+class TestPartitionNums(unittest.TestCase):
+    """Labelling a block of traces at once must give the same partitions as one trace at a time"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.segments = [segment(self.dir, 1, 40), segment(self.dir, 2, 30)]
+        self.tm = TraceManager(name="Partition Test %d" % next(_names))
+        for s in self.segments:
+            self.tm.appendSegment(s)
+        self.tm._updateRanges()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def single(self, method, start, end):
+        rows = []
+        for tnum in range(start, end):
+            t = self.tm.getSegment(tnum)
+            rows.append(method.getPartitionNum(t, tnum - t.mappedRange[0]))
+        return np.array(rows)
+
+    def test_methods(self):
+        t = self.tm.getSegment(0)
+        for cls in (PartitionHDLastRound, PartitionHWIntermediate, PartitionEncKey, PartitionRandvsFixed):
+            method = cls()
+            labels = method.getPartitionNums(t, 5, 25)
+            self.assertTrue(np.array_equal(labels, self.single(method, 5, 25)), cls.__name__)
+            self.assertTrue(np.all(labels < method.getNumPartitions()))
+        self.assertEqual(list(PartitionRandvsFixed().getPartitionNums(t, 0, 4)[:, 0]), [1, 0, 0, 1])
+
+        labels = PartitionRandDebug().getPartitionNums(t, 5, 25)
+        self.assertEqual(labels.shape, (20, 1))
+        self.assertTrue(np.all(labels < PartitionRandDebug.numRand))
+
+    def test_generate(self):
+        """Row i is trace tRange[0]+i, across segments, and the same when loaded back from the saved files"""
+        part = Partition()
+        part.setTraceSource(self.tm)
+        labels = part.generatePartitions(PartitionHWIntermediate, saveFile=True, tRange=(25, 60))
+        self.assertTrue(np.array_equal(labels, self.single(PartitionHWIntermediate(), 25, 60)))
+
+        self.assertTrue(np.array_equal(part.generatePartitions(loadFile=True, tRange=(25, 60)), labels))
+        self.assertTrue(np.array_equal(part.generatePartitions(loadFile=True, tRange=(30, -1)),
+                                       self.single(PartitionHWIntermediate(), 30, 70)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import itertools
+import unittest
+
+import numpy as np
+import scipy.stats
+
+from chipwhisperer.analyzer.attacks.models.AES128_8bit import SBox_output
+from chipwhisperer.analyzer.utils.partitiontools import HWAES
+from chipwhisperer.analyzer.utils.populations import GroupMoments, partition_traces, streaming_ttest, wttest
+from chipwhisperer.common.utils.tracesource import TraceSource
+
+_names = itertools.count()
+
+
+class TextSource(TraceSource):
+    """Random traces & plaintexts with a fixed key"""
+
+    def __init__(self, numTraces, numPoints):
+        TraceSource.__init__(self, "Populations Source %d" % next(_names))
+        rng = np.random.RandomState(4)
+        self.traces = rng.normal(0, 1, (numTraces, numPoints))
+        self.textins = rng.randint(0, 256, (numTraces, 16))
+        self.key = range(16)
+
+    def getTrace(self, n):
+        return self.traces[n]
+
+    def getTextin(self, n):
+        return self.textins[n]
+
+    def getTextout(self, n):
+        return self.textins[n]
+
+    def getKnownKey(self, n=None):
+        return self.key
+
+    def numTraces(self):
+        return len(self.traces)
+
+    def numPoints(self):
+        return self.traces.shape[1]
+
+
+class TestGroupMoments(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        #Skewed & offset traces, group 1 has a different variance
+        self.traces = rng.exponential(1.0, (900, 5)) + 1E3
+        self.groups = rng.randint(0, 3, 900)
+        self.traces[self.groups == 1] *= 1.5
+        self.groups[:10] = -1
+
+    def moments(self, order=3, block=128):
+        gm = GroupMoments(3, 5, order)
+        for i in range(0, len(self.traces), block):
+            gm.add_block(self.traces[i:i + block], self.groups[i:i + block])
+        return gm
+
+    def group(self, g):
+        return self.traces[self.groups == g]
+
+    def test_against_direct(self):
+        gm = self.moments()
+        for g in range(3):
+            x = self.group(g)
+            self.assertEqual(gm.n[g], len(x))
+            self.assertTrue(np.allclose(gm.mean[g], np.mean(x, axis=0)))
+            for k in range(2, 7):
+                self.assertTrue(np.allclose(gm.cs[k, g], np.sum((x - np.mean(x, axis=0)) ** k, axis=0)), "moment %d" % k)
+
+    def test_merge(self):
+        half = 450
+        a = GroupMoments(3, 5, 3)
+        a.add_block(self.traces[:half], self.groups[:half])
+        b = GroupMoments(3, 5, 3)
+        b.add_block(self.traces[half:], self.groups[half:])
+        a.merge(b)
+        full = self.moments(block=900)
+        self.assertTrue(np.array_equal(a.n, full.n))
+        self.assertTrue(np.allclose(a.mean, full.mean))
+        self.assertTrue(np.allclose(a.cs, full.cs))
+
+    def test_ttest(self):
+        gm = self.moments()
+        x0, x1 = self.group(0), self.group(1)
+        self.assertTrue(np.allclose(gm.ttest(1), wttest([x0, x1])))
+
+        centered = [np.square(x - np.mean(x, axis=0)) for x in (x0, x1)]
+        self.assertTrue(np.allclose(gm.ttest(2), wttest(centered)))
+
+        standardized = [((x - np.mean(x, axis=0)) / np.std(x, axis=0)) ** 3 for x in (x0, x1)]
+        self.assertTrue(np.allclose(gm.ttest(3), wttest(standardized)))
+
+        self.assertRaises(ValueError, gm.ttest, 4)
+
+    def test_chi2test(self):
+        gm = GroupMoments(2, 5, 2)
+        gm.add_block(self.traces, np.where(self.groups == 2, 0, self.groups))
+        chi2, p = gm.chi2test(1)
+        self.assertTrue(np.allclose(chi2, gm.ttest(1) ** 2))
+        self.assertTrue(np.allclose(p, scipy.stats.chi2.sf(chi2, 1)))
+
+        #Group 1 differs in mean for every point, groups 0 & 2 are the same
+        chi2, p = self.moments().chi2test(1)
+        self.assertTrue(np.all(p < 1E-6))
+
+
+class TestStreamingTTest(unittest.TestCase):
+
+    def test_against_partition_traces(self):
+        source = TextSource(700, 6)
+        groups = partition_traces(source, HWAES(source, 3, SBox_output, 0x01), end_trace=600)
+        gm = streaming_ttest(source, HWAES(source, 3, SBox_output, 0x01), end_trace=600, order=2, block_size=128)
+        self.assertTrue(np.array_equal(gm.n, [len(g) for g in groups]))
+        self.assertTrue(np.allclose(gm.ttest(1), wttest(groups)))
+
+        #Adding the rest of the traces to the same state
+        gm = streaming_ttest(source, HWAES(source, 3, SBox_output, 0x01), start_trace=600, block_size=128, moments=gm)
+        groups = partition_traces(source, HWAES(source, 3, SBox_output, 0x01))
+        self.assertTrue(np.allclose(gm.ttest(1), wttest(groups)))
+
+    def test_key_guess(self):
+        source = TextSource(300, 6)
+        ptool = HWAES(source, 5, SBox_output)
+        self.assertEqual(list(ptool.get_partitions(0, 300, key_guess=0x2b)),
+                         [ptool.get_partition(i, key_guess=0x2b) for i in range(300)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import itertools
+import random
+import unittest
+
+import numpy as np
+
+from chipwhisperer.common.results.base import ResultsBase
+from chipwhisperer.common.utils.tracesource import TraceSource
+from chipwhisperer.analyzer.preprocessing.resync_sad import ResyncSAD
+from chipwhisperer.analyzer.preprocessing.resync_cross_correlation import ResyncCrossCorrelation
+from chipwhisperer.analyzer.preprocessing.digital_filter import Filter
+from chipwhisperer.analyzer.preprocessing.decimation_fixed import DecimationFixed
+from chipwhisperer.analyzer.preprocessing.Normalize import Normalize, NormMeanStd
+from chipwhisperer.analyzer.preprocessing.add_noise_random import AddNoiseRandom
+from chipwhisperer.analyzer.preprocessing.add_noise_jitter import AddNoiseJitter, roll_zeropad
+from chipwhisperer.analyzer.preprocessing._align import shiftTraces
+
+_names = itertools.count()
+
+#No GUI, so no trace plot for the window parameters to draw on
+ResultsBase.registeredObjects.setdefault("Trace Output Plot", None)
+
+
+class ArraySource(TraceSource):
+    """Traces from an array, without the block getTraces() override so modules see per-trace reads only"""
+
+    def __init__(self, traces):
+        TraceSource.__init__(self, "Array Source %d" % next(_names))
+        self.traces = traces
+
+    def getTrace(self, n):
+        return self.traces[n]
+
+    def numTraces(self):
+        return len(self.traces)
+
+    def numPoints(self):
+        return self.traces.shape[1]
+
+
+class TestPreprocessingBlocks(unittest.TestCase):
+    """Block getTraces() of each module must give the same traces as getTrace() one at a time"""
+
+    def setUp(self):
+        rng = np.random.RandomState(3)
+        x = np.arange(1000)
+        base = np.sin(x / 7.0) * np.exp(-((x - 500) / 100.0) ** 2)
+        self.traces = np.array([np.roll(base, s) + rng.normal(0, 0.05, 1000) for s in rng.randint(-30, 30, 200)])
+
+    def module(self, cls, *args):
+        m = cls(ArraySource(self.traces), *args, name="Block Test %d" % next(_names))
+        m.enabled = True
+        return m
+
+    def check(self, module, pointRange=(50, 900)):
+        single = np.array([module.getTrace(i) for i in range(module.numTraces())])
+        self.assertTrue(np.allclose(module.getTraces(0, module.numTraces()), single))
+        self.assertTrue(np.allclose(module.getTraces(20, 150, pointRange), single[20:150, pointRange[0]:pointRange[1]]))
+
+    def test_resync_sad(self):
+        m = self.module(ResyncSAD, False)
+        m._setMaxShift(40)
+        m._setWindow((400, 600))
+        m._setRefTrace(0)
+        self.check(m)
+
+    def test_resync_cross_correlation(self):
+        m = self.module(ResyncCrossCorrelation)
+        m._setWindow((400, 600))
+        m._setRefTrace(0)
+        self.check(m)
+
+    def test_filter(self):
+        self.check(self.module(Filter))
+        m = self.module(Filter)
+        m._setType("bandpass")
+        m._setFreq1(0.1)
+        m._setFreq2(0.3)
+        m._setOrder(8)
+        self.check(m)
+        m._setZeroPhase(True)
+        self.check(m)
+
+    def test_decimation(self):
+        m = self.module(DecimationFixed)
+        m._setDecFactor(3)
+        self.check(m, (10, 300))
+
+    def test_normalize(self):
+        m = self.module(Normalize)
+        self.check(m)
+        m._setNormMode(NormMeanStd)
+        self.check(m)
+
+    def test_noise(self):
+        """Same random numbers drawn in the same order, so seeded block & single reads match"""
+        m = self.module(AddNoiseRandom)
+        m._setNoise(0.1)
+        np.random.seed(0)
+        single = np.array([m.getTrace(i) for i in range(50)])
+        np.random.seed(0)
+        self.assertTrue(np.allclose(m.getTraces(0, 50), single))
+        self.assertFalse(np.allclose(single, self.traces[:50]))
+
+        m = self.module(AddNoiseJitter)
+        m._setJitter(10)
+        random.seed(0)
+        single = np.array([m.getTrace(i) for i in range(50)])
+        random.seed(0)
+        self.assertTrue(np.allclose(m.getTraces(0, 50), single))
+        random.seed(0)
+        self.assertTrue(np.allclose(m.getTraces(0, 50, (100, 200)), single[:, 100:200]))
+
+    def test_shift_traces(self):
+        diffs = [-1200, -30, 0, 4, 30, 999]
+        shifted = shiftTraces(self.traces[:6], diffs)
+        for i, diff in enumerate(diffs):
+            self.assertTrue(np.array_equal(shifted[i], roll_zeropad(self.traces[i], -diff)))
+
+
+if __name__ == '__main__':
+    unittest.main()
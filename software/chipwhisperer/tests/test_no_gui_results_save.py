@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from chipwhisperer.common.results.save import ResultsSave, loadResults
+
+
+class FakeStats(object):
+    numPerms = 256
+
+
+class FakeAttack(object):
+    def __init__(self):
+        self.stats = FakeStats()
+
+    def getStatistics(self):
+        return self.stats
+
+
+class TestResultsSave(unittest.TestCase):
+
+    def setUp(self):
+        #ResultsSave writes to the working directory
+        self.cwd = os.getcwd()
+        self.dir = tempfile.mkdtemp()
+        os.chdir(self.dir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir)
+
+    def test_append_and_load(self):
+        attack = FakeAttack()
+        saver = ResultsSave()
+        saver._analysisSource = attack
+        saver.setEnabled(True)
+
+        rng = np.random.RandomState(0)
+        history = []
+        for n in range(20):
+            diffs = [rng.rand(256, 10) for _ in range(16)]
+            #Fewer guesses than the record holds, the rest stays NaN
+            diffs[3] = rng.rand(10, 10)
+            attack.stats.diffs = diffs
+            attack.stats.diffs_tnum = [n * 10] * 16
+            attack.stats.diffs_tnum[5] = None
+            saver.analysisUpdated()
+            history.append(diffs)
+
+        fname = saver._filename
+        saver.processAnalysis()
+        results = loadResults(fname)
+
+        self.assertEqual(results.shape, (20,))
+        self.assertEqual(results['diffsmax'].shape, (20, 16, 256))
+        self.assertEqual(list(results['tracecnt'][7][:6]), [70, 70, 70, 70, 70, -1])
+        for n, diffs in enumerate(history):
+            for bnum, d in enumerate(diffs):
+                self.assertTrue(np.array_equal(results['diffsmax'][n][bnum][:len(d)], d.max(axis=1)))
+                self.assertTrue(np.array_equal(results['diffsmin'][n][bnum][:len(d)], d.min(axis=1)))
+        self.assertTrue(np.isnan(results['diffsmax'][0][3][10:]).all())
+
+    def test_truncated_record(self):
+        saver = ResultsSave()
+        attack = FakeAttack()
+        attack.stats.diffs = [np.ones((256, 4))] * 16
+        attack.stats.diffs_tnum = [1] * 16
+        saver._analysisSource = attack
+        saver.setEnabled(True)
+        saver.analysisUpdated()
+        saver.analysisUpdated()
+        fname = saver._filename
+
+        #As if the attack was killed while writing the second record
+        with open(fname, 'r+b') as f:
+            f.truncate(os.path.getsize(fname) - 100)
+        self.assertEqual(len(loadResults(fname)), 1)
+
+    def test_not_results_file(self):
+        with open("other.cwres", "wb") as f:
+            f.write("something else\n")
+        self.assertRaises(IOError, loadResults, "other.cwres")
+
+
+if __name__ == '__main__':
+    unittest.main()
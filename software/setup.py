@@ -1,6 +1,42 @@
 #!/usr/bin/env python
 
-from setuptools import setup
+import os
+import sys
+import logging
+from setuptools import setup, Extension
+from setuptools.command.build_ext import build_ext
+from distutils.errors import CCompilerError, DistutilsExecError, DistutilsPlatformError
+
+
+class BuildCAccel(build_ext):
+    """
+    Builds the CPA C accelerator as a plain shared library (it's loaded with ctypes, so no Python module suffix or
+    init function). It's optional, if there is no compiler the install goes on & the attack falls back to Python.
+    """
+
+    def get_ext_filename(self, ext_name):
+        return os.path.join(*ext_name.split('.')) + ('.dll' if os.name == 'nt' else '.so')
+
+    def get_export_symbols(self, ext):
+        return ext.export_symbols
+
+    def build_extension(self, ext):
+        try:
+            build_ext.build_extension(self, ext)
+        except (CCompilerError, DistutilsExecError, DistutilsPlatformError) as e:
+            logging.warning('Could not build the CPA C accelerator (%s), it will not be available' % e)
+
+
+#Windows uses the prebuilt DLLs shipped in c_accel/ (see make_winvs.bat)
+ext_modules = []
+if os.name == 'posix':
+    ext_modules.append(Extension(
+        'chipwhisperer.analyzer.attacks.cpa_algorithms.c_accel.' + ('libcpa_x64' if sys.maxsize > 2 ** 32 else 'libcpa'),
+        sources=['chipwhisperer/analyzer/attacks/cpa_algorithms/c_accel/CPAProgressive.cpp',
+                 'chipwhisperer/analyzer/attacks/cpa_algorithms/c_accel/AESModels.cpp'],
+        extra_compile_args=['-O3', '-fopenmp'],
+        extra_link_args=['-fopenmp'],
+    ))
 
 setup(
     name = 'chipwhisperer',
@@ -68,6 +104,8 @@ setup(
         #trigger a bunch of stuff like pyside, numpy, etc.
         #pyqtgraph
     ],
+    ext_modules = ext_modules,
+    cmdclass = {'build_ext': BuildCAccel},
     scripts=[
         'scripts/chipwhisperer-ana',
         'scripts/chipwhisperer-cap',